@@ -1,14 +1,17 @@
 import streamlit as st
-import mysql.connector
-import pytesseract
-import easyocr
-import numpy as np
 import os
-from groq import Groq
-from PIL import Image
 import sys
 import locale
-import requests
+from async_llm import analyze_and_translate
+from health_repository import HealthDataError, get_health_repository
+from history import ConversationHistory, format_health_context
+from image_ingest import ImageTooLarge, preview
+from label_parser import answer_locally, check_conditions, label_context, parse_label
+from llm_client import ask, cache_bypass_checkbox, use_llm_cache
+from metrics import bind_session, debug_sidebar
+from model_loader import warm_up
+from ocr_engines import available_engines, extract_text
+from translation import get_translator, translation_backend_selector
 
 # Ensure UTF-8 encoding
 sys.stdout.reconfigure(encoding='utf-8')
@@ -16,135 +19,147 @@ locale.setlocale(locale.LC_ALL, 'en_US.utf8')
 
 # Set Groq API Key
 GROQ_API_KEY = ""  # Replace with actual API key
-client = Groq(api_key=GROQ_API_KEY)
 
-# MySQL Database Configuration
-DB_CONFIG = {
-    "host": "localhost",
-    "user": "root",
-    "password": "admin@123",
-    "database": "plate"
-}
+# Models load on first use; set WARM_UP_MODELS to load them when the worker starts
+warm_up()
 
-# Initialize EasyOCR Reader
-reader = easyocr.Reader(["en"])
-
-# Ensure Tesseract is correctly configured (Windows users must set this path)
-TESSERACT_PATH = r"C:\\Program Files\\Tesseract-OCR\\tesseract.exe"  # Update if needed
-if os.name == "nt":  # Windows
-    pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
+# OCR engine used by default (any name registered in ocr_engines)
+OCR_ENGINE = os.getenv("OCR_ENGINE", "tesseract")
 
 # Initialize Session State
 session_vars = ["conversation_history", "extracted_text", "ai_response", "translated_response", "user_health_data"]
 for var in session_vars:
     if var not in st.session_state:
-        st.session_state[var] = [] if var == "conversation_history" else ""
+        st.session_state[var] = ConversationHistory() if var == "conversation_history" else ""
 
-# Function to Connect to MySQL Database
-def get_db_connection():
-    return mysql.connector.connect(**DB_CONFIG)
+# Record this run's stage timings for the hidden debug sidebar (open the page with ?debug=1)
+bind_session()
 
-# Function to Fetch User Health Data Based on ID
-def fetch_health_data(user_id):
+# Function to Fetch User Health Data Based on ID (source set by HEALTH_DATA_SOURCE, cached per user)
+def fetch_health_data(user_id, refresh=False):
+    repository = get_health_repository()
+    if refresh:
+        repository.invalidate(user_id)
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM health_data WHERE id = %s", (user_id,))
-        user_data = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        
-        if user_data:
-            return user_data
-        else:
-            return None
-    except Exception as e:
-        return f"Database Error: {str(e)}"
+        return repository.get(user_id)
+    except HealthDataError as e:
+        return str(e)
+
+# Function to Extract Text using the selected OCR engine (cached across reruns)
+def extract_text_with_engine(image, engine=OCR_ENGINE):
+    text = extract_text(image, engine)
+    return text if text else "No text detected."
 
-# Function to Extract Text using Tesseract OCR
 def extract_text_tesseract(image):
-    try:
-        image = np.array(image)
-        text = pytesseract.image_to_string(image).strip()
-        return text if text else "No text detected."
-    except Exception as e:
-        return f"Error in Tesseract OCR: {str(e)}"
+    return extract_text_with_engine(image, "tesseract")
 
-# Function to Analyze Health Data & Extracted Text using Groq AI
-def analyze_text_with_groq(text, health_data):
+# Function to Send a Prompt in the Analysis Thread (health data is sent once as context)
+def ask_with_health_context(prompt, health_data, kind="analysis"):
     if not GROQ_API_KEY:
         return "Error: Groq API key is not set."
 
-    health_context = f"""
-    User's Health Data:
-    - Name: {health_data['name']}
-    - Current Health: {health_data['current_health']}
-    - Past Health: {health_data['past_health']}
-    
-    Now analyze the following extracted text:
-    {text}
-    Based on the user's past and present health data, give recommendations.
-    """
-
     try:
-        st.session_state.conversation_history.append({"role": "user", "content": health_context})
+        history = st.session_state.conversation_history
+        history.set_context(format_health_context(health_data))
+        result = ask(history.messages_for(prompt), GROQ_API_KEY, kind=kind, use_cache=use_llm_cache())
 
-        chat_completion = client.chat.completions.create(
-            messages=st.session_state.conversation_history,
-            model="mixtral-8x7b-32768",
-            stream=False,
-        )
+        response = result.text if result.text else "Error: No response from AI."
+        if result.cancelled:
+            return response  # Partial reply: keep it out of the conversation
 
-        response = chat_completion.choices[0].message.content if chat_completion.choices else "Error: No response from AI."
-        
-        st.session_state.conversation_history.append({"role": "assistant", "content": response})
+        history.add_turn(prompt, response)
         st.session_state.ai_response = response
         return response
     except Exception as e:
         return f"Error connecting to AI: {str(e)}"
 
-# Function to Translate Text to Hindi using Groq AI
+# Parsed nutrition facts go to the model as compact JSON; unreadable labels are sent as raw text
+def label_analysis_prompt(text, health_data=None):
+    current_health = health_data.get("current_health") if isinstance(health_data, dict) else None
+    return (
+        f"Now analyze the following label:\n{label_context(text, current_health)}\n\n"
+        "Based on the user's past and present health data, give recommendations."
+    )
+
+# Function to Analyze Health Data & Extracted Text using Groq AI
+def analyze_text_with_groq(text, health_data):
+    return ask_with_health_context(label_analysis_prompt(text, health_data), health_data)
+
+# Function to Analyze and Translate in One Step (Hindi translation starts while the analysis streams)
+def analyze_and_translate_with_groq(text, health_data):
+    if not GROQ_API_KEY:
+        return "Error: Groq API key is not set."
+
+    history = st.session_state.conversation_history
+    history.set_context(format_health_context(health_data))
+    prompt = label_analysis_prompt(text, health_data)
+
+    placeholder = st.empty()
+    streamed = []
+
+    def show(token):
+        streamed.append(token)
+        placeholder.markdown("".join(streamed))
+
+    analysis, translation = analyze_and_translate(
+        GROQ_API_KEY, history.messages_for(prompt), on_token=show, use_cache=use_llm_cache(),
+        translator=get_translator(st.session_state.get("translation_backend"), GROQ_API_KEY),
+    )
+    if analysis.error:
+        return f"Error connecting to AI: {analysis.error}"
+
+    response = analysis.text if analysis.text else "Error: No response from AI."
+    history.add_turn(prompt, response)
+    st.session_state.ai_response = response
+    st.session_state.translated_response = translation or ""
+    return response
+
+# Function to Answer a Chat Question using Groq AI ("how much sugar?" is answered from the label)
+def ask_question_with_groq(question, health_data):
+    local_answer = answer_locally(question, st.session_state.extracted_text)
+    if local_answer:
+        st.session_state.conversation_history.add_turn(f"User's Question: {question}", local_answer)
+        return local_answer
+    return ask_with_health_context(f"User's Question: {question}", health_data, kind="chat")
+
+# Quick local check of the label against the user's current conditions (no AI call)
+def show_label_checks(text, health_data):
+    label = parse_label(text)
+    if not label.is_useful():
+        return
+    with st.expander("📊 Nutrition Facts (read locally)", expanded=True):
+        st.json(label.summary())
+        if isinstance(health_data, dict) and health_data.get("current_health"):
+            flags, unchecked = check_conditions(label, health_data["current_health"])
+            for flag in flags:
+                st.warning(f"⚠ {flag.message}")
+            if not flags and not unchecked:
+                st.success("✅ Nothing on this label exceeds the limits for your current conditions.")
+
+# Function to Translate Text to Hindi with the selected backend (Groq or the local model)
 def translate_text_to_hindi(text):
     try:
-        translation_prompt = f"Translate the following text into Hindi:\n\n{text}"
-        st.session_state.conversation_history.append({"role": "user", "content": translation_prompt})
-
-        chat_completion = client.chat.completions.create(
-            messages=st.session_state.conversation_history,
-            model="mixtral-8x7b-32768",
-            stream=False,
-        )
-
-        translated_text = chat_completion.choices[0].message.content if chat_completion.choices else "Error: No response from AI."
-        
-        st.session_state.conversation_history.append({"role": "assistant", "content": translated_text})
+        translator = get_translator(st.session_state.get("translation_backend"), GROQ_API_KEY)
+        result = translator.translate(text, use_cache=use_llm_cache())
+
+        translated_text = result.text if result.text else "Error: No response from AI."
+        if result.cancelled:
+            return translated_text
+
         st.session_state.translated_response = translated_text
         return translated_text
     except Exception as e:
         return f"Translation Error: {str(e)}"
 
-def fetch_health_data(user_id):
-    try:
-        api_url = f"http://localhost:5000/get/{user_id}"  # API Endpoint
-        response = requests.get(api_url)
-
-        if response.status_code == 200:
-            health_data = response.json()  # Convert JSON response to Python dictionary
-            return health_data
-        else:
-            return f"API Error: {response.status_code} - {response.text}"  # Handle API failure
-
-    except Exception as e:
-        return f"Request Error: {str(e)}"  # Handle connection errors
-
 # Streamlit UI 
 
 st.title("📸 NutriScan - AI Nutrition Chatbot")
 st.write("Enter your user ID to fetch health records and get personalized analysis.")
 
 user_id = st.text_input("Enter User ID to Fetch Health Data:")
+refresh = st.checkbox("Reload from source (skip cached record)")
 if st.button("Fetch Health Data"):
-    health_data = fetch_health_data(user_id)
+    health_data = fetch_health_data(user_id, refresh=refresh)
 
     if isinstance(health_data, dict):  # ✅ Ensure response is a dictionary
         st.session_state.user_health_data = health_data
@@ -157,24 +172,46 @@ if st.button("Fetch Health Data"):
         st.write(f"**⚕️ Current Health Condition:** {health_data.get('current_health', 'N/A')}")
         st.write(f"**📜 Past Health History:** {health_data.get('past_health', 'N/A')}")
 
+    elif health_data is None:
+        st.error("⚠ No health record found for this user ID.")
     else:
         st.error(f"⚠ Error fetching user data: {health_data}") 
 
+engines = available_engines() or [OCR_ENGINE]
+ocr_engine = st.sidebar.selectbox("OCR Engine", engines, index=engines.index(OCR_ENGINE) if OCR_ENGINE in engines else 0)
+
+cache_bypass_checkbox()
+translation_backend_selector()
+st.sidebar.checkbox("Analyze + translate together", key="analyze_and_translate",
+                    help="Translate to Hindi while the analysis is still being written")
+
 uploaded_file = st.file_uploader("Upload Image", type=["jpg", "png", "jpeg"])
 
+# Only a small preview is decoded here (within the upload caps); the OCR input is decoded at OCR size
+# when the cache has no text for these bytes yet
+preview_image = None
 if uploaded_file:
-    image = Image.open(uploaded_file)
-    st.image(image, caption="Uploaded Image", use_column_width=True)
+    try:
+        preview_image = preview(uploaded_file)
+    except ImageTooLarge as e:
+        st.error(f"⚠ {e}")
+
+if preview_image is not None:
+    st.image(preview_image, caption="Uploaded Image", use_column_width=True)
 
     st.write("🔍 Extracting text from image...")
-    extracted_text = extract_text_tesseract(image)
+    extracted_text = extract_text_with_engine(uploaded_file, ocr_engine)
     st.session_state.extracted_text = extracted_text
     st.text_area("Extracted Text", extracted_text, height=150)
+    show_label_checks(extracted_text, st.session_state.user_health_data)
 
     if st.button("Analyze with AI"):
         if st.session_state.user_health_data:
             st.write("🤖 AI is analyzing your health data and nutrition info...")
-            analysis = analyze_text_with_groq(extracted_text, st.session_state.user_health_data)
+            if st.session_state.analyze_and_translate:
+                analysis = analyze_and_translate_with_groq(extracted_text, st.session_state.user_health_data)
+            else:
+                analysis = analyze_text_with_groq(extracted_text, st.session_state.user_health_data)
             st.success("✅ AI Analysis Complete!")
         else:
             st.error("⚠ Please fetch user health data first.")
@@ -197,15 +234,7 @@ user_question = st.text_input("Ask a question about your health and nutrition:")
 
 if st.button("Ask AI"):
     if user_question and st.session_state.user_health_data:
-        question_with_context = f"""
-        User's Health Data:
-        - Name: {st.session_state.user_health_data['name']}
-        - Current Health: {st.session_state.user_health_data['current_health']}
-        - Past Health: {st.session_state.user_health_data['past_health']}
-        
-        User's Question: {user_question}
-        """
-        response = analyze_text_with_groq(question_with_context, st.session_state.user_health_data)
+        response = ask_question_with_groq(user_question, st.session_state.user_health_data)
         st.session_state.ai_response = response
     else:
         st.error("⚠ Please enter a question and ensure user health data is loaded.")
@@ -221,3 +250,5 @@ if st.button("Ask AI"):
     # Display Translated Chat Response
     if st.session_state.translated_response:
         st.text_area("AI Chat Response in Hindi", st.session_state.translated_response, height=150)
+
+debug_sidebar()
@@ -0,0 +1,167 @@
+"""Concurrent Groq calls on asyncio.
+
+Analysis and Hindi translation used to be two blocking calls behind two
+buttons. AsyncLLM issues independent prompts concurrently (bounded by
+GROQ_MAX_CONCURRENCY, each with a GROQ_TIMEOUT deadline), and
+analyze_and_translate() streams the analysis and starts translating each
+finished paragraph while the rest is still being generated, so the combined
+flow takes roughly as long as the analysis rather than the sum of both.
+Translations go through the Groq client unless a translator from
+translation.get_translator() for another backend is passed; the local model
+then runs in a worker thread while the analysis streams.
+
+The Streamlit apps call the synchronous wrappers run_concurrently() and
+analyze_and_translate(), which run their own event loop.
+"""
+import asyncio
+import os
+import time
+from functools import partial
+
+from history import count_message_tokens
+from llm_cache import cache_key, llm_cache
+from llm_client import MODEL, LLMResult, log_call
+
+MAX_CONCURRENCY = int(os.getenv("GROQ_MAX_CONCURRENCY", "4"))
+REQUEST_TIMEOUT = float(os.getenv("GROQ_TIMEOUT", "60"))
+TRANSLATION_PROMPT = "Translate the following text into Hindi:\n\n{text}"
+MIN_TRANSLATION_CHARS = 300  # Short paragraphs are merged before being sent for translation
+
+
+class AsyncLLM:
+    def __init__(self, api_key, model=MODEL, max_concurrency=MAX_CONCURRENCY, timeout=REQUEST_TIMEOUT,
+                 use_cache=True, translator=None):
+        from groq import AsyncGroq
+
+        self._client = AsyncGroq(api_key=api_key, base_url=os.getenv("GROQ_BASE_URL") or None)
+        # The streaming analysis holds one slot while its translations need others
+        self._semaphore = asyncio.Semaphore(max(2, max_concurrency))
+        self.model = model
+        self.timeout = timeout
+        self.use_cache = use_cache
+        self.translator = translator  # None or a Groq translator: translate through this client
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._client.close()
+
+    async def chat(self, messages, kind="chat", on_token=None):
+        """One call; streams tokens to on_token when given. Errors are returned in result.error."""
+        key = cache_key(messages, self.model) if self.use_cache else None
+        if key is not None:
+            text = llm_cache.get(key)
+            if text is not None:
+                result = LLMResult(kind=kind, model=self.model, text=text, cached=True, ttft=0.0, total=0.0,
+                                   prompt_tokens=0)
+                log_call(result)
+                return result
+
+        result = LLMResult(kind=kind, model=self.model, streamed=on_token is not None,
+                           prompt_tokens=count_message_tokens(messages))
+        async with self._semaphore:
+            start = time.perf_counter()
+            try:
+                if on_token is None:
+                    completion = await asyncio.wait_for(
+                        self._client.chat.completions.create(messages=messages, model=self.model, stream=False),
+                        self.timeout,
+                    )
+                    result.text = completion.choices[0].message.content if completion.choices else ""
+                    result.ttft = time.perf_counter() - start
+                else:
+                    await asyncio.wait_for(self._stream(messages, result, on_token, start), self.timeout)
+            except asyncio.TimeoutError:
+                result.error = f"Timed out after {self.timeout:g}s"
+            except Exception as e:
+                result.error = str(e)
+            finally:
+                result.total = time.perf_counter() - start
+                log_call(result)
+
+        if key is not None and result.text and not result.error:
+            llm_cache.put(key, result.text)
+        return result
+
+    async def _stream(self, messages, result, on_token, start):
+        stream = await self._client.chat.completions.create(messages=messages, model=self.model, stream=True)
+        parts = []
+        try:
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                if result.ttft is None:
+                    result.ttft = time.perf_counter() - start
+                parts.append(delta)
+                on_token(delta)
+        finally:
+            result.text = "".join(parts)
+
+    async def gather(self, requests):
+        """Run several independent calls concurrently; requests are dicts of chat() arguments, or of
+        translate() arguments ({"text": ..., "prompt": ...}) for the selected translation backend."""
+        return await asyncio.gather(*(
+            self.chat(**request) if "messages" in request else self.translate(**request) for request in requests
+        ))
+
+    async def translate(self, text, prompt=TRANSLATION_PROMPT):
+        if getattr(self.translator, "name", "groq") == "groq":
+            return await self.chat([{"role": "user", "content": prompt.format(text=text)}], kind="translation")
+        # Blocking backends (the local model, the model server) run in a worker thread
+        return await asyncio.get_running_loop().run_in_executor(
+            None, partial(self.translator.translate, text, prompt=prompt, use_cache=self.use_cache))
+
+    async def analyze_and_translate(self, messages, on_token=None):
+        """Analysis reply plus its Hindi translation, translating paragraph by paragraph
+        while the analysis is still streaming. Returns (analysis LLMResult, translation text)."""
+        tasks = []
+        buffer = ""
+
+        def handle(token):
+            nonlocal buffer
+            buffer += token
+            split = buffer.rfind("\n\n")
+            if split >= MIN_TRANSLATION_CHARS:
+                chunk, buffer = buffer[:split], buffer[split + 2:]
+                tasks.append(asyncio.ensure_future(self.translate(chunk)))
+            if on_token:
+                on_token(token)
+
+        analysis = await self.chat(messages, kind="analysis", on_token=handle)
+        if analysis.error:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            return analysis, None
+        if analysis.cached:  # No tokens were streamed
+            buffer = analysis.text
+        if buffer.strip():
+            tasks.append(asyncio.ensure_future(self.translate(buffer)))
+
+        translations = await asyncio.gather(*tasks)
+        failed = next((t.error for t in translations if t.error), None)
+        if failed:
+            return analysis, f"Translation Error: {failed}"
+        return analysis, "\n\n".join(t.text for t in translations)
+
+
+async def _gather(api_key, requests, **kwargs):
+    async with AsyncLLM(api_key, **kwargs) as llm:
+        return await llm.gather(requests)
+
+
+async def _analyze_and_translate(api_key, messages, on_token, **kwargs):
+    async with AsyncLLM(api_key, **kwargs) as llm:
+        return await llm.analyze_and_translate(messages, on_token)
+
+
+def run_concurrently(api_key, requests, **kwargs):
+    """Synchronous wrapper around AsyncLLM.gather for the Streamlit scripts."""
+    return asyncio.run(_gather(api_key, requests, **kwargs))
+
+
+def analyze_and_translate(api_key, messages, on_token=None, **kwargs):
+    """Synchronous wrapper around AsyncLLM.analyze_and_translate for the Streamlit scripts."""
+    return asyncio.run(_analyze_and_translate(api_key, messages, on_token, **kwargs))
@@ -0,0 +1,195 @@
+"""Headless batch OCR over a directory or manifest of label/prescription images.
+
+Images are fanned out across a process pool and results are streamed to a
+JSONL file as each image finishes. Re-running with the same output file
+skips images that are already in it, so an interrupted overnight run can
+simply be restarted. Images that failed are retried, and the file is then
+compacted to the latest record per image.
+
+Usage:
+    python batch_ocr.py scans/ -o results.jsonl --engine tesseract
+    python batch_ocr.py manifest.txt -o results.jsonl --engine doctr --workers 2
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp")
+
+# Engine for this worker process, set once by _init_worker
+_engine = None
+
+
+def available_cpus():
+    """Number of cores this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def collect_images(source, recursive=True):
+    """List image paths from a directory, or from a manifest with one path per line."""
+    if os.path.isdir(source):
+        paths = []
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    paths.append(os.path.join(root, name))
+            if not recursive:
+                break
+        return paths
+
+    base = os.path.dirname(os.path.abspath(source))
+    paths = []
+    with open(source, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            # Allow CSV manifests: the first column is the image path (quoted if it contains commas)
+            path = next(csv.reader([line]))[0].strip()
+            paths.append(path if os.path.isabs(path) else os.path.join(base, path))
+    return paths
+
+
+def _read_records(output_path):
+    """(records, number of unreadable lines) from an existing output file."""
+    records, bad = [], 0
+    if not os.path.exists(output_path):
+        return records, bad
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                bad += 1  # Partially written last line from an interrupted run
+    return records, bad
+
+
+def load_done(output_path):
+    """Paths already present in an existing output file without an error."""
+    return {record["path"] for record in _read_records(output_path)[0] if not record.get("error")}
+
+
+def compact_output(output_path):
+    """Rewrite output_path with only the latest record per path; returns the number of lines dropped.
+
+    A retried image gets a second record; the file is left alone when nothing is stale.
+    """
+    records, bad = _read_records(output_path)
+    latest = {}
+    for record in records:
+        latest.pop(record["path"], None)  # Re-inserted, so a retried image moves to where it finished
+        latest[record["path"]] = record
+    dropped = len(records) - len(latest) + bad
+    if dropped:
+        tmp_path = f"{output_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as out:
+            for record in latest.values():
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, output_path)
+    return dropped
+
+
+def _init_worker(engine):
+    global _engine
+    # Tesseract is single-threaded per call; stop OpenMP from oversubscribing
+    # the cores that the pool is already spreading work over.
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from ocr_engines import extract_text, get_engine
+
+    get_engine(engine).load()  # Pay the model load once per worker, not per image
+    _engine = (engine, extract_text)
+
+
+def _ocr_one(path):
+    start = time.perf_counter()
+    try:
+        engine, extract_text = _engine
+        text = extract_text(path, engine)  # Keyed on the file's bytes; decoded at the engine's size on a miss
+        error = text if text.startswith(("Error", "⚠ Error")) else None
+    except Exception as e:
+        text, error = "", str(e)
+    return {
+        "path": path,
+        "text": "" if error else text,
+        "error": error,
+        "seconds": round(time.perf_counter() - start, 4),
+    }
+
+
+def run_batch(paths, output_path, engine="tesseract", workers=None, log=sys.stderr):
+    """OCR every path not already in output_path; returns a summary dict."""
+    workers = workers or available_cpus()
+    done = load_done(output_path)
+    todo = [p for p in paths if p not in done]
+    print(f"{len(paths)} images, {len(paths) - len(todo)} already done, "
+          f"{len(todo)} to process with {workers} {engine} workers", file=log)
+
+    processed = failed = 0
+    start = time.perf_counter()
+    # Keep only a bounded number of tasks in flight so memory stays flat on huge runs
+    max_pending = workers * 4
+    pending = set()
+    remaining = iter(todo)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(engine,)) as pool, \
+            open(output_path, "a", encoding="utf-8") as out:
+        while True:
+            for path in remaining:
+                pending.add(pool.submit(_ocr_one, path))
+                if len(pending) >= max_pending:
+                    break
+            if not pending:
+                break
+
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                record = future.result()
+                record["engine"] = engine
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                processed += 1
+                failed += bool(record["error"])
+            out.flush()
+
+            elapsed = time.perf_counter() - start
+            print(f"\r{processed}/{len(todo)} images, {processed / elapsed:.2f} images/s",
+                  end="", file=log)
+
+    elapsed = time.perf_counter() - start
+    if todo:
+        print(file=log)
+    compact_output(output_path)
+    summary = {
+        "processed": processed,
+        "failed": failed,
+        "skipped": len(paths) - len(todo),
+        "seconds": round(elapsed, 2),
+        "images_per_second": round(processed / elapsed, 2) if elapsed else 0.0,
+    }
+    print(f"Done: {summary}", file=log)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch OCR a directory or manifest of images to JSONL.")
+    parser.add_argument("source", help="Image directory, or a manifest file with one image path per line")
+    parser.add_argument("-o", "--output", default="ocr_results.jsonl", help="JSONL output file (appended, resumable)")
+    parser.add_argument("--engine", default="tesseract", help="Engine registered in ocr_engines")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: available cores)")
+    parser.add_argument("--no-recursive", action="store_true", help="Do not descend into subdirectories")
+    args = parser.parse_args(argv)
+
+    paths = collect_images(args.source, recursive=not args.no_recursive)
+    summary = run_batch(paths, args.output, engine=args.engine, workers=args.workers)
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+"""Diet plans for whole cohorts, computed in bulk.
+
+Reads a patient table (CSV or Parquet) chunk by chunk and computes BMI, BMR
+and daily calories as column operations with the same diet_engine functions
+the Streamlit diet planner uses. Condition-aware food recommendations are
+attached per row; they depend only on the condition set and the rounded
+calorie target, so each distinct combination is ranked once and reused
+across the whole run. Results are written chunk by chunk, so memory stays
+bounded by --chunk-size.
+
+Input columns: age, weight (kg), height (cm), gender, activity_level and,
+optionally, id and conditions (separated by ";", "|" or ","). Rows whose age,
+weight or height is missing, non-numeric or not positive get NA results and
+no recommendations.
+
+    python cohort_diet.py ward.csv -o ward_plans.parquet --top-n 3
+    python cohort_diet.py --benchmark 200000
+"""
+import argparse
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from diet_engine import ACTIVITY_MULTIPLIERS, CONDITION_RULES, activity_multiplier, bmi, bmr, get_food_matrix
+from food_index import DB_PATH, FoodIndex
+
+REQUIRED_COLUMNS = ("age", "weight", "height", "gender", "activity_level")
+CHUNK_SIZE = 50000
+CALORIE_STEP = 50  # Recommendations are shared by patients whose targets round to the same step
+
+
+def normalize_conditions(values):
+    """Conditions column as canonical "A; B" strings (sorted, unknown names dropped)."""
+    def normalize(value):
+        if not isinstance(value, str):
+            return ""
+        names = {name.strip() for name in re.split(r"[;|,]", value)}
+        return "; ".join(sorted(name for name in names if name in CONDITION_RULES and name != "None"))
+
+    return pd.Series(values).map(normalize)
+
+
+class CohortPlanner:
+    def __init__(self, matrix=None, top_n=3, calorie_step=CALORIE_STEP):
+        self.matrix = matrix
+        self.top_n = top_n
+        self.calorie_step = calorie_step
+        self._recommendations = {}  # (conditions, rounded calories) -> "food; food; ..."
+
+    def plan(self, frame):
+        """Plans for one chunk of patients, as a new DataFrame."""
+        missing = [column for column in REQUIRED_COLUMNS if column not in frame]
+        if missing:
+            raise ValueError(f"Patient table is missing columns: {', '.join(missing)}")
+        age, weight, height = (pd.to_numeric(frame[column], errors="coerce").to_numpy(dtype=float)
+                               for column in ("age", "weight", "height"))
+        gender = frame["gender"].astype(str).to_numpy()
+        activity = frame["activity_level"].astype(str).to_numpy()
+
+        out = pd.DataFrame({
+            "id": frame["id"].astype(str).to_numpy() if "id" in frame else np.arange(len(frame)).astype(str),
+            "age": age,
+            "weight": weight,
+            "height": height,
+            "gender": gender,
+            "activity_level": activity,
+        })
+        out["conditions"] = normalize_conditions(
+            frame["conditions"].to_numpy() if "conditions" in frame else [""] * len(frame)
+        ).to_numpy()
+        valid = (age > 0) & (weight > 0) & (height > 0)  # False for NaN too
+        with np.errstate(invalid="ignore", divide="ignore"):
+            basal = np.where(valid, bmr(gender, age, weight, height), np.nan)
+            out["bmi"] = np.where(valid, bmi(weight, height), np.nan)
+        calories = basal * activity_multiplier(activity)
+        out["bmr"] = np.round(basal, 1)
+        out["daily_calories"] = pd.array(np.round(calories), dtype="Int64")  # NA where the inputs are unusable
+        recommendations = np.full(len(frame), "", dtype=object)
+        recommendations[valid] = self._recommend(out["conditions"].to_numpy()[valid], calories[valid])
+        out["recommendations"] = recommendations
+        return out
+
+    def _recommend(self, conditions, calories):
+        if self.matrix is None or not len(self.matrix) or not len(conditions):
+            return np.full(len(conditions), "", dtype=object)
+        buckets = (np.round(calories / self.calorie_step) * self.calorie_step).astype(int)
+        codes, groups = pd.factorize(pd.MultiIndex.from_arrays([conditions, buckets]))
+        texts = []
+        for condition_text, target in groups:
+            key = (condition_text, target)
+            if key not in self._recommendations:
+                foods = self.matrix.recommend(condition_text.split("; ") if condition_text else [], target,
+                                              self.top_n)
+                self._recommendations[key] = "; ".join(food.description for food in foods)
+            texts.append(self._recommendations[key])
+        return np.asarray(texts, dtype=object)[codes]
+
+
+def read_chunks(path, chunk_size=CHUNK_SIZE):
+    """DataFrames of at most chunk_size rows from a CSV or Parquet file."""
+    if Path(path).suffix.lower() in (".parquet", ".pq"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+
+class ChunkWriter:
+    """Appends DataFrames to a CSV or Parquet file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = Path(path).suffix.lower() in (".parquet", ".pq")
+        self._writer = None
+        self._started = False
+
+    def write(self, frame):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table.cast(self._writer.schema))
+        else:
+            frame.to_csv(self.path, mode="a" if self._started else "w", header=not self._started, index=False)
+        self._started = True
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def run_cohort(source, output, chunk_size=CHUNK_SIZE, top_n=3, food_db=DB_PATH, recommend=True, progress=True):
+    """Plan every patient in source and write the results to output. Returns a summary dict."""
+    matrix = get_food_matrix(FoodIndex(food_db)) if recommend else None
+    planner = CohortPlanner(matrix, top_n=top_n)
+    writer = ChunkWriter(output)
+    rows = invalid = 0
+    start = time.perf_counter()
+    try:
+        for chunk in read_chunks(source, chunk_size):
+            plans = planner.plan(chunk)
+            writer.write(plans)
+            rows += len(chunk)
+            invalid += int(plans["daily_calories"].isna().sum())
+            if progress:
+                elapsed = time.perf_counter() - start
+                print(f"\r{rows} rows, {rows / elapsed:.0f} rows/s", end="", flush=True)
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - start
+    if progress:
+        print()
+    return {
+        "rows": rows,
+        "invalid_rows": invalid,
+        "seconds": round(elapsed, 2),
+        "rows_per_second": round(rows / elapsed) if elapsed else 0,
+        "foods": len(matrix) if matrix is not None else 0,
+        "recommendation_groups": len(planner._recommendations),
+    }
+
+
+def synthetic_cohort(rows, seed=0):
+    """Random patient table for benchmarking."""
+    rng = np.random.default_rng(seed)
+    condition_names = [name for name in CONDITION_RULES if name != "None"]
+    picks = rng.integers(0, len(condition_names) + 1, size=(rows, 2))
+    conditions = [
+        "; ".join(condition_names[i] for i in set(pair) if i < len(condition_names))
+        for pair in picks.tolist()
+    ]
+    return pd.DataFrame({
+        "id": np.arange(rows),
+        "age": rng.integers(18, 90, rows),
+        "weight": np.round(rng.normal(72, 15, rows).clip(35, 200), 1),
+        "height": np.round(rng.normal(166, 10, rows).clip(130, 210), 1),
+        "gender": rng.choice(["Male", "Female", "Other"], rows, p=[0.49, 0.49, 0.02]),
+        "activity_level": rng.choice(list(ACTIVITY_MULTIPLIERS), rows),
+        "conditions": conditions,
+    })
+
+
+def benchmark(rows, chunk_size=CHUNK_SIZE, food_db=DB_PATH, fmt="parquet", recommend=True):
+    """rows/s for a synthetic cohort, end to end (read, plan, write)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, f"cohort.{fmt}")
+        frame = synthetic_cohort(rows)
+        frame.to_parquet(source, index=False) if fmt == "parquet" else frame.to_csv(source, index=False)
+        del frame
+        return run_cohort(source, os.path.join(tmp, f"plans.{fmt}"), chunk_size=chunk_size, food_db=food_db,
+                          recommend=recommend, progress=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute diet plans for a patient table.")
+    parser.add_argument("source", nargs="?", help="Patient table (.csv or .parquet)")
+    parser.add_argument("-o", "--output", help="Output table (.csv or .parquet)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--top-n", type=int, default=3, help="Foods recommended per patient")
+    parser.add_argument("--food-db", default=DB_PATH, help="Food index built by food_index.py")
+    parser.add_argument("--no-recommendations", action="store_true", help="Only BMI, BMR and calories")
+    parser.add_argument("--benchmark", type=int, metavar="ROWS", help="Benchmark on a synthetic cohort")
+    parser.add_argument("--format", choices=("parquet", "csv"), default="parquet", help="Benchmark file format")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        print(benchmark(args.benchmark, args.chunk_size, args.food_db, args.format, not args.no_recommendations))
+        return
+    if not args.source or not args.output:
+        parser.error("source and --output are required unless --benchmark is given")
+    print(run_cohort(args.source, args.output, args.chunk_size, args.top_n, args.food_db,
+                     recommend=not args.no_recommendations))
+
+
+if __name__ == "__main__":
+    main()
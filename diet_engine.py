@@ -0,0 +1,239 @@
+"""Condition-aware food recommendations for the diet planner.
+
+diet_planning used to turn the selected conditions into one search string
+through an if/elif chain, so only the first matching condition counted and a
+single food was shown. Here every condition contributes nutrient preferences
+(CONDITION_RULES) and hard per-100 g limits (CONDITION_LIMITS). Foods are
+ranked with array operations over the nutrient matrix of the local food index
+(food_index.py), together with how well their energy density fits the
+person's calorie target from daily_calories().
+
+The calorie functions accept scalars or NumPy arrays, so cohort runs use the
+same code as the Streamlit page.
+"""
+import math
+import threading
+import warnings
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from food_index import NUTRIENTS
+from metrics import timed
+
+ACTIVITY_MULTIPLIERS = {
+    "Sedentary": 1.2,
+    "Light": 1.375,
+    "Moderate": 1.55,
+    "Active": 1.725,
+    "Very Active": 1.9,
+}
+
+# condition -> {nutrient column: weight}; positive prefers more, negative prefers less (per 100 g)
+CONDITION_RULES = {
+    "None": {"fiber": 0.5, "sugar": -0.5, "saturated_fat": -0.5},
+    "Diabetes": {"sugar": -2.0, "fiber": 1.5, "carbohydrate": -1.0},
+    "Hypertension": {"sodium": -2.0, "potassium": 1.5},
+    "Heart Disease": {"saturated_fat": -2.0, "cholesterol": -1.0, "sodium": -1.0, "fiber": 1.0},
+    "Obesity": {"energy": -2.0, "protein": 1.5, "fiber": 1.0},
+    "Asthma": {"vitamin_c": 1.0, "saturated_fat": -0.5},
+    "Anemia": {"iron": 2.0, "vitamin_c": 0.5},
+    "Cancer": {"vitamin_c": 1.0, "fiber": 1.0},
+    "Chronic Kidney Disease": {"sodium": -2.0, "potassium": -2.0, "protein": -0.5},
+    "Stroke": {"sodium": -2.0, "fiber": 1.5},
+    "COVID-19": {"vitamin_c": 1.5, "protein": 1.0},
+    "Influenza": {"vitamin_c": 1.5, "protein": 1.0},
+    "Tuberculosis": {"energy": 1.5, "protein": 2.0},
+    "Dengue": {"potassium": 1.0, "vitamin_c": 0.5},  # The index has no water content; favour electrolytes
+    "HIV/AIDS": {"energy": 1.5, "protein": 2.0},
+    "Malaria": {"potassium": 1.0, "vitamin_c": 0.5},
+    "Hepatitis": {"fat": -1.5, "saturated_fat": -1.0, "sodium": -0.5, "sugar": -0.5},
+    "Pneumonia": {"vitamin_c": 1.5, "protein": 1.0},
+    "Arthritis": {"saturated_fat": -1.0, "vitamin_c": 1.0, "sugar": -0.5},
+    "Liver Disease": {"fat": -1.5, "saturated_fat": -1.0, "sodium": -0.5, "sugar": -0.5},
+    "Epilepsy": {"carbohydrate": -2.0, "fat": 1.5},
+    "Depression": {"fiber": 1.0, "iron": 0.5, "protein": 0.5},
+    "Thyroid Disorder": {"iodine": 2.0},
+}
+
+# condition -> {nutrient column: maximum per 100 g}; foods over a limit are excluded
+CONDITION_LIMITS = {
+    "Hypertension": {"sodium": 400},
+    "Chronic Kidney Disease": {"sodium": 300, "potassium": 300},
+    "Stroke": {"sodium": 400},
+    "Diabetes": {"sugar": 15},
+}
+
+# Search strings for the remote API when the local index is empty
+FOOD_QUERIES = {
+    "Diabetes": "low glycemic index foods",
+    "Hypertension": "potassium-rich foods",
+    "Obesity": "low calorie high protein foods",
+    "Heart Disease": "heart-healthy foods",
+    "Asthma": "anti-inflammatory foods",
+    "Anemia": "iron-rich foods",
+    "Cancer": "antioxidant-rich foods",
+    "Chronic Kidney Disease": "low sodium low potassium foods",
+    "Stroke": "low sodium high fiber foods",
+    "COVID-19": "immune-boosting foods",
+    "Influenza": "immune-boosting foods",
+    "Tuberculosis": "high calorie high protein foods",
+    "Dengue": "hydration-rich foods",
+    "HIV/AIDS": "high calorie high protein foods",
+    "Malaria": "hydration-rich foods",
+    "Hepatitis": "liver-friendly foods",
+    "Pneumonia": "immune-boosting foods",
+    "Arthritis": "anti-inflammatory foods",
+    "Liver Disease": "liver-friendly foods",
+    "Epilepsy": "ketogenic diet foods",
+    "Depression": "mood-boosting foods",
+    "Thyroid Disorder": "iodine-rich foods",
+}
+
+DAILY_FOOD_GRAMS = 1800  # Typical daily food mass; sets the energy density that fits a calorie target
+DENSITY_WEIGHT = 1.0
+UNKNOWN_LIMIT_PENALTY = 1.0  # Foods missing a limited nutrient rank lower rather than disappear
+SERVING_SHARE = 0.1  # Suggested portion supplies this share of the daily calories
+MAX_PORTION_GRAMS = 600
+
+
+def bmr(gender, age, weight, height):
+    """Basal metabolic rate (revised Harris-Benedict, with a generic formula for "Other")."""
+    gender = np.asarray(gender)
+    male = 88.362 + (13.397 * weight) + (4.799 * height) - (5.677 * age)
+    female = 447.593 + (9.247 * weight) + (3.098 * height) - (4.330 * age)
+    other = 500 + (10 * weight) + (6.25 * height) - (5 * age)
+    result = np.where(gender == "Male", male, np.where(gender == "Female", female, other))
+    return float(result) if result.ndim == 0 else result
+
+
+def activity_multiplier(activity_level):
+    """Multiplier for an activity level, or an array of them; unknown levels count as Sedentary."""
+    if isinstance(activity_level, str):
+        return ACTIVITY_MULTIPLIERS.get(activity_level, 1.2)
+    levels = np.asarray(activity_level)
+    multipliers = np.full(levels.shape, 1.2)
+    for level, multiplier in ACTIVITY_MULTIPLIERS.items():
+        multipliers[levels == level] = multiplier
+    return multipliers
+
+
+def bmi(weight, height):
+    """Body-mass index from weight (kg) and height (cm), rounded to two decimals."""
+    return np.round(weight / ((height / 100) ** 2), 2)
+
+
+def daily_calories(gender, age, weight, height, activity_level):
+    return bmr(gender, age, weight, height) * activity_multiplier(activity_level)
+
+
+def food_query(conditions):
+    """Search string for the first condition that has one (the old single-query behaviour)."""
+    return next((FOOD_QUERIES[c] for c in conditions if c in FOOD_QUERIES), "balanced diet")
+
+
+@dataclass
+class Recommendation:
+    fdc_id: int
+    description: str
+    score: float
+    portion_grams: float
+    nutrients: dict = field(default_factory=dict)
+
+
+class FoodMatrix:
+    """Nutrients of every food with a known energy value, as an (n foods x n nutrients) array."""
+
+    def __init__(self, fdc_ids, descriptions, values, columns=tuple(NUTRIENTS)):
+        self.fdc_ids = np.asarray(fdc_ids, dtype=np.int64)
+        self.descriptions = list(descriptions)
+        self.values = np.asarray(values, dtype=np.float32).reshape(len(self.descriptions), len(columns))
+        self.columns = tuple(columns)
+        self.column_index = {column: i for i, column in enumerate(self.columns)}
+        # Robust z-scores of log1p values, computed once; missing values score neutral (0)
+        logged = np.log1p(np.clip(self.values, 0, None))
+        if len(self):
+            with warnings.catch_warnings():  # Nutrients no food reports give all-NaN columns
+                warnings.simplefilter("ignore", RuntimeWarning)
+                median = np.nanmedian(logged, axis=0)
+                spread = np.nanpercentile(logged, 75, axis=0) - np.nanpercentile(logged, 25, axis=0)
+            median = np.nan_to_num(median)
+            spread = np.where(np.nan_to_num(spread) > 0, np.nan_to_num(spread), 1.0)
+            self.z = np.nan_to_num(np.clip((logged - median) / spread, -3, 3)).astype(np.float32)
+        else:
+            self.z = np.zeros_like(self.values)
+
+    def __len__(self):
+        return len(self.descriptions)
+
+    @classmethod
+    def from_index(cls, index):
+        columns = tuple(NUTRIENTS)
+        rows = index.nutrient_rows()
+        if not rows:
+            return cls([], [], np.empty((0, len(columns))), columns)
+        fdc_ids, descriptions, *values = zip(*rows)
+        matrix = np.array(values, dtype=np.float64).T  # None -> nan
+        return cls(fdc_ids, descriptions, matrix, columns)
+
+    @timed("diet.recommend")
+    def recommend(self, conditions, calories, top_n=10):
+        """Top foods for all conditions combined and a daily calorie target, best first."""
+        conditions = [c for c in conditions if c in CONDITION_RULES and c != "None"] or ["None"]
+        if not len(self):
+            return []
+
+        weights = np.zeros(len(self.columns), dtype=np.float32)
+        for condition in conditions:
+            for column, weight in CONDITION_RULES[condition].items():
+                weights[self.column_index[column]] += weight
+        scores = self.z @ weights
+
+        # Energy density close to what the calorie target implies scores higher
+        energy = self.values[:, self.column_index["energy"]]
+        target_density = calories / DAILY_FOOD_GRAMS * 100
+        scores -= DENSITY_WEIGHT * np.abs(np.log(energy / target_density))
+
+        keep = np.ones(len(self), dtype=bool)
+        for condition in conditions:
+            for column, limit in CONDITION_LIMITS.get(condition, {}).items():
+                column_values = self.values[:, self.column_index[column]]
+                unknown = np.isnan(column_values)
+                keep &= unknown | (column_values <= limit)
+                scores -= UNKNOWN_LIMIT_PENALTY * unknown
+        portions = calories * SERVING_SHARE * 100 / energy
+        keep &= portions <= MAX_PORTION_GRAMS
+        scores = np.where(keep, scores, -np.inf)
+
+        top_n = max(0, min(top_n, int(keep.sum())))
+        if top_n == 0:
+            return []
+        best = np.argpartition(-scores, top_n - 1)[:top_n]
+        best = best[np.argsort(-scores[best])]
+        return [
+            Recommendation(
+                fdc_id=int(self.fdc_ids[i]),
+                description=self.descriptions[i],
+                score=round(float(scores[i]), 3),
+                portion_grams=round(float(portions[i])),
+                nutrients={
+                    column: round(float(value), 2) for column, value in zip(self.columns, self.values[i])
+                    if not math.isnan(value)
+                },
+            )
+            for i in best
+        ]
+
+
+_matrices = {}
+_matrices_lock = threading.Lock()
+
+
+def get_food_matrix(index):
+    """FoodMatrix for a FoodIndex, rebuilt whenever the index's version changes (any write, not just new rows)."""
+    version = index.version
+    with _matrices_lock:
+        matrix = _matrices.get(index.path)
+        if matrix is None or matrix[0] is not index or matrix[1] != version:
+            matrix = _matrices[index.path] = (index, version, FoodMatrix.from_index(index))
+        return matrix[2]
@@ -1,76 +1,169 @@
+import os
+import time
+
 import streamlit as st
-from doctr.models import ocr_predictor
-import numpy as np
-from PIL import Image
-from groq import Groq
+from async_llm import run_concurrently
+from document_pages import PDF_DPI, iter_pages
+from llm_client import ask, cache_bypass_checkbox, use_llm_cache
+from medications import extract_medications, medications_prompt
+from metrics import bind_session, debug_sidebar, stage
+from model_loader import set_torch_threads, warm_up
+from ocr_cache import image_digest, make_key, ocr_cache
+from ocr_engines import get_engine
+from translation import get_translator, translation_backend_selector
 
 # Set Groq API Key (Replace this with your actual key)
 GROQ_API_KEY = ""
-client = Groq(api_key=GROQ_API_KEY)
-
-# Initialize Doctr OCR Model
-ocr_model = ocr_predictor(pretrained=True)
+BATCH_SIZE = int(os.getenv("DOCTR_BATCH_SIZE", "4"))
+# "cascade" reads clean pages with Tesseract and sends only uncertain ones to the neural engines
+OCR_ENGINE = os.getenv("DOCTOR_OCR_ENGINE", "doctr")
+
+
+# OCR every page of every upload in batches, showing each page as its batch finishes.
+# Pages are looked up in the OCR cache by file digest first; only the misses are decoded or
+# rendered (Page.image is lazy) and sent to the engine.
+def extract_pages_doctr(files, batch_size, dpi):
+    engine = get_engine(OCR_ENGINE)
+    settings = engine.cache_settings()
+    pages = []
+    progress = st.empty()
+    start = time.perf_counter()
+
+    def flush(batch):
+        misses = [page for page, _, text in batch if text is None]
+        results = iter(engine.recognize_batch([page.image for page in misses]) if misses else [])
+        for page, key, text in batch:
+            if text is None:
+                result = next(results)
+                text = f"⚠ Error: {result.error}" if result.error else result.text
+                if not result.error:  # A failed page is read again next time
+                    ocr_cache.put(key, text)
+            text = text if text else "⚠ No text detected."
+            with st.expander(page.label, expanded=len(files) == 1 and not pages):
+                st.text(text)
+            pages.append((page.label, text))
+        elapsed = time.perf_counter() - start
+        progress.caption(f"{len(pages)} pages in {elapsed:.1f}s ({len(pages) / elapsed:.2f} pages/s)")
+
+    batch, missed = [], 0
+    for page in iter_pages(files, dpi=dpi, engine=OCR_ENGINE):
+        key = make_key(page.digest, engine.name, settings)
+        text = ocr_cache.get(key)
+        batch.append((page, key, text))
+        missed += text is None
+        if missed >= batch_size:
+            flush(batch)
+            batch, missed = [], 0
+    if batch:
+        flush(batch)
+    return pages
 
 # Streamlit UI
-st.title("📄 Doctor Prescription Analysis")
-st.write("Upload a **JPG or PNG** prescription image to extract medication details.")
-
-# File Upload (Images Only)
-uploaded_file = st.file_uploader("Upload Prescription Image", type=["jpg", "png"])
-
-if uploaded_file:
-    try:
-        # Convert uploaded file to a PIL Image
-        image = Image.open(uploaded_file).convert("RGB")
-
-        # Convert PIL image to NumPy array
-        image_np = np.array(image)
-
-        # Use Doctr to extract text
-        doc = ocr_model([image_np])
-
-        # Extract text properly
-        extracted_text = "\n".join(
-            [word.value for block in doc.pages[0].blocks for line in block.lines for word in line.words]
-        ) if doc.pages else "⚠ No text detected."
-
-        # Display Extracted Text
-        st.subheader("📜 Extracted Prescription Text")
-        st.text_area("Extracted Text", extracted_text, height=200)
-
-        # Analyze with AI
-        if st.button("🔍 Analyze Prescription"):
-            st.write("🤖 AI is analyzing your prescription...")
-
-            try:
-                chat_completion = client.chat.completions.create(
-                    messages=[{"role": "user", "content": extracted_text}],
-                    model="mixtral-8x7b-32768",
-                    stream=False,
-                )
-                ai_response = chat_completion.choices[0].message.content if chat_completion.choices else "⚠ AI could not generate a response."
-            except Exception as e:
-                ai_response = f"⚠ Error: {str(e)}"
-
-            st.subheader("📝 AI Analysis")
-            st.text_area("AI Analysis", ai_response, height=200)
-
-        # Translate to Hindi
-        if st.button("🌍 Translate to Hindi"):
-            translation_prompt = f"Translate the following prescription into Hindi:\n\n{extracted_text}"
-
-            try:
-                chat_completion = client.chat.completions.create(
-                    messages=[{"role": "user", "content": translation_prompt}],
-                    model="mixtral-8x7b-32768",
-                    stream=False,
-                )
-                translated_text = chat_completion.choices[0].message.content if chat_completion.choices else "⚠ Translation failed."
-            except Exception as e:
-                translated_text = f"⚠ Error: {str(e)}"
-
-            st.subheader("🔠 Prescription in Hindi")
-            st.text_area("Translated Text", translated_text, height=200)
-
-    except Exception as e:
-        st.error(f"❌ Error processing image: {str(e)}")
+def main():
+    warm_up()  # No-op unless WARM_UP_MODELS is set
+    cache_bypass_checkbox()
+    translation_backend = translation_backend_selector()
+    batch_size = st.sidebar.number_input("Pages per OCR batch", 1, 32, BATCH_SIZE)
+    threads = st.sidebar.number_input("CPU threads for OCR (0 = default)", 0, os.cpu_count() or 1, 0)
+    dpi = st.sidebar.select_slider("PDF render DPI", sorted({100, 150, 200, 300, PDF_DPI}), PDF_DPI)
+
+    st.title("📄 Doctor Prescription Analysis")
+    st.write("Upload **JPG, PNG or PDF** prescriptions (several files or multi-page scans) to extract medication details.")
+
+    # File Upload (images and PDFs, several at once)
+    uploaded_files = st.file_uploader("Upload Prescription Images or PDFs", type=["jpg", "png", "pdf"],
+                                      accept_multiple_files=True)
+
+    if uploaded_files:
+        try:
+            if threads:
+                set_torch_threads(threads)
+
+            # OCR once per set of uploads (by content, so a re-upload under the same name is re-read);
+            # buttons below rerun the script
+            upload_key = (tuple(image_digest(f) for f in uploaded_files), batch_size, dpi)
+            if st.session_state.get("doctr_upload_key") != upload_key:
+                st.subheader("📑 Pages")
+                with st.spinner("Extracting text..."):
+                    pages = extract_pages_doctr(uploaded_files, batch_size, dpi)
+                st.session_state.doctr_upload_key = upload_key
+                st.session_state.doctr_pages = pages
+            pages = st.session_state.doctr_pages
+            if len(pages) == 1:
+                extracted_text = pages[0][1]
+            else:
+                extracted_text = "\n\n".join(f"[{label}]\n{text}" for label, text in pages)
+
+            # Medications matched locally against the drug dictionary, shown before any AI call
+            with stage("medications.extract"):
+                medications = extract_medications(extracted_text)
+            st.subheader("💊 Medications Found")
+            if medications:
+                st.table([
+                    {"Medication": m.name, "As written": m.matched, "Form": m.form or "", "Dose": m.dose or "",
+                     "Frequency": m.frequency or "", "Duration": m.duration or ""}
+                    for m in medications
+                ])
+            else:
+                st.info("No known medication names were recognised; the AI will see the full text.")
+
+            # The AI only sees the extracted medications when there are any
+            ai_input = medications_prompt(medications) if medications else extracted_text
+            translation_source = "\n".join(m.describe() for m in medications) if medications else extracted_text
+
+            # Display Extracted Text
+            with st.expander("📜 Extracted Prescription Text", expanded=not medications):
+                st.text_area("Extracted Text", extracted_text, height=200)
+
+            # Analyze with AI
+            if st.button("🔍 Analyze Prescription"):
+                st.write("🤖 AI is analyzing your prescription...")
+
+                try:
+                    result = ask([{"role": "user", "content": ai_input}], GROQ_API_KEY, kind="analysis",
+                                 use_cache=use_llm_cache())
+                    ai_response = result.text if result.text else "⚠ AI could not generate a response."
+                except Exception as e:
+                    ai_response = f"⚠ Error: {str(e)}"
+
+                st.subheader("📝 AI Analysis")
+                st.text_area("AI Analysis", ai_response, height=200)
+
+            # Translate to Hindi
+            if st.button("🌍 Translate to Hindi"):
+                try:
+                    result = get_translator(translation_backend, GROQ_API_KEY).translate(
+                        translation_source, prompt="Translate the following prescription into Hindi:\n\n{text}",
+                        use_cache=use_llm_cache())
+                    translated_text = result.text if result.text else "⚠ Translation failed."
+                except Exception as e:
+                    translated_text = f"⚠ Error: {str(e)}"
+
+                st.subheader("🔠 Prescription in Hindi")
+                st.text_area("Translated Text", translated_text, height=200)
+
+            # Analyze and translate concurrently: one wait instead of two
+            if st.button("⚡ Analyze & Translate Together"):
+                with st.spinner("🤖 Analyzing and translating your prescription..."):
+                    analysis, translation = run_concurrently(GROQ_API_KEY, [
+                        {"messages": [{"role": "user", "content": ai_input}], "kind": "analysis"},
+                        {"text": translation_source,
+                         "prompt": "Translate the following prescription into Hindi:\n\n{text}"},
+                    ], use_cache=use_llm_cache(), translator=get_translator(translation_backend, GROQ_API_KEY))
+                ai_response = f"⚠ Error: {analysis.error}" if analysis.error else (
+                    analysis.text or "⚠ AI could not generate a response.")
+                translated_text = f"⚠ Error: {translation.error}" if translation.error else (
+                    translation.text or "⚠ Translation failed.")
+
+                st.subheader("📝 AI Analysis")
+                st.text_area("AI Analysis", ai_response, height=200)
+                st.subheader("🔠 Prescription in Hindi")
+                st.text_area("Translated Text", translated_text, height=200)
+
+        except Exception as e:
+            st.error(f"❌ Error processing upload: {str(e)}")
+
+if __name__ == "__main__":
+    bind_session()  # Stage timings for the ?debug=1 sidebar
+    main()
+    debug_sidebar()
@@ -0,0 +1,92 @@
+"""Page-by-page decoding of uploaded images and PDFs.
+
+Pages are produced lazily, and each page's image is only decoded or
+rendered when something reads Page.image, so pages already in the OCR cache
+(looked up by Page.digest) are never rasterised. PDFs are rendered with
+pypdfium2 (installed with doctr) at PDF_RENDER_DPI; image files are decoded by
+image_ingest at the size the OCR engine works at.
+"""
+import os
+from dataclasses import dataclass, field
+from functools import partial
+
+from image_ingest import decode
+from metrics import stage
+from ocr_cache import image_digest
+
+PDF_DPI = int(os.getenv("PDF_RENDER_DPI", "200"))
+
+
+@dataclass
+class Page:
+    source: str  # File name
+    number: int  # 1-based page number within the file
+    load: object  # Callable returning the PIL image (PDF pages) or NumPy array (image files)
+    digest: str = ""  # OCR cache digest: the file's bytes, plus page number and DPI for PDFs
+    _image: object = field(default=None, repr=False)
+
+    @property
+    def image(self):
+        """The decoded or rendered page, built on first access."""
+        if self._image is None:
+            self._image = self.load()
+        return self._image
+
+    @property
+    def label(self):
+        return f"{self.source} — page {self.number}"
+
+
+def read_bytes(file):
+    """Bytes of an uploaded file, path or bytes object."""
+    if isinstance(file, (bytes, bytearray)):
+        return bytes(file)
+    if hasattr(file, "getvalue"):
+        return file.getvalue()
+    if hasattr(file, "read"):
+        return file.read()
+    with open(file, "rb") as f:
+        return f.read()
+
+
+def is_pdf(data):
+    return data[:5] == b"%PDF-"
+
+
+def iter_pages(files, dpi=PDF_DPI, engine=None):
+    """Yield a Page for every image file and every page of every PDF, in order.
+
+    Nothing is decoded until Page.image is read; image files are decoded for
+    `engine` then and may raise image_ingest.ImageTooLarge.
+    """
+    for file in files:
+        name = getattr(file, "name", None) or str(file)
+        data = read_bytes(file)
+        digest = image_digest(data)
+        if is_pdf(data):
+            yield from _pdf_pages(name, data, dpi, digest)
+        else:
+            yield Page(name, 1, partial(decode, data, engine), digest)
+
+
+def _pdf_pages(name, data, dpi, digest=""):
+    import pypdfium2 as pdfium
+
+    # Opening the document only parses its structure; each page is rendered by Page.image.
+    # The document is closed when the last of its pages is garbage collected.
+    pdf = pdfium.PdfDocument(data)
+    for index in range(len(pdf)):
+        yield Page(name, index + 1, partial(_render, pdf, index, dpi), f"{digest}:{index + 1}@{dpi}")
+
+
+def _render(pdf, index, dpi):
+    page = pdf[index]
+    try:
+        with stage("pdf.render"):
+            image = page.render(scale=dpi / 72).to_pil()
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+    finally:
+        page.close()
+    image.info["dpi"] = (dpi, dpi)  # Lets preprocessing scale to its target DPI
+    return image
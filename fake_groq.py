@@ -0,0 +1,125 @@
+"""Local stand-in for the Groq chat completions API, with SSE streaming.
+
+Serves POST /openai/v1/chat/completions in the OpenAI-compatible format the
+groq SDK speaks. Replies echo the last user message (or a fixed reply) word
+by word, with optional delays, so streaming, time-to-first-token and
+cancellation can be exercised offline; setting server.error_status makes every
+call fail with that HTTP status instead:
+
+    python fake_groq.py --port 8009 --token-delay 0.05
+    GROQ_BASE_URL=http://127.0.0.1:8009 streamlit run ocr_utils.py
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeGroqHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # Keep test output quiet
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        server = self.server
+        server.requests.append(body)
+        if server.error_status:
+            self._json({"error": {"message": "Fake Groq error", "type": "api_error"}}, server.error_status)
+            return
+        reply = server.reply or _echo(body.get("messages", []))
+        model = body.get("model", "fake")
+        time.sleep(server.first_token_delay)
+        if body.get("stream"):
+            self._stream(reply, model)
+        else:
+            self._json(_completion(reply, model, body.get("messages", [])))
+
+    def _json(self, payload, status=200):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, reply, model):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        words = reply.split(" ")
+        try:
+            for i, word in enumerate(words):
+                token = word if i == 0 else " " + word
+                chunk = {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+                time.sleep(self.server.token_delay)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            self.server.cancelled += 1  # The client closed the stream early
+
+
+def _echo(messages):
+    last = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+    return f"Echo: {last}"
+
+
+def _completion(reply, model, messages):
+    prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in messages)
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(reply.split()),
+            "total_tokens": prompt_tokens + len(reply.split()),
+        },
+    }
+
+
+def start_fake_groq(reply=None, token_delay=0.0, first_token_delay=0.0, port=0):
+    """Start the server in a background thread; returns (server, base_url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeGroqHandler)
+    server.daemon_threads = True
+    server.reply = reply
+    server.token_delay = token_delay
+    server.first_token_delay = first_token_delay
+    server.requests = []
+    server.cancelled = 0
+    server.error_status = None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Groq chat completions server.")
+    parser.add_argument("--port", type=int, default=8009)
+    parser.add_argument("--reply", help="Fixed reply text (default: echo the last user message)")
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--first-token-delay", type=float, default=0.3)
+    args = parser.parse_args()
+    server, url = start_fake_groq(args.reply, args.token_delay, args.first_token_delay, args.port)
+    print(f"Fake Groq API on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
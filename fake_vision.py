@@ -0,0 +1,145 @@
+"""Local stand-in for the Google Cloud Vision ImageAnnotatorClient.
+
+Returns canned text for known images with the same response shape as the
+real client (error.message, text_annotations with bounding_poly vertices,
+full_text_annotation words with confidences), so the Vision engine, the batch
+functions in image_processing.py and the benchmark can run offline and
+without credentials. batch_annotate_images enforces the 16-image limit,
+quota_errors=N makes the first N calls fail with a 429 like ResourceExhausted,
+unavailable_errors=N with a 503 like ServiceUnavailable, and add_error() makes
+one image's response carry an error.
+FakeAsyncVisionClient offers the same calls as coroutines.
+"""
+import asyncio
+import hashlib
+import threading
+import time
+from types import SimpleNamespace
+
+MAX_IMAGES_PER_REQUEST = 16
+
+
+class QuotaExceeded(Exception):
+    code = 429  # Same status as google.api_core.exceptions.ResourceExhausted
+
+
+class Unavailable(Exception):
+    code = 503  # Same status as google.api_core.exceptions.ServiceUnavailable
+
+
+class FakeVisionClient:
+    def __init__(self, texts=None, default_text="", latency=0.0, error_message="", quota_errors=0,
+                 unavailable_errors=0):
+        self._texts = {}
+        self._errors = {}
+        self.default_text = default_text
+        self.latency = latency  # Seconds added per request to mimic a round trip
+        self.error_message = error_message
+        self.quota_errors = quota_errors  # Calls left that fail with QuotaExceeded
+        self.unavailable_errors = unavailable_errors  # Then calls left that fail with Unavailable
+        self.requests = 0
+        self.images = 0
+        self._lock = threading.Lock()
+        for content, text in (texts or {}).items():
+            self.add(content, text)
+
+    def add(self, content, text):
+        """Register the text returned for an image's encoded bytes."""
+        self._texts[hashlib.sha1(content).hexdigest()] = text
+
+    def add_error(self, content, message):
+        """Make the response for an image's encoded bytes carry error.message."""
+        self._errors[hashlib.sha1(content).hexdigest()] = message
+
+    def text_detection(self, image):
+        self._start([image])
+        if self.latency:
+            time.sleep(self.latency)
+        return self._response(self._text(image.content), self._error(image.content))
+
+    def batch_annotate_images(self, requests):
+        self._start([request.image for request in requests])
+        if self.latency:
+            time.sleep(self.latency)
+        return self._batch_response(requests)
+
+    def _start(self, images):
+        if len(images) > MAX_IMAGES_PER_REQUEST:
+            raise ValueError(f"At most {MAX_IMAGES_PER_REQUEST} images are allowed per request")
+        with self._lock:
+            self.requests += 1
+            if self.quota_errors > 0:
+                self.quota_errors -= 1
+                raise QuotaExceeded("Quota exceeded for quota metric 'Requests' (fake)")
+            if self.unavailable_errors > 0:
+                self.unavailable_errors -= 1
+                raise Unavailable("The service is currently unavailable (fake)")
+            self.images += len(images)
+
+    def _text(self, content):
+        return self._texts.get(hashlib.sha1(content).hexdigest(), self.default_text)
+
+    def _error(self, content):
+        return self._errors.get(hashlib.sha1(content).hexdigest(), self.error_message)
+
+    def _batch_response(self, requests):
+        return SimpleNamespace(responses=[self._response(self._text(r.image.content), self._error(r.image.content))
+                                          for r in requests])
+
+    def _response(self, text, error_message=""):
+        if error_message:
+            return SimpleNamespace(error=SimpleNamespace(message=error_message), text_annotations=[],
+                                   full_text_annotation=None)
+        annotations = [_annotation(text, 0, 0, 0)] if text else []
+        words = []
+        for row, line in enumerate(text.splitlines()):
+            x = 0
+            for word in line.split():
+                annotations.append(_annotation(word, x, row * 20, len(word) * 10))
+                words.append(_word(annotations[-1]))
+                x += (len(word) + 1) * 10
+        pages = [_page(words)] if words else []
+        return SimpleNamespace(error=SimpleNamespace(message=""), text_annotations=annotations,
+                               full_text_annotation=SimpleNamespace(text=text, pages=pages))
+
+
+class FakeAsyncVisionClient:
+    """Coroutine version of FakeVisionClient; records the most requests seen in flight at once."""
+
+    def __init__(self, *args, **kwargs):
+        self.sync = FakeVisionClient(*args, **kwargs)
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def add(self, content, text):
+        self.sync.add(content, text)
+
+    async def batch_annotate_images(self, requests):
+        self.sync._start([request.image for request in requests])
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.sync.latency:
+                await asyncio.sleep(self.sync.latency)
+            return self.sync._batch_response(requests)
+        finally:
+            self.in_flight -= 1
+
+
+def _annotation(text, x, y, width):
+    vertices = [
+        SimpleNamespace(x=x, y=y),
+        SimpleNamespace(x=x + width, y=y),
+        SimpleNamespace(x=x + width, y=y + 16),
+        SimpleNamespace(x=x, y=y + 16),
+    ]
+    return SimpleNamespace(description=text, bounding_poly=SimpleNamespace(vertices=vertices))
+
+
+def _word(annotation):
+    symbols = [SimpleNamespace(text=char) for char in annotation.description]
+    return SimpleNamespace(symbols=symbols, bounding_box=annotation.bounding_poly, confidence=0.95)
+
+
+def _page(words):
+    return SimpleNamespace(blocks=[SimpleNamespace(paragraphs=[SimpleNamespace(words=words)])])
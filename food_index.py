@@ -0,0 +1,319 @@
+"""Local FoodData Central index for the diet planner.
+
+get_food_nutrition used to call api.nal.usda.gov on every "Generate Diet Plan"
+click, with no timeout or cache. This module imports a FoodData Central bulk
+export (the CSV download directory or one of the JSON files) into SQLite: one
+row per food with the nutrients the apps use as columns, an index on each
+nutrient and an FTS5 index on the description. Searches return the same shape
+as the API's "foods" entries, so callers need no changes.
+
+The remote API is only a fallback (FDC_REMOTE_FALLBACK=0 turns it off); foods
+it returns are written to the index, so each query goes to the network once.
+The index lives in cache/ next to this module unless FOOD_INDEX_DB says otherwise,
+so it does not depend on the directory the app was started from.
+
+    python food_index.py import FoodData_Central_csv_2024-04-18/
+    python food_index.py search "low sodium cheese" --max-sodium 200
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from metrics import stage
+
+DB_PATH = os.getenv("FOOD_INDEX_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache",
+                                                   "food_index.sqlite3"))
+API_URL = "https://api.nal.usda.gov/fdc/v1/foods/search"
+API_KEY = os.getenv("FDC_API_KEY", "ha6WbCNn0HkQonQpJHHh6CWRLRLSpdUgXg84trte")
+REMOTE_FALLBACK = os.getenv("FDC_REMOTE_FALLBACK", "1") != "0"
+REMOTE_TIMEOUT = (3.05, 10)
+IMPORT_BATCH = 50000
+
+# column -> (FDC nutrient name, unit, FDC nutrient ids in order of preference)
+NUTRIENTS = {
+    "energy": ("Energy", "KCAL", (1008, 2047, 2048)),  # Foundation foods often only have the Atwater values
+    "protein": ("Protein", "G", (1003,)),
+    "carbohydrate": ("Carbohydrate, by difference", "G", (1005,)),
+    "fat": ("Total lipid (fat)", "G", (1004,)),
+    "fiber": ("Fiber, total dietary", "G", (1079,)),
+    "sugar": ("Sugars, total including NLEA", "G", (2000, 1063)),
+    "saturated_fat": ("Fatty acids, total saturated", "G", (1258,)),
+    "cholesterol": ("Cholesterol", "MG", (1253,)),
+    "sodium": ("Sodium, Na", "MG", (1093,)),
+    "potassium": ("Potassium, K", "MG", (1092,)),
+    "calcium": ("Calcium, Ca", "MG", (1087,)),
+    "iron": ("Iron, Fe", "MG", (1089,)),
+    "iodine": ("Iodine, I", "UG", (1100,)),
+    "vitamin_c": ("Vitamin C, total ascorbic acid", "MG", (1162,)),
+}
+NUTRIENT_IDS = {
+    nutrient_id: (column, rank)
+    for column, (_, _, ids) in NUTRIENTS.items()
+    for rank, nutrient_id in enumerate(ids)
+}
+IGNORED_WORDS = {"food", "foods"}  # Every diet-plan query ends in "foods"
+
+
+class FoodIndex:
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._writes = 0  # Bumped on every write through this index; part of version
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._create_schema()
+
+    def _create_schema(self):
+        columns = ", ".join(f"{column} REAL" for column in NUTRIENTS)
+        self._db.execute(
+            f"CREATE TABLE IF NOT EXISTS foods (fdc_id INTEGER PRIMARY KEY, description TEXT NOT NULL, "
+            f"data_type TEXT, {columns})"
+        )
+        for column in NUTRIENTS:
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS foods_{column} ON foods ({column})")
+        self._db.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS foods_fts USING fts5("
+            "description, content='foods', content_rowid='fdc_id')"
+        )
+        # Remote queries already answered, so misses are not sent to the API again
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS remote_queries (query TEXT PRIMARY KEY, fdc_ids TEXT, fetched REAL)"
+        )
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM foods").fetchone()[0]
+
+    @property
+    def version(self):
+        """Changes whenever the foods change, through this index or another connection to the same file."""
+        with self._lock:
+            return self._writes, self._db.execute("PRAGMA data_version").fetchone()[0]
+
+    # Importing
+
+    def import_export(self, source):
+        """Load a FoodData Central bulk export: a CSV directory or a JSON file. Returns the food count."""
+        source = Path(source)
+        start = time.perf_counter()
+        with self._lock:
+            self._db.execute("DROP TABLE IF EXISTS staging")
+            self._db.execute("CREATE TEMP TABLE staging (fdc_id INTEGER, col TEXT, rank INTEGER, amount REAL)")
+            if source.is_dir():
+                self._import_csv(source)
+            else:
+                self._import_json(source)
+            self._apply_staging()
+            self._db.execute("INSERT INTO foods_fts(foods_fts) VALUES ('rebuild')")
+            self._db.commit()
+            self._writes += 1
+        count = len(self)
+        print(f"Imported {count} foods from {source} in {time.perf_counter() - start:.1f}s")
+        return count
+
+    def _import_csv(self, directory):
+        with open(directory / "food.csv", newline="", encoding="utf-8") as f:
+            foods = ((int(row["fdc_id"]), row["description"], row.get("data_type")) for row in csv.DictReader(f))
+            self._insert_batches("INSERT OR REPLACE INTO foods (fdc_id, description, data_type) VALUES (?, ?, ?)",
+                                 foods)
+        with open(directory / "food_nutrient.csv", newline="", encoding="utf-8") as f:
+            values = (
+                (int(row["fdc_id"]), *NUTRIENT_IDS[int(row["nutrient_id"])], float(row["amount"]))
+                for row in csv.DictReader(f)
+                if row.get("amount") and int(row["nutrient_id"]) in NUTRIENT_IDS
+            )
+            self._insert_batches("INSERT INTO staging VALUES (?, ?, ?, ?)", values)
+
+    def _import_json(self, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        # {"FoundationFoods": [...]}, {"SRLegacyFoods": [...]}, ... or a bare list
+        foods = next(iter(data.values())) if isinstance(data, dict) else data
+        rows, values = [], []
+        for food in foods:
+            rows.append((food["fdcId"], food["description"], food.get("dataType")))
+            for item in food.get("foodNutrients", []):
+                nutrient_id = item.get("nutrient", {}).get("id")
+                if nutrient_id in NUTRIENT_IDS and item.get("amount") is not None:
+                    values.append((food["fdcId"], *NUTRIENT_IDS[nutrient_id], item["amount"]))
+        self._insert_batches("INSERT OR REPLACE INTO foods (fdc_id, description, data_type) VALUES (?, ?, ?)", rows)
+        self._insert_batches("INSERT INTO staging VALUES (?, ?, ?, ?)", values)
+
+    def _insert_batches(self, sql, rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= IMPORT_BATCH:
+                self._db.executemany(sql, batch)
+                batch.clear()
+        if batch:
+            self._db.executemany(sql, batch)
+
+    def _apply_staging(self):
+        # Pivot (fdc_id, column, amount) rows into the nutrient columns, preferring lower-ranked ids
+        self._db.execute("CREATE INDEX staging_lookup ON staging (col, fdc_id, rank)")
+        for column in NUTRIENTS:
+            self._db.execute(
+                f"UPDATE foods SET {column} = (SELECT amount FROM staging "
+                f"WHERE col = ? AND staging.fdc_id = foods.fdc_id ORDER BY rank LIMIT 1) "
+                f"WHERE fdc_id IN (SELECT fdc_id FROM staging WHERE col = ?)",
+                (column, column),
+            )
+        self._db.execute("DROP TABLE staging")
+
+    def add_foods(self, foods):
+        """Store foods in the API's search-result shape (used to fill the index from the remote API)."""
+        with self._lock:
+            for food in foods:
+                values = {}
+                for item in food.get("foodNutrients", []):
+                    column, rank = NUTRIENT_IDS.get(item.get("nutrientId"), (None, None))
+                    if column and item.get("value") is not None and rank < values.get(column, (99, None))[0]:
+                        values[column] = (rank, item["value"])
+                columns = ["fdc_id", "description", "data_type", *values]
+                old = self._db.execute("SELECT description FROM foods WHERE fdc_id = ?", (food["fdcId"],)).fetchone()
+                if old:
+                    self._db.execute("INSERT INTO foods_fts (foods_fts, rowid, description) VALUES ('delete', ?, ?)",
+                                     (food["fdcId"], old[0]))
+                self._db.execute(
+                    f"INSERT OR REPLACE INTO foods ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                    (food["fdcId"], food["description"], food.get("dataType"), *(v for _, v in values.values())),
+                )
+                self._db.execute("INSERT INTO foods_fts (rowid, description) VALUES (?, ?)",
+                                 (food["fdcId"], food["description"]))
+            self._db.commit()
+            self._writes += 1
+
+    # Searching
+
+    def search(self, query, limit=5, **bounds):
+        """Foods matching query, best first, in the API's search-result shape.
+
+        bounds are nutrient limits such as max_sodium=140 or min_protein=10 (per 100 g).
+        All query words must match; if nothing does, any word may.
+        """
+        words = [w for w in re.findall(r"\w+", query.lower()) if w not in IGNORED_WORDS]
+        if not words:
+            return []
+        filters, params = [], []
+        for name, value in bounds.items():
+            op, column = name.split("_", 1)
+            if op not in ("min", "max") or column not in NUTRIENTS:
+                raise ValueError(f"Unknown nutrient bound '{name}'")
+            filters.append(f"foods.{column} {'>=' if op == 'min' else '<='} ?")
+            params.append(value)
+        where = "".join(f" AND {f}" for f in filters)
+        sql = (
+            f"SELECT foods.* FROM foods_fts JOIN foods ON foods.fdc_id = foods_fts.rowid "
+            f"WHERE foods_fts MATCH ?{where} ORDER BY bm25(foods_fts) LIMIT ?"
+        )
+        with self._lock:
+            for joiner in (" ", " OR "):
+                match = joiner.join(f'"{w}"' for w in words)
+                rows = self._db.execute(sql, (match, *params, limit)).fetchall()
+                if rows:
+                    return [self._to_food(row) for row in rows]
+        return []
+
+    def get(self, fdc_id):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM foods WHERE fdc_id = ?", (fdc_id,)).fetchone()
+        return self._to_food(row) if row else None
+
+    def nutrient_rows(self):
+        """(fdc_id, description, *nutrients in NUTRIENTS order) for every food with a known energy value."""
+        with self._lock:
+            return self._db.execute(
+                f"SELECT fdc_id, description, {', '.join(NUTRIENTS)} FROM foods WHERE energy > 0"
+            ).fetchall()
+
+    def _to_food(self, row):
+        fdc_id, description, data_type, *amounts = row
+        nutrients = [
+            {"nutrientName": NUTRIENTS[column][0], "unitName": NUTRIENTS[column][1], "value": amount}
+            for column, amount in zip(NUTRIENTS, amounts)
+            if amount is not None
+        ]
+        return {"fdcId": fdc_id, "description": description, "dataType": data_type, "foodNutrients": nutrients}
+
+    def lookup(self, query, remote=REMOTE_FALLBACK):
+        """Best food for query from the index, falling back to (and caching) the remote API."""
+        with stage("food_index.search"):
+            foods = self.search(query, limit=1)
+        if foods:
+            return foods[0]
+        with self._lock:
+            row = self._db.execute("SELECT fdc_ids FROM remote_queries WHERE query = ?", (query,)).fetchone()
+        if row is not None:
+            ids = json.loads(row[0])
+            return self.get(ids[0]) if ids else None
+        if not remote:
+            return None
+        with stage("food_index.remote"):
+            foods = fetch_remote(query)
+        if foods is None:  # Network error: try again next time
+            return None
+        self.add_foods(foods)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO remote_queries VALUES (?, ?, ?)",
+                             (query, json.dumps([f["fdcId"] for f in foods]), time.time()))
+            self._db.commit()
+        return self.get(foods[0]["fdcId"]) if foods else None
+
+
+def fetch_remote(query, api_key=API_KEY, page_size=10):
+    """Foods from the FoodData Central search API, or None when the request fails."""
+    import requests
+
+    try:
+        response = requests.get(API_URL, params={"query": query, "api_key": api_key, "pageSize": page_size},
+                                timeout=REMOTE_TIMEOUT)
+    except Exception:
+        return None
+    if response.status_code != 200:
+        return None
+    return response.json().get("foods", [])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the local FoodData Central index.")
+    parser.add_argument("--db", default=DB_PATH, help="SQLite index file")
+    commands = parser.add_subparsers(dest="command", required=True)
+    importer = commands.add_parser("import", help="Import a FoodData Central CSV directory or JSON file")
+    importer.add_argument("source")
+    searcher = commands.add_parser("search", help="Search the index")
+    searcher.add_argument("query")
+    searcher.add_argument("--limit", type=int, default=5)
+    for column in NUTRIENTS:
+        searcher.add_argument(f"--min-{column.replace('_', '-')}", type=float, dest=f"min_{column}")
+        searcher.add_argument(f"--max-{column.replace('_', '-')}", type=float, dest=f"max_{column}")
+    args = parser.parse_args()
+
+    index = FoodIndex(args.db)
+    if args.command == "import":
+        index.import_export(args.source)
+        return
+    bounds = {k: v for k, v in vars(args).items() if k[:4] in ("min_", "max_") and v is not None}
+    start = time.perf_counter()
+    foods = index.search(args.query, limit=args.limit, **bounds)
+    elapsed = (time.perf_counter() - start) * 1000
+    for food in foods:
+        nutrients = ", ".join(f"{n['nutrientName']} {n['value']:g} {n['unitName']}" for n in food["foodNutrients"][:4])
+        print(f"{food['fdcId']}  {food['description']}  [{nutrients}]")
+    print(f"{len(foods)} foods in {elapsed:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Keep-alive client for the health-data API (default http://localhost:5000).
+
+One pooled requests.Session is shared by all lookups, with connect/read
+timeouts and bounded retries with exponential backoff on connection errors
+and 502/503/504. get_many() fetches many users in one POST to /get_batch
+when the server has it and otherwise falls back to parallel GETs on the same
+connection pool. health_api_stub.py is a local server for trying it out.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10
+RETRIES = 3
+BACKOFF = 0.3  # Seconds; doubles on every retry
+POOL_SIZE = 16
+
+
+class HealthAPIError(Exception):
+    """Request failed; the message is shown to the user as-is."""
+
+
+class HealthAPIClient:
+    def __init__(self, base_url="http://localhost:5000", connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 retries=RETRIES, backoff=BACKOFF, pool_size=POOL_SIZE):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_size = pool_size
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(["GET", "POST"]),  # Lookups are read-only, so POST is safe to retry
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._has_batch = None  # Unknown until the first get_many
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.session.close()
+
+    def get(self, user_id):
+        """One user's record, or None when the API has no such user."""
+        try:
+            response = self.session.get(f"{self.base_url}/get/{user_id}", timeout=self.timeout)
+        except Exception as e:
+            raise HealthAPIError(f"Request Error: {str(e)}")
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            raise HealthAPIError(f"API Error: {response.status_code} - {response.text}")
+        return response.json()
+
+    def get_many(self, user_ids):
+        """{user_id: record or None} for many users in as few round trips as possible.
+
+        A failed lookup maps to its HealthAPIError instead of failing the batch.
+        """
+        user_ids = [str(user_id) for user_id in dict.fromkeys(user_ids)]
+        if not user_ids:
+            return {}
+        if self._has_batch is not False:
+            records = self._get_batch(user_ids)
+            if records is not None:
+                return records
+        return self._get_parallel(user_ids)
+
+    def _get_batch(self, user_ids):
+        try:
+            response = self.session.post(f"{self.base_url}/get_batch", json={"ids": user_ids}, timeout=self.timeout)
+        except Exception:
+            return None  # Let the per-user path report connection errors
+        if response.status_code in (404, 405, 501):
+            with self._lock:
+                self._has_batch = False  # Remember: this server only has /get/<id>
+            return None
+        if response.status_code != 200:
+            return None
+        with self._lock:
+            self._has_batch = True
+        found = {str(key): value for key, value in response.json().items()}
+        return {user_id: found.get(user_id) for user_id in user_ids}
+
+    def _get_parallel(self, user_ids):
+        def fetch(user_id):
+            try:
+                return self.get(user_id)
+            except HealthAPIError as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=min(self.pool_size, len(user_ids))) as pool:
+            return dict(zip(user_ids, pool.map(fetch, user_ids)))
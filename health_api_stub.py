@@ -0,0 +1,101 @@
+"""Local stand-in for the health-data API.
+
+Serves GET /get/<id> like the real service and, unless disabled, a
+POST /get_batch endpoint taking {"ids": [...]} and returning {id: record}.
+Latency and a number of initial 503 failures can be injected to exercise
+timeouts and retries:
+
+    python health_api_stub.py --port 5000 --latency 0.05
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SAMPLE_RECORDS = {
+    "1": {"id": 1, "name": "Asha Verma", "current_health": "Diabetes", "past_health": "None"},
+    "2": {"id": 2, "name": "Ravi Kumar", "current_health": "Hypertension", "past_health": "Heart Disease"},
+    "3": {"id": 3, "name": "Meera Nair", "current_health": "Chronic Kidney Disease", "past_health": "Diabetes"},
+}
+
+
+class HealthAPIStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like a real server
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # The client timed out and hung up; nothing left to send
+
+    def _should_fail(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            if server.failures_left > 0:
+                server.failures_left -= 1
+                return True
+        return False
+
+    def do_GET(self):
+        if not self.path.startswith("/get/"):
+            self._reply(404, {"error": "not found"})
+            return
+        time.sleep(self.server.latency)
+        if self._should_fail():
+            self._reply(503, {"error": "unavailable"})
+            return
+        record = self.server.records.get(self.path[len("/get/"):])
+        if record is None:
+            self._reply(404, {"error": "user not found"})
+        else:
+            self._reply(200, record)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path != "/get_batch" or not self.server.batch:
+            self._reply(404, {"error": "not found"})
+            return
+        time.sleep(self.server.latency)
+        if self._should_fail():
+            self._reply(503, {"error": "unavailable"})
+            return
+        ids = json.loads(body or b"{}").get("ids", [])
+        self._reply(200, {str(i): self.server.records[str(i)] for i in ids if str(i) in self.server.records})
+
+
+def start_stub(records=None, latency=0.0, batch=True, failures=0, port=0):
+    """Start the stub in a background thread; returns (server, base_url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), HealthAPIStubHandler)
+    server.daemon_threads = True
+    server.records = {str(k): v for k, v in (records or SAMPLE_RECORDS).items()}
+    server.latency = latency
+    server.batch = batch
+    server.failures_left = failures
+    server.requests = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub health-data API.")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--no-batch", action="store_true", help="Serve only GET /get/<id>")
+    args = parser.parse_args()
+    server, url = start_stub(latency=args.latency, batch=not args.no_batch, port=args.port)
+    print(f"Health API stub on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,231 @@
+"""Health-data lookups behind one repository with a per-user TTL cache.
+
+app.py used to define fetch_health_data twice (MySQL, then the HTTP API), so
+whichever came last silently won, and the MySQL version opened a new
+connection for every lookup. The source is now chosen explicitly with
+HEALTH_DATA_SOURCE ("http", "mysql" or "sqlite"):
+
+- MySQLHealthSource borrows from a connection pool and runs a prepared
+  statement selecting only the columns the apps use;
+- HTTPHealthSource calls the health-data API through health_api_client's
+  keep-alive session, with timeouts, retries and batch lookups;
+- SQLiteHealthSource is a local stand-in with the same table, for tests and
+  offline development (init_sqlite creates it).
+
+HealthRepository caches each user's record for HEALTH_CACHE_TTL seconds;
+get_many() looks up a whole care-team list at once and invalidate() drops one
+user or everyone.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from metrics import stage
+
+COLUMNS = ("id", "name", "current_health", "past_health")
+SELECT_SQL = "SELECT id, name, current_health, past_health FROM health_data WHERE id = %s"
+
+# MySQL Database Configuration
+DB_CONFIG = {
+    "host": os.getenv("HEALTH_DB_HOST", "localhost"),
+    "user": os.getenv("HEALTH_DB_USER", "root"),
+    "password": os.getenv("HEALTH_DB_PASSWORD", "admin@123"),
+    "database": os.getenv("HEALTH_DB_NAME", "plate"),
+}
+DB_POOL_SIZE = int(os.getenv("HEALTH_DB_POOL_SIZE", "5"))
+API_BASE_URL = os.getenv("HEALTH_API_URL", "http://localhost:5000")
+SQLITE_PATH = os.getenv("HEALTH_SQLITE_PATH", "health_data.sqlite3")
+CACHE_TTL = float(os.getenv("HEALTH_CACHE_TTL", "300"))
+
+
+class HealthDataError(Exception):
+    """Lookup failed; the message is shown to the user as-is."""
+
+
+class MySQLHealthSource:
+    def __init__(self, config=None, pool_size=DB_POOL_SIZE):
+        self.config = config or DB_CONFIG
+        self.pool_size = pool_size
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # mysql.connector's pool raises instead of waiting when it is empty
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                from mysql.connector import pooling
+
+                self._pool = pooling.MySQLConnectionPool(
+                    pool_name="health_data", pool_size=self.pool_size, **self.config
+                )
+            return self._pool
+
+    def fetch(self, user_id):
+        try:
+            with self._slots:
+                conn = self._get_pool().get_connection()
+                try:
+                    cursor = conn.cursor(prepared=True)
+                    cursor.execute(SELECT_SQL, (user_id,))
+                    row = cursor.fetchone()
+                    cursor.close()
+                finally:
+                    conn.close()  # Returns the connection to the pool
+        except Exception as e:
+            raise HealthDataError(f"Database Error: {str(e)}")
+        return dict(zip(COLUMNS, row)) if row else None
+
+
+class SQLiteHealthSource:
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()  # One connection per thread, reused
+
+    def fetch(self, user_id):
+        try:
+            conn = getattr(self._local, "conn", None)
+            if conn is None:
+                conn = self._local.conn = sqlite3.connect(self.path)
+            row = conn.execute(SELECT_SQL.replace("%s", "?"), (user_id,)).fetchone()
+        except Exception as e:
+            raise HealthDataError(f"Database Error: {str(e)}")
+        return dict(zip(COLUMNS, row)) if row else None
+
+
+class HTTPHealthSource:
+    def __init__(self, base_url=API_BASE_URL):
+        self.base_url = base_url.rstrip("/")
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    def _get_client(self):
+        with self._client_lock:
+            if self._client is None:
+                from health_api_client import HealthAPIClient
+
+                self._client = HealthAPIClient(self.base_url)  # Keep-alive pool shared by every lookup
+            return self._client
+
+    def fetch(self, user_id):
+        from health_api_client import HealthAPIError
+
+        try:
+            return self._get_client().get(user_id)
+        except HealthAPIError as e:
+            raise HealthDataError(str(e))
+
+    def fetch_many(self, user_ids):
+        records = self._get_client().get_many(user_ids)
+        return {
+            user_id: HealthDataError(str(record)) if isinstance(record, Exception) else record
+            for user_id, record in records.items()
+        }
+
+
+SOURCES = {
+    "mysql": MySQLHealthSource,
+    "http": HTTPHealthSource,
+    "sqlite": SQLiteHealthSource,
+}
+
+
+class HealthRepository:
+    """Read-through cache of health records in front of one source."""
+
+    def __init__(self, source, ttl=CACHE_TTL):
+        self.source = source
+        self.ttl = ttl
+        self._cache = {}  # user_id -> (fetched_at, record)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        """Health record for user_id, or None when there is none; raises HealthDataError."""
+        key = str(user_id).strip()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry and now - entry[0] < self.ttl:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        with stage("health_data.fetch"):
+            record = self.source.fetch(key)
+        if record is not None:  # Users created later must not stay "missing"
+            with self._lock:
+                self._cache[key] = (now, record)
+        return record
+
+    def get_many(self, user_ids):
+        """{user_id: record, None or HealthDataError} for many users; cached ones skip the source.
+
+        Sources with fetch_many() get all misses in one call; others are asked one by one.
+        """
+        keys = list(dict.fromkeys(str(user_id).strip() for user_id in user_ids))
+        now = time.monotonic()
+        results, missing = {}, []
+        with self._lock:
+            for key in keys:
+                entry = self._cache.get(key)
+                if entry and now - entry[0] < self.ttl:
+                    self.hits += 1
+                    results[key] = entry[1]
+                else:
+                    self.misses += 1
+                    missing.append(key)
+        if missing:
+            if hasattr(self.source, "fetch_many"):
+                with stage("health_data.fetch_many"):
+                    fetched = self.source.fetch_many(missing)
+            else:
+                fetched = {}
+                for key in missing:
+                    try:
+                        fetched[key] = self.source.fetch(key)
+                    except HealthDataError as e:
+                        fetched[key] = e
+            with self._lock:
+                for key, record in fetched.items():
+                    if record is not None and not isinstance(record, Exception):
+                        self._cache[key] = (now, record)
+            results.update(fetched)
+        return {key: results.get(key) for key in keys}
+
+    def invalidate(self, user_id=None):
+        """Forget one user's cached record, or all of them."""
+        with self._lock:
+            if user_id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(str(user_id).strip(), None)
+
+
+_repository = None
+_repository_lock = threading.Lock()
+
+
+def get_health_repository():
+    """Process-wide repository for the source named by HEALTH_DATA_SOURCE."""
+    global _repository
+    with _repository_lock:
+        if _repository is None:
+            name = os.getenv("HEALTH_DATA_SOURCE", "http")
+            if name not in SOURCES:
+                raise ValueError(f"HEALTH_DATA_SOURCE must be one of {', '.join(SOURCES)}, not '{name}'")
+            _repository = HealthRepository(SOURCES[name]())
+        return _repository
+
+
+def init_sqlite(path, rows=()):
+    """Create the health_data table in a SQLite file and insert (id, name, current, past) rows."""
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS health_data ("
+        "id INTEGER PRIMARY KEY, name TEXT, current_health TEXT, past_health TEXT)"
+    )
+    conn.executemany("INSERT OR REPLACE INTO health_data VALUES (?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
@@ -0,0 +1,121 @@
+"""Token-budgeted conversation history for the Groq analysis thread.
+
+The apps used to append every prompt (each embedding the full health-data
+block) to one list and resend all of it on every call. ConversationHistory
+instead:
+
+- sends shared context (health data, label text) once, as a system message,
+  instead of repeating it in every user turn;
+- drops paragraphs of a new prompt that were already sent, as context or
+  in an earlier user turn;
+- folds the oldest turns into a compact summary when the prompt would go
+  over the token budget (HISTORY_TOKEN_BUDGET, default 3000).
+
+Translation requests are not part of the thread; they send only the text to
+translate.
+"""
+import os
+import re
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "3000"))
+MESSAGE_OVERHEAD_TOKENS = 4  # Role and separators per chat message
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token for English)."""
+    return max(1, len(text) // 4) if text else 0
+
+
+def count_message_tokens(messages):
+    """Estimated prompt tokens for a list of chat messages."""
+    return sum(estimate_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def format_health_context(health_data):
+    """The user's health record as one block, sent once per conversation."""
+    return (
+        "User's Health Data:\n"
+        f"- Name: {health_data.get('name', 'N/A')}\n"
+        f"- Current Health: {health_data.get('current_health', 'N/A')}\n"
+        f"- Past Health: {health_data.get('past_health', 'N/A')}"
+    )
+
+
+def _first_sentence(text, limit):
+    sentence = _SENTENCE_END.split(" ".join(text.split()), maxsplit=1)[0]
+    return sentence if len(sentence) <= limit else sentence[:limit - 1].rstrip() + "…"
+
+
+def _paragraphs(text):
+    return [p.strip() for p in re.split(r"\n\s*\n", text) if p.strip()]
+
+
+class ConversationHistory:
+    def __init__(self, budget=HISTORY_TOKEN_BUDGET, keep_recent_turns=2, summarizer=None):
+        self.budget = budget
+        self.keep_recent_turns = keep_recent_turns
+        # Callable(list of messages) -> summary text; defaults to a local extractive summary
+        self.summarizer = summarizer or self._summarize_locally
+        self.context = ""
+        self.summary = ""
+        self.turns = []  # Alternating user/assistant messages
+
+    def __len__(self):
+        return len(self.turns)
+
+    def clear(self):
+        self.context, self.summary, self.turns = "", "", []
+
+    def set_context(self, context):
+        """Shared context (e.g. health data) sent once instead of in every turn."""
+        self.context = context.strip()
+
+    def messages_for(self, prompt):
+        """Messages to send for a new user prompt, within the token budget."""
+        prompt = self._dedupe(prompt)
+        self._fit(estimate_tokens(prompt) + MESSAGE_OVERHEAD_TOKENS)
+        return self._system_messages() + list(self.turns) + [{"role": "user", "content": prompt}]
+
+    def add_turn(self, prompt, response):
+        """Record a completed exchange."""
+        self.turns.append({"role": "user", "content": self._dedupe(prompt)})
+        self.turns.append({"role": "assistant", "content": response})
+
+    def token_count(self):
+        return count_message_tokens(self._system_messages() + self.turns)
+
+    def _system_messages(self):
+        parts = [self.context] if self.context else []
+        if self.summary:
+            parts.append("Summary of the earlier conversation:\n" + self.summary)
+        return [{"role": "system", "content": "\n\n".join(parts)}] if parts else []
+
+    def _dedupe(self, prompt):
+        # Drop paragraphs already sent as context or in an earlier turn
+        seen = set(_paragraphs(self.context))
+        for message in self.turns:
+            if message["role"] == "user":
+                seen.update(p for p in _paragraphs(message["content"]) if len(p) > 40)
+        kept = [p for p in _paragraphs(prompt) if p not in seen]
+        return "\n\n".join(kept) if kept else prompt.strip()
+
+    def _fit(self, incoming_tokens):
+        # Fold the oldest exchanges into the summary until the prompt fits
+        keep = self.keep_recent_turns * 2
+        while self.token_count() + incoming_tokens > self.budget and len(self.turns) > keep:
+            folded, self.turns = self.turns[:2], self.turns[2:]
+            new_summary = self.summarizer(folded)
+            self.summary = f"{self.summary}\n{new_summary}".strip() if self.summary else new_summary
+        # The summary itself must not crowd out the conversation
+        lines = self.summary.splitlines()
+        while lines and estimate_tokens("\n".join(lines)) > self.budget // 4:
+            lines.pop(0)
+        self.summary = "\n".join(lines)
+
+    @staticmethod
+    def _summarize_locally(messages):
+        user = next((m["content"] for m in messages if m["role"] == "user"), "")
+        assistant = next((m["content"] for m in messages if m["role"] == "assistant"), "")
+        return f"- User: {_first_sentence(user, 120)} / Assistant: {_first_sentence(assistant, 200)}"
@@ -0,0 +1,270 @@
+"""Bounded-memory decoding of uploaded images.
+
+Every upload path used to Image.open() the file, decode it at full
+resolution, sometimes convert it to RGB, hand the PIL image to OCR (which
+copied it into an array and hashed another copy), and render the original with
+st.image. A 20 MP photo is about 60 MB per decoded copy, so a few concurrent
+uploads cost hundreds of MB before preprocessing shrank them to ~2000 px.
+
+decode() reads the image header first and refuses files over
+IMAGE_MAX_UPLOAD_MB or IMAGE_MAX_PIXELS (ImageTooLarge). It then decodes at
+the size preprocessing would shrink to anyway: JPEGs go through PIL's draft
+mode, so libjpeg scales by 1/2, 1/4 or 1/8 while decoding, and engines that
+work on grayscale get the luma channel without any RGB image being built. The
+result is a C-contiguous array that extract_text() and the engines use as it
+is. preview() decodes a separate small copy for display.
+
+    python image_ingest.py --benchmark [photo.jpg ...]
+
+measures peak RSS per upload for the old full-resolution path and for
+decode(), each in a fresh interpreter.
+"""
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image
+
+from metrics import peak_rss, stage
+
+MAX_UPLOAD_BYTES = int(float(os.getenv("IMAGE_MAX_UPLOAD_MB", "20")) * 1024 * 1024)
+MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(50_000_000)))
+MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "2000"))  # For engines without preprocessing
+PREVIEW_SIDE = int(os.getenv("IMAGE_PREVIEW_SIDE", "800"))
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+@dataclass
+class Upload:
+    array: np.ndarray  # What the OCR engines get
+    preview: Image.Image  # What the page shows
+    original_size: tuple  # (width, height) stored in the file
+    size_bytes: int
+
+    @property
+    def scale(self):
+        return self.array.shape[1] / self.original_size[0]
+
+
+def _source(file):
+    """Seekable file object (or path) for an upload, path or bytes, rewound to the start."""
+    if isinstance(file, (bytes, bytearray, memoryview)):
+        return io.BytesIO(file)
+    if hasattr(file, "seek"):
+        file.seek(0)
+    return file
+
+
+def _size_bytes(source):
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    source.seek(0, io.SEEK_END)
+    size = source.tell()
+    source.seek(0)
+    return size
+
+
+def open_image(file, max_bytes=MAX_UPLOAD_BYTES, max_pixels=MAX_PIXELS):
+    """Lazily opened PIL image (header read, pixels not yet decoded) after the size checks."""
+    source = _source(file)
+    size = _size_bytes(source)
+    if size > max_bytes:
+        raise ImageTooLarge(f"Image is {size / 2 ** 20:.1f} MB; the limit is {max_bytes / 2 ** 20:.0f} MB")
+    try:
+        image = Image.open(source)
+    except Image.DecompressionBombError as e:
+        raise ImageTooLarge(str(e))
+    width, height = image.size
+    if width * height > max_pixels:
+        raise ImageTooLarge(f"Image is {width}x{height} ({width * height / 1e6:.0f} MP); "
+                            f"the limit is {max_pixels / 1e6:.0f} MP")
+    return image
+
+
+def target_size(size, max_side, target_dpi=None, dpi=None):
+    """(width, height) that preprocessing.downscale() would produce, never enlarging."""
+    width, height = size
+    scale = min(1.0, max_side / max(width, height))
+    if target_dpi and dpi and dpi >= 150:  # Same rule as preprocessing: phone photos report 72/96 DPI
+        scale = min(scale, target_dpi / dpi)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def _reduced(image, size, mode):
+    # Draft mode lets libjpeg decode straight to mode and to the smallest 1/2^n scale still >= size
+    if image.format == "JPEG":
+        image.draft(mode, size)
+    if image.mode != mode:
+        image = image.convert(mode)  # The only conversion; RGB/L input is not copied just to normalise it
+    if image.size[0] > size[0] or image.size[1] > size[1]:
+        image.thumbnail(size)  # In place, with a cheap box reduce() first for non-JPEG formats
+    return image
+
+
+def decode(file, engine=None, max_side=None, grayscale=None, max_bytes=MAX_UPLOAD_BYTES, max_pixels=MAX_PIXELS):
+    """C-contiguous uint8 array of an uploaded image, decoded at the size `engine` preprocesses to.
+
+    Raises ImageTooLarge past the byte or pixel cap.
+    """
+    from preprocessing import default_config
+
+    config = default_config(engine) if engine else None
+    if config is not None and config.enabled:
+        max_side = max_side or config.max_side
+        grayscale = config.grayscale if grayscale is None else grayscale
+        target_dpi = config.target_dpi
+    else:
+        max_side, target_dpi = max_side or MAX_SIDE, None
+    with stage("image.decode"):
+        image = open_image(file, max_bytes, max_pixels)
+        dpi = image.info.get("dpi")
+        try:
+            dpi = float(dpi[0]) if dpi else None
+        except (TypeError, ValueError, IndexError):
+            dpi = None
+        image = _reduced(image, target_size(image.size, max_side, target_dpi, dpi), "L" if grayscale else "RGB")
+        # Pillow's array interface hands over its one tobytes() buffer; numpy wraps it without copying
+        return np.asarray(image)
+
+
+def read_encoded(file, max_bytes=MAX_UPLOAD_BYTES, max_pixels=MAX_PIXELS):
+    """The upload's bytes exactly as uploaded, after the same size checks as decode().
+
+    For engines that take encoded images (Cloud Vision) when preprocessing is off.
+    """
+    if isinstance(file, (bytes, bytearray, memoryview)):
+        data = bytes(file)
+    else:
+        source = _source(file)
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, "rb") as f:
+                data = f.read()
+        else:
+            data = source.read()
+    open_image(data, max_bytes, max_pixels).close()
+    return data
+
+
+def preview(file, side=PREVIEW_SIDE, max_bytes=MAX_UPLOAD_BYTES, max_pixels=MAX_PIXELS):
+    """Small RGB copy of an upload for st.image."""
+    with stage("image.preview"):
+        image = open_image(file, max_bytes, max_pixels)
+        return _reduced(image, target_size(image.size, side), "RGB")
+
+
+def ingest(file, engine=None, preview_side=PREVIEW_SIDE):
+    """Upload with the OCR array for `engine` and a display preview; raises ImageTooLarge."""
+    original_size = open_image(file).size  # Header only
+    return Upload(array=decode(file, engine), preview=preview(file, preview_side), original_size=original_size,
+                  size_bytes=_size_bytes(_source(file)))
+
+
+# Benchmark
+
+def _benchmark_run(method, path, engine):
+    # Runs inside a fresh interpreter so each upload's peak RSS is its own
+    from ocr_cache import image_digest
+    from ocr_engines import image_dpi, to_array
+    from preprocessing import default_config, preprocess
+
+    config = default_config(engine)
+    baseline = peak_rss()
+    start = time.perf_counter()
+    if method == "full":  # What the apps did: full decode, hash and array copies, then preprocessing
+        image = Image.open(path)
+        image.load()
+        preview_image = image
+        image_digest(image)
+        array, _ = preprocess(to_array(image), config, dpi=image_dpi(image))
+    else:
+        image_digest(path)  # What the apps hash now: the encoded file
+        upload = ingest(path, engine)
+        preview_image = upload.preview
+        array, _ = preprocess(upload.array, config)
+    return {
+        "method": method,
+        "seconds": round(time.perf_counter() - start, 3),
+        "peak_rss_mb": round(peak_rss() / 2 ** 20, 1),
+        "peak_rss_growth_mb": round((peak_rss() - baseline) / 2 ** 20, 1),  # Above the peak after imports
+        "preview": "x".join(map(str, preview_image.size)),
+        "ocr_input": "x".join(map(str, array.shape)),
+    }
+
+
+def benchmark(paths, engine="easyocr", methods=("full", "ingest")):
+    """One row per image and method, each measured in a fresh interpreter."""
+    rows = []
+    for path in paths:
+        for method in methods:
+            command = [sys.executable, os.path.abspath(__file__), "--benchmark-run", method, path, "--engine", engine]
+            output = subprocess.run(command, capture_output=True, text=True)
+            try:
+                row = json.loads(output.stdout.strip().splitlines()[-1])
+            except (ValueError, IndexError):
+                row = {"method": method, "error": (output.stderr.strip().splitlines() or ["no output"])[-1]}
+            rows.append(dict(row, image=os.path.basename(path)))
+    return rows
+
+
+def sample_photo(path, size=(5472, 3648)):
+    """Write a 20 MP JPEG with a noisy background and a text panel, like a phone photo of a label."""
+    from PIL import ImageDraw
+
+    rng = np.random.default_rng(0)
+    image = Image.fromarray(rng.integers(90, 200, (size[1], size[0], 3), dtype=np.uint8))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((size[0] // 4, size[1] // 6, size[0] * 3 // 4, size[1] * 5 // 6), fill="white", outline="black",
+                   width=12)
+    for row in range(30):
+        y = size[1] // 6 + 60 + row * 80
+        draw.text((size[0] // 4 + 60, y), f"Nutrition Facts  Total Sugars {row} g  Sodium {row * 40} mg",
+                  fill="black")
+    image.save(path, quality=90)
+    return path
+
+
+def format_benchmark(rows):
+    lines = [f"{'image':<20} {'method':<7} {'seconds':>7} {'peak MB':>8} {'growth MB':>9} {'preview':>10} "
+             f"{'OCR input':>14}"]
+    for row in rows:
+        if "error" in row:
+            lines.append(f"{row['image']:<20} {row['method']:<7} failed: {row['error']}")
+            continue
+        lines.append(f"{row['image']:<20} {row['method']:<7} {row['seconds']:>7} {row['peak_rss_mb']:>8} "
+                     f"{row['peak_rss_growth_mb']:>9} {row['preview']:>10} {row['ocr_input']:>14}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode an upload within the memory caps, or benchmark decoding.")
+    parser.add_argument("paths", nargs="*", help="Images (default for --benchmark: a generated 20 MP JPEG)")
+    parser.add_argument("--engine", default="easyocr", help="OCR engine whose preprocessing size is targeted")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--benchmark-run", choices=["full", "ingest"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.benchmark_run:
+        print(json.dumps(_benchmark_run(args.benchmark_run, args.paths[0], args.engine)))
+        return
+    if args.benchmark:
+        paths = args.paths or [sample_photo(os.path.join(tempfile.mkdtemp(), "label_20mp.jpg"))]
+        print(format_benchmark(benchmark(paths, args.engine)))
+        return
+    for path in args.paths:
+        upload = ingest(path, args.engine)
+        print(f"{path}: {upload.original_size[0]}x{upload.original_size[1]} -> {upload.array.shape} "
+              f"(scale {upload.scale:.2f}), preview {upload.preview.size}")
+
+
+if __name__ == "__main__":
+    main()
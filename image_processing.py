@@ -1,31 +1,167 @@
+"""Google Cloud Vision text extraction: one image, batches, and asyncio.
+
+Text extraction used to be one synchronous text_detection round trip per
+image, keeping only the full text. Bulk scans now
+go through annotate_batch(), which packs up to MAX_IMAGES_PER_REQUEST images
+into each batch_annotate_images request, or annotate_batch_async(), which also
+keeps up to VISION_MAX_CONCURRENCY of those requests in flight. Both return a
+VisionResult per image with word boxes (and confidences with
+VISION_FEATURE=DOCUMENT_TEXT_DETECTION), retry quota and availability errors
+with exponential backoff, and report a failed image in its result instead of
+failing the whole batch.
+
+Pass client= (fake_vision.FakeVisionClient / FakeAsyncVisionClient) to run
+without credentials.
+"""
+import asyncio
 import os
-from google.cloud import vision
-from google.oauth2 import service_account
+import random
+import time
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# Set up Google Cloud Vision client
+# Google Cloud Vision settings
 CREDENTIALS_FILE = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+FEATURE = os.getenv("VISION_FEATURE", "TEXT_DETECTION")  # DOCUMENT_TEXT_DETECTION adds word confidences
+MAX_IMAGES_PER_REQUEST = 16  # Vision's limit for one images:annotate call
+MAX_CONCURRENCY = int(os.getenv("VISION_MAX_CONCURRENCY", "4"))
+MAX_RETRIES = int(os.getenv("VISION_MAX_RETRIES", "5"))
+BACKOFF = float(os.getenv("VISION_BACKOFF", "0.5"))  # Seconds before the first retry, doubled each time
+RETRY_CODES = {429, 503}  # Quota exhausted, service unavailable
 
-try:
-    credentials = service_account.Credentials.from_service_account_file(CREDENTIALS_FILE)
-    vision_client = vision.ImageAnnotatorClient(credentials=credentials)
-except Exception as e:
-    raise Exception(f"Error initializing Google Cloud Vision client: {e}")
+_clients = {}
 
-def extract_text_from_image(image_bytes):
-    """Extracts text from an uploaded image using Google Cloud Vision API."""
-    try:
-        image = vision.Image(content=image_bytes)
-        response = vision_client.text_detection(image=image)
 
-        if response.error.message:
-            raise Exception(f"Google Cloud Vision API Error: {response.error.message}")
+def _build_client(async_client=False):
+    try:
+        from google.cloud import vision
+        from google.oauth2 import service_account
 
-        texts = response.text_annotations
-        return texts[0].description if texts else "No text detected in the image."
-    
+        credentials = service_account.Credentials.from_service_account_file(CREDENTIALS_FILE)
+        if async_client:
+            return vision.ImageAnnotatorAsyncClient(credentials=credentials)
+        return vision.ImageAnnotatorClient(credentials=credentials)
     except Exception as e:
-        return f"Error processing image: {e}"
\ No newline at end of file
+        raise Exception(f"Error initializing Google Cloud Vision client: {e}")
+
+
+def get_vision_client():
+    """Shared synchronous client, created on first use."""
+    if "sync" not in _clients:
+        _clients["sync"] = _build_client()
+    return _clients["sync"]
+
+
+@dataclass
+class VisionResult:
+    text: str = ""
+    words: list = field(default_factory=list)  # ocr_engines.OCRWord
+    error: str = None
+
+
+def _request(content, feature):
+    try:
+        from google.cloud import vision
+    except ImportError:  # Running against a local fake client
+        return SimpleNamespace(image=SimpleNamespace(content=content), features=[SimpleNamespace(type_=feature)])
+    return vision.AnnotateImageRequest(
+        image=vision.Image(content=content),
+        features=[vision.Feature(type_=vision.Feature.Type[feature])],
+    )
+
+
+def _box(vertices):
+    xs = [v.x for v in vertices]
+    ys = [v.y for v in vertices]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def parse_response(response):
+    """VisionResult from one AnnotateImageResponse."""
+    from ocr_engines import OCRWord
+
+    if response.error.message:
+        return VisionResult(error=f"Google Cloud Vision API Error: {response.error.message}")
+    document = getattr(response, "full_text_annotation", None)
+    if document is not None and document.pages:  # Word boxes with confidences
+        words = [
+            OCRWord(text="".join(symbol.text for symbol in word.symbols), box=_box(word.bounding_box.vertices),
+                    confidence=float(word.confidence))
+            for page in document.pages
+            for block in page.blocks
+            for paragraph in block.paragraphs
+            for word in paragraph.words
+        ]
+        return VisionResult(text=document.text, words=words)
+    annotations = response.text_annotations
+    if not annotations:
+        return VisionResult()
+    words = [OCRWord(text=a.description, box=_box(a.bounding_poly.vertices)) for a in annotations[1:]]
+    return VisionResult(text=annotations[0].description, words=words)
+
+
+def _retryable(error):
+    # google.api_core errors carry the HTTP status in .code (ResourceExhausted is 429)
+    return getattr(error, "code", None) in RETRY_CODES
+
+
+def _delay(attempt):
+    return BACKOFF * 2 ** attempt * random.uniform(0.5, 1.0)
+
+
+def _chunks(images, batch_size):
+    batch_size = min(batch_size, MAX_IMAGES_PER_REQUEST)
+    return [images[start:start + batch_size] for start in range(0, len(images), batch_size)]
+
+
+def _failed(chunk, error):
+    return [VisionResult(error=str(error)) for _ in chunk]
+
+
+def annotate_batch(images, client=None, feature=FEATURE, batch_size=MAX_IMAGES_PER_REQUEST):
+    """VisionResult for each encoded image, in order, sending up to batch_size images per request."""
+    client = client or get_vision_client()
+    results = []
+    for chunk in _chunks(list(images), batch_size):
+        requests = [_request(content, feature) for content in chunk]
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                response = client.batch_annotate_images(requests=requests)
+            except Exception as e:
+                if _retryable(e) and attempt < MAX_RETRIES:
+                    time.sleep(_delay(attempt))
+                    continue
+                results.extend(_failed(chunk, e))
+            else:
+                results.extend(parse_response(r) for r in response.responses)
+            break
+    return results
+
+
+async def annotate_batch_async(images, client=None, feature=FEATURE, batch_size=MAX_IMAGES_PER_REQUEST,
+                               max_concurrency=MAX_CONCURRENCY):
+    """Like annotate_batch(), with up to max_concurrency batch requests in flight."""
+    if client is None:
+        client = _build_client(async_client=True)  # Async clients belong to the running event loop
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(chunk):
+        requests = [_request(content, feature) for content in chunk]
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                async with semaphore:
+                    response = await client.batch_annotate_images(requests=requests)
+            except Exception as e:
+                if _retryable(e) and attempt < MAX_RETRIES:
+                    await asyncio.sleep(_delay(attempt))  # Back off without holding a slot
+                    continue
+                return _failed(chunk, e)
+            return [parse_response(r) for r in response.responses]
+
+    batches = await asyncio.gather(*(run(chunk) for chunk in _chunks(list(images), batch_size)))
+    return [result for batch in batches for result in batch]
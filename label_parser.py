@@ -0,0 +1,331 @@
+"""Rule-based nutrition-label parsing, so simple label questions skip the LLM.
+
+Every label analysis used to send the raw OCR text to Groq, even to read off
+calories or sodium. parse_label() turns OCR output into a NutritionLabel
+(serving size, energy, macros, sodium, %DV) with precompiled patterns that
+tolerate common OCR confusions (O/0, l/I/1, S/5 in numbers and "g" read as
+"9" on lines that also print a %DV). The apps send its compact JSON summary instead of the raw text, check
+it against the user's current conditions locally (check_conditions) and
+answer plain "how much X" questions without a model call (answer_locally).
+
+Salt (EU/Indian labels) is kept as its own nutrient; amount("sodium") falls
+back to salt / 2.5 when no sodium line was printed. EU sub-rows such as
+"of which saturates" and "of which sugars" are read like their US names.
+"""
+import json
+import re
+from dataclasses import asdict, dataclass, field
+
+# nutrient -> (pattern for its name on a label, default unit); more specific names first
+NUTRIENT_PATTERNS = {
+    "saturated_fat": (r"sat(?:urated|\.)?\s*fat|saturates", "g"),
+    "trans_fat": (r"trans\s*fat", "g"),
+    "total_fat": (r"(?:total\s*)?fat|total\s*lipids?", "g"),
+    "cholesterol": (r"ch[o0][l1I]ester[o0][l1I]", "mg"),
+    "sodium": (r"s[o0]d[il1I]um", "mg"),
+    "salt": (r"sa[l1I]t", "g"),
+    "potassium": (r"p[o0]tass[il1I]um", "mg"),
+    "fiber": (r"(?:dietary\s*)?fib(?:er|re)", "g"),
+    "added_sugars": (r"(?:incl(?:udes|\.)?\s*)?added\s*sugars?", "g"),
+    "total_sugars": (r"(?:total\s*)?sugars?", "g"),
+    "total_carbohydrate": (r"(?:total\s*)?carb(?:ohydrate)?s?", "g"),
+    "protein": (r"pr[o0]te[il1I]ns?", "g"),
+    "calcium": (r"ca[l1I]c[il1I]um", "mg"),
+    "iron": (r"[il1I]r[o0]n", "mg"),
+    "vitamin_d": (r"v[il1I]tam[il1I]n\s*d", "mcg"),
+}
+
+_NUMBER = r"[0-9OoIl|S]+(?:[.,][0-9OoIl|S]+)?"
+_NUTRIENT_RES = {
+    name: re.compile(
+        rf"^\W*(?:of\s*which\W*)?(?:{pattern})\b\W*(?P<value>{_NUMBER})?\s*(?P<unit>mcg|µg|ug|mg|kcal|g|9)?\b"
+        rf"(?:.*?(?P<dv>{_NUMBER})\s*%)?",
+        re.IGNORECASE,
+    )
+    for name, (pattern, _) in NUTRIENT_PATTERNS.items()
+}
+_CALORIES_RE = re.compile(
+    rf"(?:ca[l1I][o0]r[il1I]es|energy)\s*(?:\((?P<paren>kcal|kj)\))?\W*(?P<value>{_NUMBER})\s*(?P<unit>kcal|kj|cal)?",
+    re.IGNORECASE,
+)
+_INCLUDES_ADDED_RE = re.compile(  # US labels: "Includes 10g Added Sugars 20%"
+    rf"incl(?:udes|\.)?\s*(?P<value>{_NUMBER})\s*(?P<unit>g|9)?\s*added\s*sugars?(?:.*?(?P<dv>{_NUMBER})\s*%)?",
+    re.IGNORECASE,
+)
+_PER_100_RE = re.compile(r"per\s*100\s*(?P<unit>g|ml)\b", re.IGNORECASE)
+_SERVING_SIZE_RE = re.compile(r"serv[il1I]ng\s*s[il1I]ze\s*[:\-]?\s*(?P<value>.+)", re.IGNORECASE)
+_SERVINGS_RE = re.compile(
+    rf"(?:(?P<before>{_NUMBER})\s*servings?\s*per\s*(?:container|pack(?:age)?)"
+    rf"|servings?\s*per\s*(?:container|pack(?:age)?)\s*[:\-]?\s*(?:about\s*)?(?P<after>{_NUMBER}))",
+    re.IGNORECASE,
+)
+_DIGIT_FIXES = str.maketrans({"O": "0", "o": "0", "I": "1", "l": "1", "|": "1", "S": "5", ",": "."})
+_SERVING_AMOUNT_RE = re.compile(rf"(?P<value>{_NUMBER})\s*(?P<unit>g|ml)\b", re.IGNORECASE)
+KJ_PER_KCAL = 4.184
+SALT_PER_SODIUM = 2.5  # Salt (NaCl) is 2.5 times its sodium by weight
+
+
+def _number(text):
+    """Float from an OCR'd number, fixing letters commonly read in place of digits."""
+    if text is None:
+        return None
+    try:
+        return float(text.translate(_DIGIT_FIXES))
+    except ValueError:
+        return None
+
+
+@dataclass
+class Nutrient:
+    amount: float = None
+    unit: str = None
+    daily_value: float = None  # %DV as printed
+
+
+@dataclass
+class NutritionLabel:
+    serving_size: str = None
+    basis: str = "serving"  # What the amounts are given for: "serving", "100g" or "100ml"
+    servings_per_container: float = None
+    calories: float = None
+    nutrients: dict = field(default_factory=dict)  # name -> Nutrient
+
+    def field_count(self):
+        return sum(v is not None for v in (self.serving_size, self.calories)) + len(self.nutrients)
+
+    def is_useful(self, min_fields=3):
+        """Whether enough was parsed to send the summary instead of the raw text."""
+        return self.field_count() >= min_fields
+
+    def summary(self):
+        """Compact dict of what was found, e.g. {"calories": 250, "sodium": "470mg (20%DV)"}."""
+        data = {"per": self.basis}
+        if self.serving_size:
+            data["serving_size"] = self.serving_size
+        if self.servings_per_container is not None:
+            data["servings_per_container"] = self.servings_per_container
+        if self.calories is not None:
+            data["calories"] = self.calories
+        for name, nutrient in self.nutrients.items():
+            value = f"{nutrient.amount:g}{nutrient.unit}" if nutrient.amount is not None else ""
+            if nutrient.daily_value is not None:
+                value = f"{value} ({nutrient.daily_value:g}%DV)".strip()
+            data[name] = value
+        return data
+
+    def to_json(self):
+        return json.dumps(self.summary(), separators=(",", ":"), ensure_ascii=False)
+
+    def amount(self, name):
+        """Amount of a nutrient in its default unit (mg/g/mcg), or None; sodium is derived from salt if need be."""
+        nutrient = self.nutrients.get(name)
+        if nutrient is None or nutrient.amount is None:
+            if name == "sodium" and self.amount("salt") is not None:
+                return round(self.amount("salt") * 1000 / SALT_PER_SODIUM, 1)
+            return None
+        return _convert(nutrient.amount, nutrient.unit, NUTRIENT_PATTERNS[name][1])
+
+    def serving_grams(self):
+        """Serving size in g (or ml) when the serving-size line states one, else None."""
+        amounts = _SERVING_AMOUNT_RE.findall(self.serving_size or "")
+        return _number(amounts[-1][0]) if amounts else None  # "1 cup (240ml)": the bracketed metric amount
+
+    def per_serving_factor(self):
+        """Multiplier from the printed amounts to one serving, or None when a per-100 label has no serving size."""
+        if self.basis == "serving":
+            return 1.0
+        grams = self.serving_grams()
+        return grams / 100 if grams else None
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def _convert(amount, unit, target):
+    scale = {"g": 1.0, "mg": 1e-3, "mcg": 1e-6}
+    if unit == target or unit not in scale or target not in scale:
+        return amount
+    return amount * scale[unit] / scale[target]
+
+
+def _unit(raw, name):
+    """Normalised unit for a match ("9" is a misread "g"); the nutrient's usual unit when none was read."""
+    raw = (raw or "").lower()
+    if raw == "9":
+        return "g"
+    if raw in ("µg", "ug"):
+        return "mcg"
+    if raw in ("", "kcal"):
+        return NUTRIENT_PATTERNS[name][1]
+    return raw
+
+
+def _add(label, name, value_text, raw_unit, dv_text):
+    # "129 15%" is "12g 15%": lines with a %DV always print a unit, so a unit-less
+    # trailing 9 is the "g". Without a %DV ("Fat 19" in a per-100g table) it is a digit.
+    if raw_unit is None and dv_text is not None and value_text and NUTRIENT_PATTERNS[name][1] == "g" \
+            and len(value_text) >= 2 and value_text.endswith("9"):
+        value_text = value_text[:-1]
+    amount = _number(value_text)
+    daily_value = _number(dv_text)
+    if amount is None and daily_value is None:
+        return False
+    label.nutrients[name] = Nutrient(amount=amount, unit=_unit(raw_unit, name), daily_value=daily_value)
+    return True
+
+
+def _parse_line(line, label):
+    calories = _CALORIES_RE.search(line)
+    if calories and label.calories is None:
+        value = _number(calories.group("value"))
+        unit = (calories.group("unit") or calories.group("paren") or "kcal").lower()
+        if value is not None:
+            label.calories = round(value / KJ_PER_KCAL) if unit == "kj" else value
+        return
+
+    added = _INCLUDES_ADDED_RE.search(line)
+    if added and "added_sugars" not in label.nutrients:
+        _add(label, "added_sugars", added.group("value"), added.group("unit"), added.group("dv"))
+        return
+
+    for name, pattern in _NUTRIENT_RES.items():
+        match = pattern.search(line)
+        if match and name not in label.nutrients \
+                and _add(label, name, match.group("value"), match.group("unit"), match.group("dv")):
+            return
+
+
+def parse_label(text):
+    """NutritionLabel from OCR text; fields that cannot be read are left out."""
+    label = NutritionLabel()
+    for line in (text or "").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        per_100 = _PER_100_RE.search(line)
+        if per_100:
+            label.basis = f"100{per_100.group('unit').lower()}"
+        size = _SERVING_SIZE_RE.search(line)
+        if size and label.serving_size is None:
+            label.serving_size = size.group("value").strip()[:40]
+            continue
+        servings = _SERVINGS_RE.search(line)
+        if servings and label.servings_per_container is None:
+            label.servings_per_container = _number(servings.group("before") or servings.group("after"))
+            continue
+        _parse_line(line, label)
+    return label
+
+
+# condition -> (aliases found in free-text health records, {nutrient: max per serving})
+CONDITION_LIMITS = {
+    "Diabetes": (("diabet", "blood sugar"), {"total_sugars": 10, "added_sugars": 5, "total_carbohydrate": 45}),
+    "Hypertension": (("hypertension", "blood pressure", " bp"), {"sodium": 400}),
+    "Heart Disease": (("heart", "cardiac", "cholesterol"),
+                      {"saturated_fat": 3, "trans_fat": 0, "cholesterol": 60, "sodium": 480}),
+    "Obesity": (("obes", "overweight"), {"calories": 300, "total_fat": 15, "added_sugars": 5}),
+    "Chronic Kidney Disease": (("kidney", "ckd", "renal"), {"sodium": 300, "potassium": 200, "protein": 15}),
+    "Stroke": (("stroke",), {"sodium": 400, "saturated_fat": 3}),
+    "Liver Disease": (("liver", "hepatitis", "fatty liver"), {"total_fat": 15, "added_sugars": 5, "sodium": 480}),
+}
+
+
+def conditions_in(health_text):
+    """Conditions from CONDITION_LIMITS mentioned in a free-text health field."""
+    text = f" {str(health_text or '').lower()} "
+    return [name for name, (aliases, _) in CONDITION_LIMITS.items() if any(a in text for a in aliases)]
+
+
+@dataclass
+class LabelFlag:
+    condition: str
+    nutrient: str
+    amount: float
+    limit: float
+    unit: str
+    basis: str = "serving"
+
+    @property
+    def message(self):
+        name = self.nutrient.replace("_", " ")
+        return f"{name.capitalize()} {self.amount:g}{self.unit} per {self.basis} is above {self.limit:g}{self.unit} " \
+               f"suggested per serving for {self.condition}."
+
+
+def check_conditions(label, health_text):
+    """(flags over a limit, conditions with nothing to check) for the conditions in health_text.
+
+    The limits are per serving, so per-100g/ml amounts are scaled by the serving
+    size; without one, nothing can be checked.
+    """
+    flags, unchecked = [], []
+    factor = label.per_serving_factor()
+    for condition in conditions_in(health_text):
+        checked = False
+        for nutrient, limit in CONDITION_LIMITS[condition][1].items():
+            if nutrient == "calories":
+                amount, unit = label.calories, "kcal"
+            else:
+                amount, unit = label.amount(nutrient), NUTRIENT_PATTERNS[nutrient][1]
+            if amount is None or factor is None:
+                continue
+            checked = True
+            amount = round(amount * factor, 1)
+            if amount > limit:
+                flags.append(LabelFlag(condition, nutrient, amount, limit, unit))
+        if not checked:
+            unchecked.append(condition)
+    return flags, unchecked
+
+
+def label_context(text, health_text=None):
+    """Context for the LLM: the parsed JSON summary (plus local flags) when usable, else the raw text."""
+    label = parse_label(text)
+    if not label.is_useful():
+        return f"Here is the nutritional text extracted from the image:\n{text}"
+    context = f"Nutrition facts parsed from the label (JSON): {label.to_json()}"
+    if health_text:
+        flags, _ = check_conditions(label, health_text)
+        if flags:
+            context += "\nLocal checks: " + " ".join(flag.message for flag in flags)
+    return context
+
+
+_QUESTION_RE = re.compile(r"\bhow\s+(?:much|many)\b|\bwhat(?:'s|\s+is)\s+the\b|\bamount\s+of\b", re.IGNORECASE)
+_QUESTION_NUTRIENTS = {
+    "calories": re.compile(r"\bcalorie|\benergy\b|\bkcal\b", re.IGNORECASE),
+    "saturated_fat": re.compile(r"\bsaturated\b", re.IGNORECASE),
+    "trans_fat": re.compile(r"\btrans\b", re.IGNORECASE),
+    "added_sugars": re.compile(r"\badded\s+sugar", re.IGNORECASE),
+    "total_sugars": re.compile(r"\bsugar", re.IGNORECASE),
+    "salt": re.compile(r"\bsalt\b", re.IGNORECASE),
+    "sodium": re.compile(r"\bsodium\b|\bsalt\b", re.IGNORECASE),
+    "total_fat": re.compile(r"\bfat\b", re.IGNORECASE),
+    "total_carbohydrate": re.compile(r"\bcarb", re.IGNORECASE),
+    "protein": re.compile(r"\bprotein\b", re.IGNORECASE),
+    "fiber": re.compile(r"\bfib(?:er|re)\b", re.IGNORECASE),
+    "cholesterol": re.compile(r"\bcholesterol\b", re.IGNORECASE),
+    "potassium": re.compile(r"\bpotassium\b", re.IGNORECASE),
+}
+
+
+def answer_locally(question, text):
+    """Answer for "how much <nutrient>" questions about the label, or None to ask the LLM."""
+    if not _QUESTION_RE.search(question or ""):
+        return None
+    label = parse_label(text)
+    for name, pattern in _QUESTION_NUTRIENTS.items():
+        if not pattern.search(question):
+            continue
+        if name == "calories":
+            return f"The label lists {label.calories:g} kcal per {label.basis}." if label.calories is not None else None
+        nutrient = label.nutrients.get(name)
+        if nutrient is None or nutrient.amount is None:
+            if name == "salt":
+                continue  # No salt line: answer with sodium
+            return None
+        answer = f"The label lists {nutrient.amount:g} {nutrient.unit} of {name.replace('_', ' ')} per {label.basis}"
+        if nutrient.daily_value is not None:
+            answer += f" ({nutrient.daily_value:g}% of the daily value)"
+        return answer + "."
+    return None
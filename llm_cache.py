@@ -0,0 +1,150 @@
+"""Response cache for Groq calls: in-process LRU plus a persistent SQLite tier.
+
+Popular products are scanned many times a day and the same analysis or Hindi
+translation used to cost a full round trip each time. Replies are keyed on
+the normalized messages, the model and any extra context fingerprint, expire
+after LLM_CACHE_TTL seconds, and the SQLite tier (LLM_CACHE_DB, empty to
+disable) is trimmed to LLM_CACHE_MAX_ROWS least-recently-used rows. The
+database lives in cache/ next to this module by default, not in whatever
+directory the app was started from, and is only opened on the first lookup,
+so importing the module creates no files.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_ENTRIES", "512"))
+DB_PATH = os.getenv("LLM_CACHE_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache",
+                                                   "llm_cache.sqlite3"))
+TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+MAX_ROWS = int(os.getenv("LLM_CACHE_MAX_ROWS", "20000"))
+
+
+def normalize_messages(messages):
+    """Messages with whitespace collapsed so trivially different prompts share a key."""
+    return [{"role": m["role"], "content": " ".join(str(m["content"]).split())} for m in messages]
+
+
+def fingerprint(data):
+    """Short stable hash of any JSON-serialisable context (e.g. a health record)."""
+    return hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def cache_key(messages, model, context=None):
+    payload = {"messages": normalize_messages(messages), "model": model, "context": context}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, db_path=DB_PATH, max_entries=MEMORY_ENTRIES, ttl=TTL_SECONDS, max_rows=MAX_ROWS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self._memory = OrderedDict()  # key -> (created, response)
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.hits = 0
+        self.misses = 0
+        self.db_path = db_path
+        self._db = None
+
+    def _connection(self):
+        # Opened on first use, with self._lock held; None when the SQLite tier is disabled or unusable
+        if self._db is None and self.db_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+                db = sqlite3.connect(self.db_path, check_same_thread=False, timeout=5)
+                db.execute("PRAGMA journal_mode=WAL")  # Several Streamlit workers may share the file
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+                )
+                db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+                db.commit()
+                self._db = db
+            except (OSError, sqlite3.Error):
+                self.db_path = None  # Read-only or missing directory: keep the memory tier only
+        return self._db
+
+    def get(self, key):
+        """Cached response for key, or None when missing or expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and now - entry[0] < self.ttl:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self._memory.pop(key, None)
+
+            db = self._connection()
+            if db is not None:
+                row = db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+                if row and now - row[1] < self.ttl:
+                    db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                    db.commit()
+                    self._memory_put(key, row[1], row[0])
+                    self.hits += 1
+                    return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key, response):
+        now = time.time()
+        with self._lock:
+            self._memory_put(key, now, response)
+            db = self._connection()
+            if db is None:
+                return
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            self._puts += 1
+            if self._puts % 100 == 0:
+                self._evict(now)
+            db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self.hits = self.misses = 0
+            db = self._connection()
+            if db is not None:
+                db.execute("DELETE FROM responses")
+                db.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            db = self._connection()
+            rows = db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] if db is not None else 0
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "db_rows": rows,
+            }
+
+    def _memory_put(self, key, created, response):
+        self._memory[key] = (created, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self, now):
+        # Expired rows first, then the least recently used beyond max_rows
+        self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        self._db.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_rows,),
+        )
+
+
+llm_cache = LLMCache()
@@ -0,0 +1,180 @@
+"""Groq chat calls with optional token streaming into the Streamlit page.
+
+With streaming on (the default, GROQ_STREAM=0 turns it off) tokens are shown
+as they arrive instead of behind a spinner. Every call records its
+time-to-first-token, total latency and prompt token count; recent_calls()
+returns them. A call is cancelled when the Streamlit script is interrupted
+(Stop, or another button click) or when the caller sets cancel_event.
+
+Replies are cached (llm_cache.py) unless the caller passes use_cache=False.
+
+fake_groq.py serves the same API locally; point GROQ_BASE_URL at it to test.
+"""
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+
+from history import count_message_tokens
+from llm_cache import cache_key, llm_cache
+from metrics import observe
+from model_loader import get_groq_client
+
+MODEL = "mixtral-8x7b-32768"
+STREAM = os.getenv("GROQ_STREAM", "1") != "0"
+
+_calls = deque(maxlen=500)
+_calls_lock = threading.Lock()
+
+
+@dataclass
+class LLMResult:
+    kind: str = "chat"
+    model: str = MODEL
+    text: str = ""
+    streamed: bool = False
+    cancelled: bool = False
+    cached: bool = False
+    ttft: float = None  # Seconds until the first token (the full reply when not streaming)
+    total: float = None
+    prompt_tokens: int = None  # From the API usage block when available, else estimated
+    error: str = None  # Set instead of raising by the async client (async_llm.py)
+
+
+def log_call(result):
+    """Add a finished call to the recent_calls() record."""
+    with _calls_lock:
+        _calls.append(asdict(result))
+    name = f"llm.{result.kind}.cached" if result.cached else f"llm.{result.kind}"
+    observe(name, result.total, error=bool(result.error))
+    if result.streamed and result.ttft is not None:
+        observe(f"{name}.first_token", result.ttft)
+
+
+def recent_calls():
+    """Timing records of the most recent calls, oldest first."""
+    with _calls_lock:
+        return list(_calls)
+
+
+def complete(messages, api_key, model=MODEL, kind="chat"):
+    """Blocking call; returns an LLMResult once the whole reply has arrived."""
+    result = LLMResult(kind=kind, model=model, prompt_tokens=count_message_tokens(messages))
+    start = time.perf_counter()
+    try:
+        chat_completion = get_groq_client(api_key).chat.completions.create(
+            messages=messages,
+            model=model,
+            stream=False,
+        )
+        result.text = chat_completion.choices[0].message.content if chat_completion.choices else ""
+        usage = getattr(chat_completion, "usage", None)
+        if usage is not None and usage.prompt_tokens:
+            result.prompt_tokens = usage.prompt_tokens
+    finally:
+        result.total = result.ttft = time.perf_counter() - start
+        log_call(result)
+    return result
+
+
+def stream_tokens(messages, api_key, result, cancel_event=None):
+    """Generator of reply tokens; result is filled in when the stream ends or is cancelled."""
+    result.streamed = True
+    result.prompt_tokens = count_message_tokens(messages)
+    start = time.perf_counter()
+    parts = []
+    response = get_groq_client(api_key).chat.completions.create(
+        messages=messages,
+        model=result.model,
+        stream=True,
+    )
+    try:
+        for chunk in response:
+            if cancel_event is not None and cancel_event.is_set():
+                result.cancelled = True
+                break
+            # Groq reports usage on the final chunk under x_groq
+            usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+            if usage is not None and usage.prompt_tokens:
+                result.prompt_tokens = usage.prompt_tokens
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if not delta:
+                continue
+            if result.ttft is None:
+                result.ttft = time.perf_counter() - start
+            parts.append(delta)
+            yield delta
+    except GeneratorExit:  # The consumer stopped reading, e.g. a Streamlit rerun
+        result.cancelled = True
+        raise
+    finally:
+        close = getattr(response, "close", None)
+        if close:
+            close()  # Drop the HTTP connection so Groq stops generating
+        result.text = "".join(parts)
+        result.total = time.perf_counter() - start
+        log_call(result)
+
+
+def render_stream(messages, api_key, model=MODEL, kind="chat", cancel_event=None):
+    """Stream the reply into the page as it arrives; returns the LLMResult."""
+    import streamlit as st
+
+    result = LLMResult(kind=kind, model=model)
+    tokens = stream_tokens(messages, api_key, result, cancel_event)
+    try:
+        if hasattr(st, "write_stream"):
+            st.write_stream(tokens)
+        else:  # Older Streamlit: update a placeholder
+            placeholder = st.empty()
+            text = ""
+            for token in tokens:
+                text += token
+                placeholder.markdown(text)
+    finally:
+        tokens.close()
+    if result.ttft is not None:
+        st.caption(f"⏱ First token {result.ttft:.2f}s · total {result.total:.2f}s · "
+                   f"prompt ~{result.prompt_tokens} tokens")
+    return result
+
+
+def cache_bypass_checkbox():
+    """Sidebar switch that makes every call in this session skip the response cache."""
+    import streamlit as st
+
+    return st.sidebar.checkbox("Bypass AI response cache", key="bypass_llm_cache")
+
+
+def use_llm_cache():
+    """False when the user ticked cache_bypass_checkbox() in this session."""
+    import streamlit as st
+
+    return not st.session_state.get("bypass_llm_cache", False)
+
+
+def ask(messages, api_key, model=MODEL, kind="chat", stream=None, cancel_event=None,
+        use_cache=True, context=None):
+    """Cached reply if there is one, else streams into the page when streaming is
+    enabled or blocks otherwise; returns an LLMResult.
+
+    context is any extra data the reply depends on beyond the messages (e.g. a
+    health-data fingerprint); use_cache=False always goes to Groq.
+    """
+    key = cache_key(messages, model, context) if use_cache else None
+    if key is not None:
+        text = llm_cache.get(key)
+        if text is not None:
+            result = LLMResult(kind=kind, model=model, text=text, cached=True, ttft=0.0, total=0.0,
+                               prompt_tokens=0)
+            log_call(result)
+            return result
+
+    if STREAM if stream is None else stream:
+        result = render_stream(messages, api_key, model, kind, cancel_event)
+    else:
+        result = complete(messages, api_key, model, kind)
+    if key is not None and result.text and not result.cancelled:
+        llm_cache.put(key, result.text)
+    return result
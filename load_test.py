@@ -0,0 +1,113 @@
+"""Load test for service.py: requests/s and latency percentiles.
+
+Each client thread keeps one HTTP/1.1 connection open and sends requests back
+to back for --duration seconds (or until --requests are sent). 503 replies
+from the service's backpressure are counted separately from errors.
+
+    python load_test.py --url http://127.0.0.1:8000 --path /diet-plan --json '{"age": 40, ...}'
+    python load_test.py --path /ocr?engine=tesseract --body-file label.jpg --concurrency 8
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+DEFAULT_DIET_PLAN = {"age": 45, "weight": 82, "height": 172, "gender": "Male", "activity_level": "Light",
+                     "conditions": ["Diabetes", "Hypertension"], "top_n": 10}
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def run(url, path, body, content_type, concurrency=16, duration=10.0, requests=None, method="POST"):
+    """Per-request latencies and status counts from `concurrency` clients."""
+    target = urlsplit(url)
+    latencies, statuses = [], Counter()
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    remaining = [requests]
+
+    def take():
+        with lock:
+            if remaining[0] is None:
+                return time.perf_counter() < deadline
+            if remaining[0] <= 0:
+                return False
+            remaining[0] -= 1
+            return True
+
+    def client():
+        connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=120)
+        headers = {"Content-Type": content_type} if body else {}
+        local_latencies, local_statuses = [], Counter()
+        while take():
+            start = time.perf_counter()
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+                if response.getheader("connection", "").lower() == "close":
+                    connection.close()
+            except (OSError, http.client.HTTPException):
+                status = "error"
+                connection.close()
+            local_latencies.append(time.perf_counter() - start)
+            local_statuses[status] += 1
+        connection.close()
+        with lock:
+            latencies.extend(local_latencies)
+            statuses.update(local_statuses)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses, time.perf_counter() - started
+
+
+def report(latencies, statuses, elapsed):
+    ok = statuses.get(200, 0)
+    print(f"{len(latencies)} requests in {elapsed:.2f}s: {len(latencies) / elapsed:.1f} req/s, "
+          f"{ok / elapsed:.1f} successful req/s")
+    print("latency ms: " + ", ".join(f"p{q} {percentile(latencies, q) * 1000:.1f}" for q in (50, 90, 99))
+          + f", max {max(latencies, default=0) * 1000:.1f}")
+    print("status: " + ", ".join(f"{status} x{count}" for status, count in sorted(statuses.items(), key=str)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--path", default="/diet-plan")
+    parser.add_argument("--method", default=None, help="Default: GET for /health, POST otherwise")
+    parser.add_argument("--json", default=None, help="JSON request body (default: a sample diet-plan request)")
+    parser.add_argument("--body-file", default=None, help="Raw request body, e.g. an image for /ocr")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--requests", type=int, default=None, help="Stop after this many instead of --duration")
+    args = parser.parse_args()
+
+    method = args.method or ("GET" if args.path.startswith("/health") else "POST")
+    if args.body_file:
+        with open(args.body_file, "rb") as f:
+            body, content_type = f.read(), "application/octet-stream"
+    elif method == "POST":
+        body = (args.json or json.dumps(DEFAULT_DIET_PLAN)).encode()
+        content_type = "application/json"
+    else:
+        body, content_type = None, None
+
+    report(*run(args.url, args.path, body, content_type, args.concurrency, args.duration, args.requests, method))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""Local medication extraction from prescription OCR text.
+
+doctor.py used to send every word doctr recognised straight to the model.
+MedicationMatcher loads a drug dictionary (MEDICATION_DICT, default
+medications.txt: canonical name first, then brands and spellings, separated
+by "|") into a character trie. OCR tokens and short runs of tokens are looked
+up with a bounded Levenshtein search over the trie, so "Amoxicilin" or
+"Pantoprazo1e" still match. Dose, frequency and duration written next to each
+match are read with precompiled patterns. A typical page takes about 10 ms,
+and the model only sees the structured list.
+"""
+import os
+import re
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+DICTIONARY_PATH = os.getenv("MEDICATION_DICT", str(Path(__file__).with_name("medications.txt")))
+MAX_WORDS = 3  # Longest dictionary name, in words, tried against runs of OCR tokens
+MIN_TOKEN_CHARS = 3
+
+_TOKEN_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9\-]*")
+_DOSE_RE = re.compile(r"\b(\d+(?:\.\d+)?)\s*(mg|mcg|µg|g|ml|iu|units?|%)(?![a-z])", re.IGNORECASE)
+_FREQUENCY_RE = re.compile(
+    r"\b(?:[01½]\s*-\s*[01½]\s*-\s*[01½](?:\s*-\s*[01½])?"  # 1-0-1 dosing schedules
+    r"|o\.?d|b\.?d|b\.?i\.?d|t\.?d\.?s|t\.?i\.?d|q\.?i\.?d|q\.?d\.?s|h\.?s|s\.?o\.?s|p\.?r\.?n|stat"
+    r"|q\s*\d+\s*h(?:rs?)?|every\s+\d+\s*(?:hours?|hrs?|h)"
+    r"|(?:once|twice|thrice|\d\s*times?)\s*(?:a|per)?\s*(?:day|daily|week|weekly)"
+    r"|at\s+(?:bed\s*time|night)|before\s+(?:food|meals?|breakfast)|after\s+(?:food|meals?|breakfast)"
+    r"|daily|morning|night)\b",
+    re.IGNORECASE,
+)
+_DURATION_RE = re.compile(
+    r"(?:\b(?:for|x|×)\s*)(\d+)\s*(days?|d|weeks?|wks?|w|months?|m)\b|\b(\d+)\s*(days?|weeks?|months?)\b",
+    re.IGNORECASE,
+)
+_FORM_RE = re.compile(r"\b(tab(?:let)?s?|cap(?:sule)?s?|syp|syrup|inj(?:ection)?|susp(?:ension)?|drops?|"
+                      r"oint(?:ment)?|cream|gel|inhaler|sachet)\b\.?", re.IGNORECASE)
+# Common prescription words that should never be looked up as drug names
+_SKIP_WORDS = {
+    "tab", "tabs", "tablet", "tablets", "cap", "caps", "capsule", "capsules", "syp", "syrup", "inj", "daily",
+    "morning", "night", "after", "before", "food", "meals", "days", "weeks", "month", "months", "once", "twice",
+    "times", "for", "with", "and", "the", "take", "patient", "name", "age", "date", "doctor", "clinic",
+}
+
+
+def max_distance(length):
+    """Typos tolerated for a token of this length."""
+    return 0 if length <= 4 else 1 if length <= 7 else 2
+
+
+class _Node:
+    __slots__ = ("children", "name", "shortest", "longest")
+
+    def __init__(self):
+        self.children = {}
+        self.name = None  # Canonical drug name when a dictionary entry ends here
+        self.shortest = self.longest = None  # Lengths of the entries below, for pruning
+
+
+@dataclass
+class MedicationMatch:
+    name: str  # Canonical name from the dictionary
+    matched: str  # Text as it appeared in the OCR output
+    distance: int
+    line: int  # 0-based line number in the OCR text
+    form: str = None
+    dose: str = None
+    frequency: str = None
+    duration: str = None
+
+    def as_dict(self):
+        return {key: value for key, value in asdict(self).items() if value is not None}
+
+    def describe(self):
+        parts = [self.form, self.name, self.dose, self.frequency, self.duration]
+        return " ".join(part for part in parts if part)
+
+
+class MedicationMatcher:
+    def __init__(self, names=None, path=DICTIONARY_PATH):
+        self.exact = {}  # normalized alias -> canonical name
+        self.words = _Node()  # Trie of single-word aliases
+        self.phrases = _Node()  # Trie of multi-word aliases, kept apart so single tokens search a smaller tree
+        for aliases in (names if names is not None else load_dictionary(path)):
+            canonical = aliases[0]
+            for alias in aliases:
+                self.add(alias, canonical)
+
+    @property
+    def size(self):
+        return len(self.exact)
+
+    def add(self, alias, canonical):
+        key = normalize(alias)
+        self.exact[key] = canonical
+        node = self.phrases if " " in key else self.words
+        for char in key:
+            node = node.children.setdefault(char, _Node())
+            node.shortest = min(node.shortest or len(key), len(key))
+            node.longest = max(node.longest or 0, len(key))
+        node.name = canonical
+
+    def lookup(self, text, max_dist=None):
+        """(canonical name, distance) of the closest dictionary entry within max_dist edits, or None."""
+        text = normalize(text)
+        if text in self.exact:
+            return self.exact[text], 0
+        if max_dist is None:
+            max_dist = max_distance(len(text))
+        if max_dist == 0:
+            return None
+        best = [None, max_dist + 1]
+        first_row = list(range(len(text) + 1))
+        for char, child in (self.phrases if " " in text else self.words).children.items():
+            self._search(child, char, text, first_row, best)
+        return (best[0], best[1]) if best[0] is not None else None
+
+    def _search(self, node, char, word, previous_row, best):
+        # One Levenshtein DP row per trie node; prune branches that can no longer beat the best match
+        if node.shortest - len(word) >= best[1] or len(word) - node.longest >= best[1]:
+            return
+        left = previous_row[0] + 1
+        row = [left]
+        for i, word_char in enumerate(word):
+            left = min(left + 1, previous_row[i + 1] + 1, previous_row[i] + (word_char != char))
+            row.append(left)
+        if node.name is not None and left < best[1]:
+            best[0], best[1] = node.name, left
+        if min(row) < best[1]:
+            for next_char, child in node.children.items():
+                self._search(child, next_char, word, row, best)
+
+    def extract(self, text):
+        """Medications in OCR text, with the dose, frequency and duration written next to each."""
+        lines = (text or "").splitlines()
+        matches = []
+        for number, line in enumerate(lines):
+            tokens = [(m.group(), m.start(), m.end()) for m in _TOKEN_RE.finditer(line)]
+            i = 0
+            while i < len(tokens):
+                found = self._match_at(tokens, i)
+                if found is None:
+                    i += 1
+                    continue
+                name, distance, used = found
+                start, end = tokens[i][1], tokens[i + used - 1][2]
+                # Details usually follow on the same line, sometimes on the next one
+                following = line[end:] + " " + (lines[number + 1] if number + 1 < len(lines) else "")
+                match = MedicationMatch(name=name, matched=line[start:end], distance=distance, line=number)
+                _read_details(match, line[:start], following)
+                matches.append(match)
+                i += used
+        return _dedupe(matches)
+
+    def _match_at(self, tokens, i):
+        first = tokens[i][0]
+        if len(first) < MIN_TOKEN_CHARS or first.lower() in _SKIP_WORDS or not _is_wordlike(first):
+            return None
+        for words in range(min(MAX_WORDS, len(tokens) - i), 1, -1):
+            if all(_is_wordlike(token) for token, _, _ in tokens[i + 1:i + words]):
+                found = self.lookup(" ".join(token for token, _, _ in tokens[i:i + words]))
+                if found:
+                    return found[0], found[1], words
+        found = self.lookup(first)
+        return (found[0], found[1], 1) if found else None
+
+
+def _is_wordlike(token):
+    # Mostly letters: OCR may swap a few for digits, but "500" or "1-0-1" is never a name
+    return sum(c.isalpha() for c in token) >= max(2, len(token) // 2)
+
+
+def _read_details(match, before, after):
+    # Stop at the next drug form word so a following line's details are not borrowed
+    next_form = _FORM_RE.search(after)
+    window = after[:next_form.start()] if next_form and next_form.start() > 0 else after
+    form = _FORM_RE.search(before[-12:])
+    dose = _DOSE_RE.search(window)
+    frequency = _FREQUENCY_RE.search(window)
+    duration = _DURATION_RE.search(window)
+    if form:
+        match.form = form.group(1).capitalize()
+    if dose:
+        match.dose = f"{dose.group(1)} {dose.group(2).lower()}"
+    if frequency:
+        match.frequency = " ".join(frequency.group().split())
+    if duration:
+        amount, unit = (duration.group(1), duration.group(2)) if duration.group(1) else duration.group(3, 4)
+        match.duration = f"{amount} {unit.lower()}"
+
+
+def _dedupe(matches):
+    # The same drug mentioned twice keeps the mention with the most details
+    best = {}
+    for match in matches:
+        score = sum(value is not None for value in (match.dose, match.frequency, match.duration))
+        if match.name not in best or score > best[match.name][0]:
+            best[match.name] = (score, match)
+    return sorted((match for _, match in best.values()), key=lambda m: m.line)
+
+
+def normalize(text):
+    """Lowercase, OCR digit confusions in letters undone, whitespace collapsed."""
+    text = text.lower().translate(str.maketrans({"0": "o", "1": "l", "5": "s", "|": "l"}))
+    return " ".join(text.replace("-", " ").split())
+
+
+def load_dictionary(path=DICTIONARY_PATH):
+    """[[canonical, alias, ...], ...] from a dictionary file."""
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                entries.append([name.strip() for name in line.split("|") if name.strip()])
+    return entries
+
+
+_matcher = None
+
+
+def get_matcher():
+    """Process-wide matcher built from MEDICATION_DICT on first use."""
+    global _matcher
+    if _matcher is None:
+        _matcher = MedicationMatcher()
+    return _matcher
+
+
+def extract_medications(text):
+    return get_matcher().extract(text)
+
+
+def medications_prompt(matches):
+    """Model prompt limited to the extracted medications."""
+    listed = "\n".join(f"- {match.describe()}" for match in matches)
+    return (
+        "These medications were read from a doctor's prescription:\n"
+        f"{listed}\n\n"
+        "For each one, explain in simple words what it is usually prescribed for, how to take it as written, "
+        "and any common precautions. Do not add medications that are not listed."
+    )
@@ -0,0 +1,315 @@
+"""Per-stage latency and memory instrumentation with a Prometheus text export.
+
+A slow request could be spending its time in image decode, OCR, the Groq call,
+the health-record fetch or the food lookup, and nothing recorded which one.
+Each of those is wrapped in stage() (or @timed), which adds the elapsed time
+to a per-stage histogram, counts errors, and notes how much the stage raised
+the process's peak RSS. render() returns everything in the Prometheus text
+format: service.py serves it at GET /metrics, and the Streamlit apps start a
+small exporter on METRICS_PORT when it is set.
+
+Streamlit sessions also keep their own breakdown: bind_session() at the top of
+a script run and debug_sidebar() at the end show the run's stages in a sidebar
+expander, hidden unless the page is opened with ?debug=1 (or METRICS_DEBUG=1).
+
+METRICS=0 turns all of it off; stage() then returns a shared no-op context and
+@timed returns the function unchanged.
+"""
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from functools import wraps
+
+try:
+    import resource
+except ImportError:  # Windows: no peak-RSS samples
+    resource = None
+
+ENABLED = os.getenv("METRICS", "1") != "0"
+EXPORT_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0: no exporter thread in the Streamlit apps
+DEBUG_SIDEBAR = os.getenv("METRICS_DEBUG", "0") == "1"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PREFIX = "nutriscan"
+# ru_maxrss is in KiB on Linux and bytes on macOS
+_RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, or 0 when unknown."""
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _RSS_UNIT
+
+
+def current_rss():
+    """Resident set size of this process in bytes right now (Linux), else the peak."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return peak_rss()
+
+
+class _Stage:
+    __slots__ = ("name", "start", "rss")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.rss = peak_rss()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        registry.observe(self.name, seconds, error=exc_type is not None, rss_growth=peak_rss() - self.rss)
+        return False
+
+
+class _NoStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count", "errors", "peak_rss_growth")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.errors = 0
+        self.peak_rss_growth = 0
+
+    def observe(self, seconds, error=False, rss_growth=0):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+        self.errors += error
+        self.peak_rss_growth = max(self.peak_rss_growth, rss_growth)
+
+    def quantile(self, q):
+        """Upper bucket bound below which a share q of the observations fall."""
+        target, seen = q * self.count, 0
+        for bound, count in zip(BUCKETS + (float("inf"),), self.counts):
+            seen += count
+            if seen >= target and count:
+                return bound
+        return 0.0
+
+
+class Registry:
+    """Histograms by stage name plus gauges read when the metrics are rendered."""
+
+    def __init__(self):
+        self._stages = {}
+        self._gauges = {}  # name -> (help, label, fn)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def observe(self, name, seconds, error=False, rss_growth=0):
+        with self._lock:
+            histogram = self._stages.get(name)
+            if histogram is None:
+                histogram = self._stages[name] = Histogram()
+            histogram.observe(seconds, error, rss_growth)
+        trace = getattr(self._local, "trace", None)
+        if trace is not None:
+            trace.append({"stage": name, "seconds": round(seconds, 4), "peak_rss_growth_mb":
+                          round(rss_growth / 2 ** 20, 1), "error": error})
+
+    def gauge(self, name, help_text, fn, label=None):
+        """Gauge read from fn() at render time; fn returns a number, or {label value: number}."""
+        with self._lock:
+            self._gauges[name] = (help_text, label, fn)
+
+    def trace_to(self, trace):
+        """Also append this thread's observations to trace (a list), or stop when None."""
+        self._local.trace = trace
+
+    def snapshot(self):
+        """{stage: {"count", "errors", "seconds", "mean", "p50", "p99", "peak_rss_growth_mb"}}."""
+        with self._lock:
+            return {
+                name: {
+                    "count": h.count,
+                    "errors": h.errors,
+                    "seconds": round(h.sum, 4),
+                    "mean": round(h.sum / h.count, 4) if h.count else 0.0,
+                    "p50": h.quantile(0.5),
+                    "p99": h.quantile(0.99),
+                    "peak_rss_growth_mb": round(h.peak_rss_growth / 2 ** 20, 1),
+                }
+                for name, h in sorted(self._stages.items())
+            }
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            stages = [(name, h.counts[:], h.sum, h.count, h.errors, h.peak_rss_growth)
+                      for name, h in sorted(self._stages.items())]
+            gauges = list(self._gauges.items())
+        lines = [
+            f"# HELP {PREFIX}_stage_seconds Time spent per stage.",
+            f"# TYPE {PREFIX}_stage_seconds histogram",
+        ]
+        for name, counts, total, count, _, _ in stages:
+            stage = _escape(name)
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS + ("+Inf",), counts):
+                cumulative += bucket
+                lines.append(f'{PREFIX}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{PREFIX}_stage_seconds_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'{PREFIX}_stage_seconds_count{{stage="{stage}"}} {count}')
+        lines += [f"# HELP {PREFIX}_stage_errors_total Stages that raised.",
+                  f"# TYPE {PREFIX}_stage_errors_total counter"]
+        lines += [f'{PREFIX}_stage_errors_total{{stage="{_escape(s[0])}"}} {s[4]}' for s in stages]
+        lines += [f"# HELP {PREFIX}_stage_peak_rss_growth_bytes Largest rise in process peak RSS during one run of a stage.",
+                  f"# TYPE {PREFIX}_stage_peak_rss_growth_bytes gauge"]
+        lines += [f'{PREFIX}_stage_peak_rss_growth_bytes{{stage="{_escape(s[0])}"}} {s[5]}' for s in stages]
+        lines += [f"# HELP {PREFIX}_process_peak_rss_bytes Peak resident set size of this process.",
+                  f"# TYPE {PREFIX}_process_peak_rss_bytes gauge",
+                  f"{PREFIX}_process_peak_rss_bytes {peak_rss()}"]
+        for name, (help_text, label, fn) in gauges:
+            try:
+                value = fn()
+            except Exception:
+                continue
+            lines += [f"# HELP {PREFIX}_{name} {help_text}", f"# TYPE {PREFIX}_{name} gauge"]
+            if isinstance(value, dict):
+                lines += [f'{PREFIX}_{name}{{{label}="{_escape(str(key))}"}} {v}' for key, v in value.items()]
+            else:
+                lines.append(f"{PREFIX}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = Registry()
+
+
+def stage(name):
+    """Context manager timing the enclosed block as one run of the named stage."""
+    return _Stage(name) if ENABLED else _NO_STAGE
+
+
+def timed(name):
+    """Decorator form of stage()."""
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def observe(name, seconds, error=False):
+    """Record a duration measured elsewhere (e.g. an LLM call's own timing)."""
+    if ENABLED and seconds is not None:
+        registry.observe(name, seconds, error)
+
+
+def render():
+    return registry.render()
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def serve(port=EXPORT_PORT, host="0.0.0.0"):
+    """Serve render() at /metrics from a daemon thread, once per process; returns the server."""
+    global _server
+    with _server_lock:
+        if _server is not None or not port or not ENABLED:
+            return _server
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = render().encode()
+                self.send_response(200 if self.path.split("?")[0] == "/metrics" else 404)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            _server = ThreadingHTTPServer((host, port), Handler)
+        except OSError:  # Another Streamlit worker already exports on this port
+            return None
+        threading.Thread(target=_server.serve_forever, daemon=True).start()
+        return _server
+
+
+# Streamlit session breakdown
+
+def bind_session():
+    """Start recording this script run's stages into the session; call at the top of the script."""
+    if not ENABLED:
+        return
+    import streamlit as st
+
+    serve()
+    session = st.session_state.setdefault("metrics_session", {"runs": deque(maxlen=20)})
+    run = []
+    session["runs"].append(run)
+    registry.trace_to(run)
+
+
+def _debug_requested(st):
+    if DEBUG_SIDEBAR:
+        return True
+    params = st.query_params if hasattr(st, "query_params") else st.experimental_get_query_params()
+    value = params.get("debug")
+    value = value[0] if isinstance(value, list) and value else value
+    return value in ("1", "true")
+
+
+def debug_sidebar():
+    """Sidebar expander with this run's stages and the session's totals (hidden unless ?debug=1)."""
+    if not ENABLED:
+        return
+    import streamlit as st
+
+    registry.trace_to(None)
+    session = st.session_state.get("metrics_session")
+    if session is None or not _debug_requested(st):
+        return
+    runs = [run for run in session["runs"] if run]
+    with st.sidebar.expander("🛠 Debug: stage timings"):
+        st.caption(f"Process peak RSS: {peak_rss() / 2 ** 20:.0f} MB")
+        if not runs:
+            st.write("No stages recorded yet.")
+            return
+        st.write("**Last run**")
+        st.table(runs[-1])
+        totals = {}
+        for run in runs:
+            for entry in run:
+                total = totals.setdefault(entry["stage"], {"stage": entry["stage"], "count": 0, "seconds": 0.0})
+                total["count"] += 1
+                total["seconds"] = round(total["seconds"] + entry["seconds"], 4)
+        st.write(f"**Session (last {len(runs)} runs with activity)**")
+        st.table(sorted(totals.values(), key=lambda t: -t["seconds"]))
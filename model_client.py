@@ -0,0 +1,236 @@
+"""Client side of the shared model server (model_server.py).
+
+When MODEL_SERVER_SOCKET is set, the models named in MODEL_SERVER_MODELS are
+not loaded in this process: ocr_engines.get_engine(), summarizer.
+get_text_summarizer() and translation.get_translator("local") return the
+proxies below instead, which have the same interface as the local objects and
+forward each call over the Unix socket. Images are preprocessed here, with the
+engine's usual config, and handed to the server through a shared-memory block
+rather than copied through the socket.
+
+Messages are a 4-byte big-endian length followed by a JSON object; replies
+carry either "result" or "error".
+"""
+import json
+import os
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+from llm_client import LLMResult, log_call
+from ocr_engines import OCREngine, OCRWord, _ENGINES, to_array
+
+SOCKET_PATH = os.getenv("MODEL_SERVER_SOCKET", "")  # Empty: every process loads its own models
+SERVED_MODELS = [m for m in os.getenv("MODEL_SERVER_MODELS", "easyocr,doctr,summarizer,translator").split(",") if m]
+TIMEOUT = float(os.getenv("MODEL_SERVER_TIMEOUT", "300"))
+_HEADER = struct.Struct(">I")
+
+
+class ModelServerError(Exception):
+    pass
+
+
+def served(name):
+    """True when model `name` should be used through the model server."""
+    return bool(SOCKET_PATH) and name in SERVED_MODELS
+
+
+def send_message(sock, message):
+    data = json.dumps(message, ensure_ascii=False).encode()
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _read_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("Model server closed the connection")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def read_message(sock):
+    (size,) = _HEADER.unpack(_read_exactly(sock, _HEADER.size))
+    return json.loads(_read_exactly(sock, size))
+
+
+class ModelClient:
+    """Blocking client with one persistent connection per thread."""
+
+    def __init__(self, path=None, timeout=TIMEOUT):
+        self.path = path or SOCKET_PATH
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.path)
+            except OSError as e:
+                sock.close()
+                raise ModelServerError(f"Model server is not reachable at {self.path}: {e}")
+            self._local.sock = sock
+        return sock
+
+    def close(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def call(self, op, **params):
+        """Result of one request; a dropped connection is retried once on a fresh one."""
+        for attempt in range(2):
+            sock = self._connection()
+            try:
+                send_message(sock, dict(params, op=op))
+                reply = read_message(sock)
+                break
+            except ConnectionError as e:
+                self.close()
+                if attempt:
+                    raise ModelServerError(f"Model server connection lost: {e}")
+            except OSError:
+                self.close()
+                raise
+        if "error" in reply:
+            raise ModelServerError(reply["error"])
+        return reply["result"]
+
+    def ping(self):
+        return self.call("ping")
+
+    def load(self, models):
+        """Have the server load models now; returns the names it holds."""
+        return self.call("load", models=list(models))
+
+    def stats(self):
+        return self.call("stats")
+
+    def ocr(self, images, engine):
+        """Server-side OCR results ({"text", "words", "timings"}) for already preprocessed arrays."""
+        from multiprocessing import shared_memory
+
+        blocks, descriptors = [], []
+        try:
+            for image in images:
+                array = np.ascontiguousarray(to_array(image))
+                block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                blocks.append(block)
+                np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+                descriptors.append({"shm": block.name, "shape": list(array.shape), "dtype": array.dtype.str})
+            return self.call("ocr", engine=engine, images=descriptors)
+        finally:
+            for block in blocks:  # The server has copied the pixels by the time it replies
+                block.close()
+                block.unlink()
+
+    def summarize(self, texts, max_length, min_length, use_cache=True):
+        return self.call("summarize", texts=list(texts), max_length=max_length, min_length=min_length,
+                         use_cache=use_cache)
+
+    def translate(self, texts, use_cache=True):
+        return self.call("translate", texts=list(texts), use_cache=use_cache)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Shared client for MODEL_SERVER_SOCKET."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ModelClient()
+        return _client
+
+
+class RemoteEngine(OCREngine):
+    """An OCR engine whose model lives in the model server; preprocessing still runs here."""
+
+    def __init__(self, engine, client=None, preprocess=None):
+        cls = _ENGINES[engine]
+        self.name, self.label, self.settings = cls.name, cls.label, cls.settings  # Same cache keys as local
+        super().__init__(preprocess)
+        self.client = client
+
+    @classmethod
+    def is_available(cls):
+        return True
+
+    def _load(self):
+        client = self.client or get_client()
+        client.load([self.name])
+        return client
+
+    def _recognize(self, client, image):
+        output = self._recognize_batch(client, [image])[0]
+        if isinstance(output, Exception):
+            raise output
+        return output
+
+    def _recognize_batch(self, client, images):
+        return [
+            ModelServerError(result["error"]) if result.get("error") else
+            (result["text"], [OCRWord(text, tuple(box), confidence) for text, box, confidence in result["words"]])
+            for result in client.ocr(images, self.name)
+        ]
+
+
+class RemoteSummarizer:
+    """Summarizer interface backed by the model server."""
+
+    def __init__(self, client=None):
+        self.client = client
+
+    def _client(self):
+        return self.client or get_client()
+
+    def load(self):
+        return self._client().load(["summarizer"])
+
+    def summarize(self, text, max_length=130, min_length=30, use_cache=True):
+        return self.summarize_many([text], max_length, min_length, use_cache)[0]
+
+    def summarize_many(self, texts, max_length=130, min_length=30, use_cache=True):
+        return self._client().summarize(texts, max_length, min_length, use_cache)
+
+
+class RemoteTranslator:
+    """Local-model translator interface backed by the model server."""
+
+    name = "local"
+    label = "Local model (offline)"
+
+    def __init__(self, client=None):
+        self.client = client
+
+    def _client(self):
+        return self.client or get_client()
+
+    def load(self):
+        return self._client().load(["translator"])
+
+    def translate(self, text, prompt=None, use_cache=True):
+        result = LLMResult(kind="translation", model="model-server")
+        start = time.perf_counter()
+        try:
+            reply = self._client().translate([text], use_cache)[0]
+            result.text, result.cached, result.model = reply["text"], reply["cached"], reply["model"]
+            result.error = reply["error"]
+        except Exception as e:
+            result.error = str(e)
+            result.text = f"Translation Error: {str(e)}"
+        finally:
+            result.total = result.ttft = time.perf_counter() - start
+            log_call(result)
+        return result
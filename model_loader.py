@@ -0,0 +1,182 @@
+"""Deferred imports and cached, on-first-use model loaders.
+
+The Streamlit apps used to build EasyOCR, doctr and BART models (and import
+transformers) at import time, so every new worker paid tens of seconds and
+hundreds of MB before the first page rendered. Models are now built the first
+time they are needed, once per process. Deployments that prefer to pay the
+cost up front can set WARM_UP_MODELS (e.g. "tesseract,doctr" or "all").
+
+Run `python model_loader.py` for a startup-time report of import and
+model-load cost per app, each measured in a fresh interpreter.
+"""
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from metrics import observe
+
+SUMMARIZER_MODEL = "facebook/bart-large-cnn"
+
+# What each entry point imports at module load and which models it uses
+# (requests is no longer among them: health_api_client and food_index import it on first use)
+APP_PROFILES = {
+    "app.py": {"imports": ["streamlit", "PIL", "ocr_engines"], "models": ["groq", "tesseract"]},
+    "ocr_utils.py": {"imports": ["streamlit", "PIL", "ocr_engines"], "models": ["groq", "tesseract"]},
+    "doctor.py": {"imports": ["streamlit", "PIL", "ocr_engines"], "models": ["groq", "doctr"]},
+    "streamlite/fx.py": {"imports": ["streamlit", "PIL", "ocr_engines"], "models": ["easyocr", "summarizer"]},
+}
+
+_timings = []
+_timings_lock = threading.Lock()
+_warmed_up = False
+
+
+def record(stage, name, seconds):
+    """Add an import/model-load measurement to this process's startup report."""
+    with _timings_lock:
+        _timings.append({"stage": stage, "name": name, "seconds": round(seconds, 4)})
+    observe(f"{stage}.{name}", seconds)
+
+
+@contextmanager
+def timed(stage, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, name, time.perf_counter() - start)
+
+
+def startup_report():
+    """Import and model-load costs paid so far by this process."""
+    with _timings_lock:
+        return list(_timings)
+
+
+@lru_cache(maxsize=None)
+def get_groq_client(api_key, base_url=None):
+    """Groq client built on first use (importing groq pulls in httpx and pydantic).
+
+    GROQ_BASE_URL points the client at another server, e.g. fake_groq.py.
+    """
+    with timed("model", "groq"):
+        from groq import Groq
+
+        return Groq(api_key=api_key, base_url=base_url or os.getenv("GROQ_BASE_URL") or None)
+
+
+def set_torch_threads(threads=None):
+    """Cap torch intra-op threads (default: TORCH_THREADS, if set); returns the count in effect."""
+    threads = threads or int(os.getenv("TORCH_THREADS", "0"))
+    import torch
+
+    if threads:
+        torch.set_num_threads(threads)
+    return torch.get_num_threads()
+
+
+def load_model(name):
+    """Build a model by name: any OCR engine, "summarizer" or "groq"."""
+    if name == "summarizer":
+        from summarizer import get_text_summarizer
+
+        return get_text_summarizer().load()
+    if name == "groq":
+        return get_groq_client(os.getenv("GROQ_API_KEY", ""))
+    from ocr_engines import get_engine
+
+    return get_engine(name).load()  # Engines record their own load time
+
+
+def warm_up(names=None):
+    """Optional up-front load of models, by default those listed in WARM_UP_MODELS.
+
+    Does nothing when no names are given and WARM_UP_MODELS is unset, and only
+    runs once per process, so the apps can call it on every rerun.
+    """
+    global _warmed_up
+    if names is None:
+        if _warmed_up:
+            return []
+        _warmed_up = True
+        names = [n.strip() for n in os.getenv("WARM_UP_MODELS", "").split(",") if n.strip()]
+        if names == ["all"]:
+            from ocr_engines import available_engines
+
+            names = available_engines() + ["summarizer"]
+    loaded = []
+    for name in names:
+        try:
+            load_model(name)
+            loaded.append(name)
+        except Exception as e:
+            print(f"Warm-up of {name} failed: {e}", file=sys.stderr)
+    return loaded
+
+
+_MEASURE_SNIPPET = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+stage, name = {stage!r}, {name!r}
+start = time.perf_counter()
+error = None
+try:
+    if stage == "import":
+        __import__(name)
+    else:
+        import model_loader
+        model_loader.load_model(name)
+except Exception as e:
+    error = str(e)
+seconds = time.perf_counter() - start
+try:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+except ImportError:
+    rss = None
+print(json.dumps({{"seconds": seconds, "peak_rss_mb": rss, "error": error}}))
+"""
+
+
+def measure(stage, name):
+    """Cold cost of one import or model load, in a fresh interpreter."""
+    root = os.path.dirname(os.path.abspath(__file__))
+    code = _MEASURE_SNIPPET.format(root=root, stage=stage, name=name)
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True).stdout
+    try:
+        return json.loads(output.strip().splitlines()[-1])
+    except (ValueError, IndexError):
+        return {"seconds": None, "peak_rss_mb": None, "error": "measurement failed"}
+
+
+def cold_start_report(apps=None):
+    """Per-app import and model-load costs, each measured cold."""
+    rows = []
+    cache = {}
+    for app in apps or APP_PROFILES:
+        profile = APP_PROFILES[app]
+        stages = [("import", name) for name in profile["imports"]] + [("model", name) for name in profile["models"]]
+        for stage, name in stages:
+            if (stage, name) not in cache:
+                cache[(stage, name)] = measure(stage, name)
+            rows.append(dict(cache[(stage, name)], app=app, stage=stage, name=name))
+    return rows
+
+
+def format_cold_start_report(rows):
+    lines = [f"{'app':<18} {'stage':<7} {'name':<16} {'seconds':>8} {'peak MB':>8}"]
+    for row in rows:
+        seconds = f"{row['seconds']:.3f}" if row["seconds"] is not None else "-"
+        rss = f"{row['peak_rss_mb']:.0f}" if row["peak_rss_mb"] else "-"
+        note = f"  ({row['error']})" if row["error"] else ""
+        lines.append(f"{row['app']:<18} {row['stage']:<7} {row['name']:<16} {seconds:>8} {rss:>8}{note}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    print(format_cold_start_report(cold_start_report(sys.argv[1:] or None)))
@@ -0,0 +1,443 @@
+"""One process per node that holds the OCR and NLP models for every app worker.
+
+Each Streamlit worker used to load its own EasyOCR reader, doctr predictor and
+BART model, so with several workers on a node most of the RAM was the same
+weights loaded several times. This server loads each model once and answers
+the apps over a Unix socket (model_client.py is the client; setting
+MODEL_SERVER_SOCKET in the apps' environment switches them over):
+
+    python model_server.py --socket /tmp/nutriscan-models.sock --models easyocr,summarizer
+
+Requests for the same model from different sessions are batched: a batch
+closes after MODEL_SERVER_BATCH items or MODEL_SERVER_BATCH_WAIT_MS, and runs
+as one recognize_batch() / summarize_many() / translate_many() call on the
+model's own thread, so the event loop keeps accepting requests meanwhile.
+Images arrive as shared-memory blocks written by the client.
+
+    python model_server.py --benchmark corpus/ --workers 4 --model easyocr
+
+runs the same workload in N worker processes twice, each loading its own model
+and then all sharing one server, and reports resident memory summed over the
+node and images (or texts) per second.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+
+import metrics
+import model_client
+from model_client import ModelClient, ModelServerError, SOCKET_PATH
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), "nutriscan-models.sock")
+MAX_BATCH = int(os.getenv("MODEL_SERVER_BATCH", "8"))
+BATCH_WAIT = float(os.getenv("MODEL_SERVER_BATCH_WAIT_MS", "10")) / 1000
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+
+def attach_image(descriptor):
+    """Copy of the array in a client's shared-memory block, without taking ownership of the block."""
+    from multiprocessing import resource_tracker, shared_memory
+
+    if sys.version_info >= (3, 13):
+        block = shared_memory.SharedMemory(name=descriptor["shm"], track=False)
+    else:
+        block = shared_memory.SharedMemory(name=descriptor["shm"])
+        # The client unlinks the block; this process's tracker must not unlink it again on exit
+        resource_tracker.unregister(block._name, "shared_memory")
+    try:
+        return np.ndarray(descriptor["shape"], np.dtype(descriptor["dtype"]), buffer=block.buf).copy()
+    finally:
+        block.close()
+
+
+class Batcher:
+    """Collects items from concurrent requests and runs fn(items) on them a batch at a time."""
+
+    def __init__(self, fn, executor, max_batch=MAX_BATCH, max_wait=BATCH_WAIT):
+        self.fn = fn
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.items = 0
+        self._task = None
+
+    async def submit(self, items):
+        """fn's output for each item, once the batches holding them have run."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        loop = asyncio.get_running_loop()
+        futures = []
+        for item in items:
+            futures.append(loop.create_future())
+            self.queue.put_nowait((item, futures[-1]))
+        return await asyncio.gather(*futures)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self.batches += 1
+            self.items += len(batch)
+            items = [item for item, _ in batch]
+            try:
+                outputs = await loop.run_in_executor(self.executor, self.fn, items)
+            except Exception as e:
+                # A batch mixes sessions: rerun it item by item so only the failing request gets the error
+                outputs = [e] if len(items) == 1 else await loop.run_in_executor(self.executor, self._one_by_one,
+                                                                                  items)
+            for (_, future), output in zip(batch, outputs):
+                if future.done():
+                    continue
+                if isinstance(output, Exception):
+                    future.set_exception(output)
+                else:
+                    future.set_result(output)
+
+    def _one_by_one(self, items):
+        outputs = []
+        for item in items:
+            try:
+                outputs.append(self.fn([item])[0])
+            except Exception as e:
+                outputs.append(e)
+        return outputs
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+
+
+def _ocr_output(result):
+    return {
+        "text": result.text,
+        "words": [[w.text, [float(v) for v in w.box], w.confidence] for w in result.words],
+        "timings": result.timings,
+        "error": result.error,
+    }
+
+
+class ModelServer:
+    def __init__(self, path=DEFAULT_SOCKET, max_batch=MAX_BATCH, max_wait=BATCH_WAIT):
+        self.path = path
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.models = {}  # name -> engine, Summarizer or LocalTranslator
+        self.executors = {}  # name -> single thread that owns the model
+        self.batchers = {}  # (op, model, settings...) -> Batcher
+        self.requests = Counter()
+        self.started = time.time()
+        self._server = None
+        model_client.SOCKET_PATH = ""  # This process holds the models; a cascade's tiers must not call back into it
+
+    # Models
+
+    def model(self, name):
+        """The one shared instance of a model, built on first use (blocking; call on the model's thread)."""
+        if name not in self.models:
+            from ocr_engines import _ENGINES
+            from preprocessing import DISABLED
+
+            if name == "summarizer":
+                from summarizer import Summarizer
+
+                model = Summarizer()
+            elif name == "translator":
+                from translation import LocalTranslator
+
+                model = LocalTranslator()
+            elif name in _ENGINES:
+                model = _ENGINES[name](preprocess=DISABLED)  # Clients send preprocessed images
+            else:
+                raise ModelServerError(f"Unknown model '{name}'")
+            model.load()
+            self.models[name] = model
+        return self.models[name]
+
+    def executor(self, name):
+        if name not in self.executors:
+            self.executors[name] = ThreadPoolExecutor(1, thread_name_prefix=f"model-{name}")
+        return self.executors[name]
+
+    async def load(self, names):
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.executor(n), self.model, n) for n in names))
+        return sorted(self.models)
+
+    def batcher(self, key, model, fn):
+        if key not in self.batchers:
+            self.batchers[key] = Batcher(lambda items: fn(self.model(model), items), self.executor(model),
+                                         self.max_batch, self.max_wait)
+        return self.batchers[key]
+
+    # Operations
+
+    async def handle(self, message):
+        op = message.get("op")
+        self.requests[op] += 1
+        with metrics.stage(f"model_server.{op}"):
+            if op == "ping":
+                return {"pid": os.getpid()}
+            if op == "load":
+                return await self.load(message["models"])
+            if op == "stats":
+                return self.stats()
+            if op == "ocr":
+                engine = message["engine"]
+                images = [attach_image(d) for d in message["images"]]
+                batcher = self.batcher(("ocr", engine), engine,
+                                       lambda model, items: [_ocr_output(r) for r in model.recognize_batch(items)])
+                return await batcher.submit(images)
+            if op == "summarize":
+                max_length, min_length, use_cache = message["max_length"], message["min_length"], message["use_cache"]
+                batcher = self.batcher(("summarize", max_length, min_length, use_cache), "summarizer",
+                                       lambda model, items: model.summarize_many(items, max_length, min_length,
+                                                                                 use_cache))
+                return await batcher.submit(message["texts"])
+            if op == "translate":
+                use_cache = message["use_cache"]
+                batcher = self.batcher(("translate", use_cache), "translator",
+                                       lambda model, items: [
+                                           {"text": r.text, "cached": r.cached, "model": r.model, "error": r.error}
+                                           for r in model.translate_many(items, use_cache)
+                                       ])
+                return await batcher.submit(message["texts"])
+            raise ModelServerError(f"Unknown operation '{op}'")
+
+    def stats(self):
+        return {
+            "pid": os.getpid(),
+            "uptime_s": round(time.time() - self.started),
+            "rss_mb": round(metrics.current_rss() / 2 ** 20, 1),
+            "peak_rss_mb": round(metrics.peak_rss() / 2 ** 20, 1),
+            "models": sorted(self.models),
+            "requests": dict(self.requests),
+            "batches": {
+                "/".join(map(str, key)): {"batches": b.batches, "items": b.items,
+                                          "mean_size": round(b.items / b.batches, 2) if b.batches else 0}
+                for key, b in self.batchers.items()
+            },
+        }
+
+    # Transport
+
+    async def _read(self, reader):
+        header = await reader.readexactly(4)
+        size = int.from_bytes(header, "big")
+        if size > MAX_MESSAGE_BYTES:
+            raise ModelServerError(f"Message of {size} bytes is larger than {MAX_MESSAGE_BYTES}")
+        return json.loads(await reader.readexactly(size))
+
+    async def _connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    message = await self._read(reader)
+                except asyncio.IncompleteReadError:
+                    return  # Client went away
+                try:
+                    reply = {"result": await self.handle(message)}
+                except Exception as e:
+                    reply = {"error": f"{type(e).__name__}: {e}"}
+                data = json.dumps(reply, ensure_ascii=False).encode()
+                writer.write(len(data).to_bytes(4, "big") + data)
+                await writer.drain()
+        except (ConnectionError, ModelServerError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, preload=()):
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # Left over from a server that did not shut down cleanly
+        if preload:
+            await self.load(preload)
+        self._server = await asyncio.start_unix_server(self._connection, path=self.path)
+        metrics.registry.gauge("model_server_batch_items", "Items processed per batcher since start.",
+                               lambda: {"/".join(map(str, k)): b.items for k, b in self.batchers.items()},
+                               label="batcher")
+        metrics.registry.gauge("model_server_rss_bytes", "Resident memory of the model server.",
+                               metrics.current_rss)
+        print(f"Model server {os.getpid()} listening on {self.path}; models: {', '.join(self.models) or 'on demand'}",
+              file=sys.stderr, flush=True)
+        try:
+            async with self._server:
+                await self._server.serve_forever()
+        finally:
+            for batcher in self.batchers.values():
+                batcher.close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+
+# Benchmark
+
+def _bench_worker(model, paths, repeats):
+    # Runs in a fresh interpreter; MODEL_SERVER_SOCKET in its environment decides local or shared models
+    if model == "summarizer":
+        from summarizer import SAMPLE_TEXT, get_text_summarizer
+
+        runner = get_text_summarizer()
+        runner.load()
+        items = [SAMPLE_TEXT * 4] * repeats
+        run = partial(runner.summarize, use_cache=False)
+    else:
+        from ocr_engines import get_engine
+
+        runner = get_engine(model)
+        runner.load()
+        items = []
+        for path in paths:
+            with open(path, "rb") as f:
+                items.append(f.read())
+        items *= repeats
+        run = runner.recognize
+    start = time.perf_counter()
+    for item in items:
+        run(item)
+    return {"items": len(items), "seconds": time.perf_counter() - start,
+            "rss_mb": round(metrics.current_rss() / 2 ** 20, 1), "peak_rss_mb": round(metrics.peak_rss() / 2 ** 20, 1)}
+
+
+def _run_workers(model, paths, workers, repeats, socket_path=""):
+    env = dict(os.environ, MODEL_SERVER_SOCKET=socket_path)
+    command = [sys.executable, os.path.abspath(__file__), "--bench-worker", model, "--repeats", str(repeats), *paths]
+    processes = [subprocess.Popen(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+                 for _ in range(workers)]
+    results = []
+    for process in processes:
+        stdout, stderr = process.communicate()
+        try:
+            results.append(json.loads(stdout.strip().splitlines()[-1]))
+        except (ValueError, IndexError):
+            raise RuntimeError((stderr.strip().splitlines() or ["worker produced no output"])[-1])
+    return results
+
+
+def _summary(label, results, server=None):
+    items = sum(r["items"] for r in results)
+    seconds = max(r["seconds"] for r in results)  # Workers run side by side
+    row = {
+        "setup": label,
+        "workers": len(results),
+        "items": items,
+        "items_per_s": round(items / seconds, 2) if seconds else None,
+        "worker_rss_mb": round(sum(r["rss_mb"] for r in results)),
+        "server_rss_mb": round(server["rss_mb"]) if server else 0,
+    }
+    row["node_rss_mb"] = row["worker_rss_mb"] + row["server_rss_mb"]
+    if server:
+        row["batches"] = server["batches"]
+    return row
+
+
+def benchmark(model, paths, workers=4, repeats=1):
+    """Rows for per-worker models and for one shared server, each run with `workers` processes."""
+    rows = []
+    try:
+        rows.append(_summary("per-worker", _run_workers(model, paths, workers, repeats)))
+    except RuntimeError as e:
+        rows.append({"setup": "per-worker", "error": str(e)})
+    socket_path = os.path.join(tempfile.mkdtemp(), "models.sock")
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--socket", socket_path, "--models", model])
+    try:
+        client = ModelClient(socket_path)
+        while True:  # Wait until the model is loaded and the socket is up
+            if server.poll() is not None:
+                raise RuntimeError(f"Model server exited with status {server.returncode}")
+            try:
+                client.ping()
+                break
+            except ModelServerError:
+                time.sleep(0.5)
+        results = _run_workers(model, paths, workers, repeats, socket_path)
+        rows.append(_summary("shared", results, client.stats()))
+        client.close()
+    except RuntimeError as e:
+        rows.append({"setup": "shared", "error": str(e)})
+    finally:
+        server.terminate()
+        server.wait()
+    return rows
+
+
+def format_benchmark(rows):
+    lines = [f"{'setup':<11} {'workers':>7} {'items':>6} {'items/s':>8} {'workers MB':>10} {'server MB':>9} "
+             f"{'node MB':>8}"]
+    for row in rows:
+        if "error" in row:
+            lines.append(f"{row['setup']:<11} failed: {row['error']}")
+            continue
+        lines.append(f"{row['setup']:<11} {row['workers']:>7} {row['items']:>6} {row['items_per_s']!s:>8} "
+                     f"{row['worker_rss_mb']:>10} {row['server_rss_mb']:>9} {row['node_rss_mb']:>8}")
+        for key, batches in row.get("batches", {}).items():
+            lines.append(f"{'':<11} batches for {key}: {batches['batches']}, mean size {batches['mean_size']}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the OCR and NLP models to the apps over a Unix socket.")
+    parser.add_argument("--socket", default=SOCKET_PATH or DEFAULT_SOCKET)
+    parser.add_argument("--models", default="", help="Comma-separated models to load at startup "
+                                                     "(OCR engine names, summarizer, translator)")
+    parser.add_argument("--batch", type=int, default=MAX_BATCH, help="Most items per model call")
+    parser.add_argument("--batch-wait-ms", type=float, default=BATCH_WAIT * 1000)
+    parser.add_argument("--benchmark", metavar="CORPUS", nargs="?", const="",
+                        help="Compare per-worker models with a shared server (images from CORPUS for OCR models)")
+    parser.add_argument("--model", default="easyocr", help="Benchmark: model to exercise")
+    parser.add_argument("--workers", type=int, default=4, help="Benchmark: worker processes")
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--bench-worker", help=argparse.SUPPRESS)
+    parser.add_argument("paths", nargs="*", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.bench_worker:
+        print(json.dumps(_bench_worker(args.bench_worker, args.paths, args.repeats)))
+        return
+    if args.benchmark is not None:
+        paths = []
+        if args.model != "summarizer":
+            from batch_ocr import collect_images
+
+            if not args.benchmark:
+                parser.error("--benchmark needs a corpus directory for OCR models")
+            paths = collect_images(args.benchmark)
+        print(format_benchmark(benchmark(args.model, paths, args.workers, args.repeats)))
+        return
+    metrics.serve()  # METRICS_PORT, when set
+    server = ModelServer(args.socket, args.batch, args.batch_wait_ms / 1000)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)  # Stop on SIGTERM as on Ctrl-C
+    try:
+        asyncio.run(server.serve([m for m in args.models.split(",") if m]))
+    except KeyboardInterrupt:
+        pass  # serve() has removed the socket file
+
+
+if __name__ == "__main__":
+    main()
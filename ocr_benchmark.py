@@ -0,0 +1,219 @@
+"""Benchmark every registered OCR engine over a corpus of images.
+
+The corpus is a directory of images; a ground-truth transcript for an image
+sits next to it with the same name and a .txt extension (e.g. label1.jpg and
+label1.txt). Each engine runs in its own fresh process so that its peak RSS
+is measured in isolation, and the report gives model load time, latency
+percentiles, peak RSS and character error rate (CER).
+
+Usage:
+    python ocr_benchmark.py corpus/ --engines tesseract easyocr doctr --repeats 3
+    python ocr_benchmark.py corpus/ --engines google_vision --fake-vision
+    python ocr_benchmark.py corpus/ --engines tesseract --compare-preprocess
+    python ocr_benchmark.py corpus/ --engines tesseract doctr cascade   # cascade also reports tier hit rates
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp")
+
+
+def load_corpus(corpus_dir):
+    """List of (image_path, ground_truth or None) pairs."""
+    items = []
+    for name in sorted(os.listdir(corpus_dir)):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        path = os.path.join(corpus_dir, name)
+        truth_path = os.path.splitext(path)[0] + ".txt"
+        truth = None
+        if os.path.exists(truth_path):
+            with open(truth_path, "r", encoding="utf-8") as f:
+                truth = f.read()
+        items.append((path, truth))
+    return items
+
+
+def _normalize(text):
+    return " ".join(text.split())
+
+
+def edit_distance(a, b):
+    """Levenshtein distance between two strings."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def character_error_rate(hypothesis, truth):
+    """Edit distance over the ground-truth length, after collapsing whitespace."""
+    hypothesis, truth = _normalize(hypothesis), _normalize(truth)
+    return edit_distance(hypothesis, truth) / max(len(truth), 1)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where unsupported)."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _make_engine(engine_name, items, fake_vision, fake_latency, preprocess):
+    from ocr_engines import get_engine
+    from preprocessing import DISABLED
+
+    kwargs = {} if preprocess else {"preprocess": DISABLED}
+    if engine_name == "google_vision" and fake_vision:
+        from fake_vision import FakeVisionClient
+
+        client = FakeVisionClient(latency=fake_latency)
+        for path, truth in items:
+            with open(path, "rb") as f:
+                client.add(f.read(), truth or "")
+        kwargs["client"] = client
+    return get_engine(engine_name, **kwargs)
+
+
+def _bench_engine(engine_name, items, repeats, fake_vision, fake_latency, preprocess=True):
+    # Runs in a fresh process: keep imports local so nothing is preloaded
+    from PIL import Image
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    engine = _make_engine(engine_name, items, fake_vision, fake_latency, preprocess)
+    rss_before = peak_rss_mb()
+    engine.load()
+
+    latencies, prep_times, errors, failures = [], [], [], 0
+    for path, truth in items:
+        if engine_name == "google_vision":
+            with open(path, "rb") as f:
+                image = f.read()
+        else:
+            with Image.open(path) as img:
+                image = img.convert("RGB")
+        try:
+            for repeat in range(repeats):
+                result = engine.recognize(image)
+                latencies.append(result.timings["preprocess"] + result.timings["inference"])
+                prep_times.append(result.timings["preprocess"])
+        except Exception as e:
+            print(f"[{engine_name}] {path}: {e}", file=sys.stderr)
+            failures += 1
+            continue
+        if truth is not None:
+            errors.append(character_error_rate(result.text, truth))
+
+    report = {
+        "engine": engine_name if preprocess else f"{engine_name} (raw)",
+        "images": len(items),
+        "failures": failures,
+        "load_seconds": round(engine.load_seconds, 3),
+        "peak_rss_mb": peak_rss_mb(),
+        "baseline_rss_mb": rss_before,
+        "cer": round(float(np.mean(errors)), 4) if errors else None,
+    }
+    if getattr(engine, "stats", None):  # Cascade: share of pages served by each tier
+        served = sum(engine.stats.values())
+        report["tier_hits"] = {outcome: round(count / served, 3) for outcome, count in engine.stats.most_common()}
+    if latencies:
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+        report.update({
+            "latency_p50": round(float(p50), 4),
+            "latency_p90": round(float(p90), 4),
+            "latency_p99": round(float(p99), 4),
+            "latency_mean": round(float(np.mean(latencies)), 4),
+            "preprocess_mean": round(float(np.mean(prep_times)), 4),
+        })
+    return report
+
+
+def run_benchmark(corpus_dir, engines=None, repeats=1, fake_vision=False, fake_latency=0.0,
+                  compare_preprocess=False):
+    """Benchmark each engine in its own process; returns a list of report dicts.
+
+    With compare_preprocess every engine also runs on the raw images, so the
+    latency and CER effect of preprocessing.py can be read side by side.
+    """
+    from ocr_engines import available_engines
+
+    items = load_corpus(corpus_dir)
+    if not items:
+        raise SystemExit(f"No images found in {corpus_dir}")
+    if not engines:
+        engines = available_engines()
+        if fake_vision and "google_vision" not in engines:
+            engines.append("google_vision")
+
+    reports = []
+    context = multiprocessing.get_context("spawn")
+    modes = (True, False) if compare_preprocess else (True,)
+    for engine_name in engines:
+        for preprocess in modes:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                future = pool.submit(_bench_engine, engine_name, items, repeats, fake_vision, fake_latency, preprocess)
+                try:
+                    reports.append(future.result())
+                except Exception as e:
+                    reports.append({"engine": engine_name, "error": str(e)})
+    return reports
+
+
+def format_report(reports):
+    """Plain-text table of the benchmark reports."""
+    columns = ["engine", "load_seconds", "preprocess_mean", "latency_p50", "latency_p90", "latency_p99",
+               "peak_rss_mb", "cer"]
+    rows = [columns]
+    for report in reports:
+        if "error" in report:
+            rows.append([report["engine"], f"error: {report['error']}"] + [""] * (len(columns) - 2))
+            continue
+        rows.append([
+            f"{report.get(column):.1f}" if column == "peak_rss_mb" and report.get(column) else str(report.get(column, ""))
+            for column in columns
+        ])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    lines = ["  ".join(cell.ljust(width) for cell, width in zip(row, widths)) for row in rows]
+    for report in reports:
+        if report.get("tier_hits"):
+            hits = ", ".join(f"{outcome} {share:.0%}" for outcome, share in report["tier_hits"].items())
+            lines.append(f"{report['engine']} tier hits: {hits}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare OCR engines on latency, memory and accuracy.")
+    parser.add_argument("corpus", help="Directory of images with optional .txt ground truth next to each")
+    parser.add_argument("--engines", nargs="+", help="Engines to run (default: every available engine)")
+    parser.add_argument("--repeats", type=int, default=1, help="Timed runs per image")
+    parser.add_argument("--fake-vision", action="store_true", help="Run google_vision against a local fake client")
+    parser.add_argument("--fake-vision-latency", type=float, default=0.0, help="Simulated Vision round trip (s)")
+    parser.add_argument("--compare-preprocess", action="store_true", help="Also run every engine on raw images")
+    parser.add_argument("--json", help="Also write the reports to this JSON file")
+    args = parser.parse_args(argv)
+
+    reports = run_benchmark(args.corpus, args.engines, args.repeats, args.fake_vision, args.fake_vision_latency,
+                            args.compare_preprocess)
+    print(format_report(reports))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
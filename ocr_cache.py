@@ -0,0 +1,188 @@
+"""Content-addressed cache for OCR results.
+
+Streamlit reruns the whole script on every button click, so the same upload
+would otherwise be OCR'd again for "Analyze with AI", "Translate to Hindi"
+and "Ask AI". Results are keyed by a hash of the uploaded bytes (the pixels
+only for images that exist just in memory) plus the engine name and its
+settings, kept in an in-memory LRU and optionally in an on-disk tier with
+size-based eviction. Hashing the encoded upload is cheaper than hashing
+decoded pixels and lets a hit skip decoding altogether.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# Memory tier size (number of results) and optional disk tier settings
+MEMORY_ENTRIES = int(os.getenv("OCR_CACHE_ENTRIES", "256"))
+DISK_DIR = os.getenv("OCR_CACHE_DIR", "")  # Empty disables the disk tier
+DISK_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+class OCRCache:
+    """Two-tier (memory LRU + optional disk) cache of OCR text by key."""
+
+    def __init__(self, max_entries=MEMORY_ENTRIES, disk_dir=None, max_disk_bytes=DISK_MAX_BYTES):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = 0
+        self.hits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                self.memory_hits += 1
+                return self._memory[key]
+
+        value = self._disk_get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._memory_put(key, value)
+        return value
+
+    def put(self, key, value):
+        """Store value under key in both tiers."""
+        with self._lock:
+            self._memory_put(key, value)
+        self._disk_put(key, value)
+
+    def clear(self):
+        """Drop every cached entry and reset the counters."""
+        with self._lock:
+            self._memory.clear()
+            self.hits = self.memory_hits = self.disk_hits = self.misses = 0
+            if self.disk_dir:
+                for path, _, _ in self._disk_entries():
+                    os.remove(path)
+                self._disk_bytes = 0
+
+    def stats(self):
+        """Hit/miss counters so the hit rate can be checked under load."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_bytes": self._disk_bytes,
+            }
+
+    def _memory_put(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key + ".json")
+
+    def _disk_entries(self):
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _disk_get(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)["text"]
+            os.utime(path)  # Refresh mtime so eviction is least-recently-used
+            return value
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _disk_put(self, key, value):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"text": value}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._disk_bytes += os.path.getsize(path)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        # Remove the oldest files until the tier is back under 90% of its cap
+        entries = sorted(self._disk_entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_disk_bytes * 0.9
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._disk_bytes = total
+
+
+def is_encoded(image):
+    """True for uploads, paths and bytes (still encoded), False for decoded PIL images and arrays."""
+    return isinstance(image, (bytes, bytearray, memoryview, str, os.PathLike)) or hasattr(image, "read")
+
+
+def image_digest(image):
+    """Hash of the encoded bytes of an upload, path or bytes object, else of a PIL image's or array's pixels."""
+    h = hashlib.blake2b(digest_size=20)
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        h.update(image)
+    elif hasattr(image, "getvalue"):  # Streamlit UploadedFile / BytesIO
+        h.update(image.getbuffer() if hasattr(image, "getbuffer") else image.getvalue())
+    elif isinstance(image, (str, os.PathLike)):
+        with open(image, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    elif hasattr(image, "read"):  # Other file objects
+        image.seek(0)
+        for block in iter(lambda: image.read(1 << 20), b""):
+            h.update(block)
+        image.seek(0)
+    elif hasattr(image, "tobytes") and hasattr(image, "mode"):  # PIL image
+        h.update(f"{image.mode}:{image.size}".encode())
+        h.update(image.tobytes())
+    else:  # NumPy array, hashed in place when contiguous (decoded uploads are)
+        h.update(f"{image.dtype}:{image.shape}".encode())
+        h.update(image.data.cast("B") if image.flags["C_CONTIGUOUS"] else image.tobytes())
+    return h.hexdigest()
+
+
+def make_key(digest, engine, settings=None):
+    """Combine the content digest with the engine name and its settings."""
+    settings_json = json.dumps(settings or {}, sort_keys=True, default=str)
+    return hashlib.sha1(f"{engine}|{settings_json}|{digest}".encode()).hexdigest()
+
+
+ocr_cache = OCRCache(disk_dir=DISK_DIR or None)
+
@@ -0,0 +1,577 @@
+"""Common interface over the OCR engines used by the apps.
+
+Every engine takes a PIL image, NumPy array or raw image bytes, runs it through
+the engine's preprocessing config (preprocessing.py) and returns an OCRResult
+with the full text, per-word boxes and confidences, and per-stage timings.
+Engines are registered by name so the apps and the benchmark harness
+(ocr_benchmark.py) can pick one instead of hardcoding it.
+"""
+import importlib.util
+import io
+import os
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+
+import numpy as np
+
+from metrics import observe, registry, stage
+from model_loader import record
+from ocr_cache import image_digest, is_encoded, make_key, ocr_cache
+
+# Ensure Tesseract is correctly configured (Windows users must set this path)
+TESSERACT_PATH = r"C:\\Program Files\\Tesseract-OCR\\tesseract.exe"  # Update if needed
+
+
+@dataclass
+class OCRWord:
+    text: str
+    box: tuple  # (x0, y0, x1, y1) in pixels
+    confidence: float = None  # 0..1, None when the engine does not report it
+
+
+@dataclass
+class OCRResult:
+    engine: str
+    text: str
+    words: list = field(default_factory=list)
+    timings: dict = field(default_factory=dict)  # seconds per stage
+    error: str = None  # Set by recognize_batch() for an image that failed while the rest of its batch was read
+
+
+class OCREngine:
+    """Base class: subclasses implement _load() and _recognize()."""
+
+    name = ""
+    label = ""  # Human readable name used in error strings
+    requires = ()  # Modules that must be importable for the engine to be available
+    settings = {}  # Anything that changes the output; part of the cache key
+    takes_encoded = False  # Reads encoded image bytes itself, so unpreprocessed uploads are not decoded
+
+    def __init__(self, preprocess=None):
+        self._model = None
+        self._lock = threading.Lock()
+        self.load_seconds = 0.0
+        if preprocess is None:
+            from preprocessing import default_config  # OpenCV is imported on first engine use
+
+            preprocess = default_config(self.name)
+        self.preprocess = preprocess
+
+    def cache_settings(self):
+        """Engine settings plus preprocessing config, used in cache keys."""
+        return dict(self.settings, preprocess=self.preprocess.as_dict())
+
+    @classmethod
+    def is_available(cls):
+        return all(_module_installed(module) for module in cls.requires)
+
+    def load(self):
+        """Build the underlying model once; later calls are free."""
+        with self._lock:
+            if self._model is None:
+                start = time.perf_counter()
+                self._model = self._load()
+                self.load_seconds = time.perf_counter() - start
+                record("model", self.name, self.load_seconds)
+        return self._model
+
+    def _prepare(self, image):
+        if not self.preprocess.enabled:
+            return image, {}
+        from preprocessing import preprocess
+
+        return preprocess(to_array(image), self.preprocess, dpi=image_dpi(image))
+
+    def recognize(self, image):
+        start = time.perf_counter()
+        model = self.load()
+        loaded = time.perf_counter()
+        image, steps = self._prepare(image)
+        prepared = time.perf_counter()
+        text, words = self._recognize(model, image)
+        done = time.perf_counter()
+        timings = {
+            "load": loaded - start,
+            "preprocess": prepared - loaded,
+            "inference": done - prepared,
+            "total": done - start,
+        }
+        timings.update({f"preprocess_{step}": seconds for step, seconds in steps.items()})
+        return OCRResult(engine=self.name, text=text.strip(), words=words, timings=timings)
+
+    def recognize_batch(self, images):
+        """One OCRResult per image, with a single model call for engines that batch natively.
+
+        Batch-wide stage times are split evenly across the images. _recognize_batch() may put an
+        exception in place of one image's output; that image's result then has empty text and `error` set.
+        """
+        start = time.perf_counter()
+        model = self.load()
+        loaded = time.perf_counter()
+        prepared_images, steps = zip(*(self._prepare(image) for image in images)) if images else ((), ())
+        prepared = time.perf_counter()
+        outputs = self._recognize_batch(model, list(prepared_images))
+        done = time.perf_counter()
+        count = max(len(outputs), 1)
+        results = []
+        for output, page_steps in zip(outputs, steps):
+            if isinstance(output, Exception):
+                results.append(OCRResult(engine=self.name, text="", error=str(output)))
+                continue
+            text, words = output
+            timings = {
+                "load": (loaded - start) / count,
+                "preprocess": (prepared - loaded) / count,
+                "inference": (done - prepared) / count,
+                "total": (done - start) / count,
+            }
+            timings.update({f"preprocess_{step}": seconds for step, seconds in page_steps.items()})
+            results.append(OCRResult(engine=self.name, text=text.strip(), words=words, timings=timings))
+        return results
+
+    def _load(self):
+        raise NotImplementedError
+
+    def _recognize(self, model, image):
+        raise NotImplementedError
+
+    def _recognize_batch(self, model, images):
+        return [self._recognize(model, image) for image in images]
+
+
+def _module_installed(module):
+    try:
+        return importlib.util.find_spec(module) is not None
+    except ImportError:  # Parent package (e.g. google.cloud) missing
+        return False
+
+
+_ENGINES = {}
+_instances = {}
+
+
+def register_engine(cls):
+    """Class decorator adding an engine to the registry under cls.name."""
+    _ENGINES[cls.name] = cls
+    return cls
+
+
+def available_engines():
+    """Names of registered engines whose dependencies are installed (or that the model server runs)."""
+    from model_client import served
+
+    return [name for name, cls in _ENGINES.items() if cls.is_available() or served(name)]
+
+
+def get_engine(name, **kwargs):
+    """Shared engine instance by name (a new one when kwargs are given).
+
+    Engines listed in MODEL_SERVER_MODELS come back as a model_client.RemoteEngine
+    when MODEL_SERVER_SOCKET is set, so the model is not loaded in this process.
+    """
+    if name not in _ENGINES:
+        raise KeyError(f"Unknown OCR engine '{name}'. Available: {', '.join(_ENGINES)}")
+    if kwargs:
+        return _ENGINES[name](**kwargs)
+    if name not in _instances:
+        from model_client import RemoteEngine, served
+
+        _instances[name] = RemoteEngine(name) if served(name) else _ENGINES[name]()
+    return _instances[name]
+
+
+def extract_text(image, engine="tesseract"):
+    """Text from the named engine, cached, with the apps' error-string convention.
+
+    Uploads, paths and bytes are keyed on their encoded bytes and only decoded
+    (image_ingest.decode, at the engine's working size) on a cache miss. Engines
+    that take encoded images get the upload's original bytes when preprocessing is off.
+    """
+    ocr_engine = get_engine(engine)
+    key = make_key(image_digest(image), ocr_engine.name, ocr_engine.cache_settings())
+    text = ocr_cache.get(key)
+    if text is not None:
+        return text
+    if is_encoded(image):
+        from image_ingest import decode, read_encoded
+
+        try:
+            if ocr_engine.takes_encoded and not ocr_engine.preprocess.enabled:
+                image = read_encoded(image)
+            else:
+                image = decode(image, engine)
+        except Exception as e:
+            return f"Error decoding image: {str(e)}"
+    try:
+        with stage(f"ocr.{ocr_engine.name}"):
+            result = ocr_engine.recognize(image)
+    except Exception as e:
+        return f"Error in {ocr_engine.label} OCR: {str(e)}"
+    for step, seconds in result.timings.items():
+        observe(f"ocr.{ocr_engine.name}.{step}", seconds)
+    text = result.text
+    ocr_cache.put(key, text)
+    return text
+
+
+def to_array(image):
+    """RGB/grayscale NumPy array from a PIL image, array or encoded bytes."""
+    if isinstance(image, np.ndarray):
+        return image
+    if isinstance(image, (bytes, bytearray)):
+        from PIL import Image
+        image = Image.open(io.BytesIO(image))
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    return np.asarray(image)
+
+
+def image_dpi(image):
+    """Horizontal DPI from PIL metadata, or None when unknown."""
+    dpi = getattr(image, "info", {}).get("dpi")
+    try:
+        return float(dpi[0]) if dpi else None
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def to_bytes(image):
+    """Encoded image bytes (PNG when the input is not already encoded)."""
+    if isinstance(image, (bytes, bytearray)):
+        return bytes(image)
+    from PIL import Image
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _vision_image(content):
+    try:
+        from google.cloud import vision
+    except ImportError:  # Running against a local fake client
+        return SimpleNamespace(content=content)
+    return vision.Image(content=content)
+
+
+@register_engine
+class TesseractEngine(OCREngine):
+    name = "tesseract"
+    label = "Tesseract"
+    requires = ("pytesseract",)
+
+    def __init__(self, lang="eng", config="", preprocess=None):
+        super().__init__(preprocess)
+        self.settings = {"lang": lang, "config": config}
+
+    def _load(self):
+        import pytesseract
+
+        if os.name == "nt":  # Windows
+            pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
+        return pytesseract
+
+    def _recognize(self, pytesseract, image):
+        data = pytesseract.image_to_data(
+            to_array(image), lang=self.settings["lang"], config=self.settings["config"],
+            output_type=pytesseract.Output.DICT,
+        )
+        # One pass gives both words and text: rebuild lines from the word layout
+        words, lines, current_line, line_words = [], [], None, []
+        for i, word in enumerate(data["text"]):
+            line = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            if line != current_line:
+                if line_words:
+                    lines.append(" ".join(line_words))
+                current_line, line_words = line, []
+            if not word.strip():
+                continue
+            line_words.append(word)
+            left, top = data["left"][i], data["top"][i]
+            conf = float(data["conf"][i])
+            words.append(OCRWord(
+                text=word,
+                box=(left, top, left + data["width"][i], top + data["height"][i]),
+                confidence=conf / 100 if conf >= 0 else None,
+            ))
+        if line_words:
+            lines.append(" ".join(line_words))
+        return "\n".join(lines), words
+
+
+@register_engine
+class EasyOCREngine(OCREngine):
+    name = "easyocr"
+    label = "EasyOCR"
+    requires = ("easyocr",)
+
+    def __init__(self, langs=("en",), preprocess=None):
+        super().__init__(preprocess)
+        self.settings = {"langs": list(langs)}
+
+    def _load(self):
+        import easyocr
+
+        return easyocr.Reader(self.settings["langs"])
+
+    def _recognize(self, reader, image):
+        words = []
+        for points, text, conf in reader.readtext(to_array(image)):
+            xs = [p[0] for p in points]
+            ys = [p[1] for p in points]
+            words.append(OCRWord(text=text, box=(min(xs), min(ys), max(xs), max(ys)), confidence=float(conf)))
+        return "\n".join(word.text for word in words), words
+
+
+@register_engine
+class DoctrEngine(OCREngine):
+    name = "doctr"
+    label = "Doctr"
+    requires = ("doctr",)
+    settings = {"pretrained": True}
+
+    def _load(self):
+        from doctr.models import ocr_predictor
+
+        from model_loader import set_torch_threads
+
+        set_torch_threads()  # TORCH_THREADS, when set
+        return ocr_predictor(pretrained=True)
+
+    def _recognize(self, model, image):
+        return self._recognize_batch(model, [image])[0]
+
+    def _recognize_batch(self, model, images):
+        arrays = []
+        for image in images:
+            array = to_array(image)
+            if array.ndim == 2:  # doctr expects three channels
+                array = np.stack([array] * 3, axis=-1)
+            arrays.append(array)
+        doc = model(arrays)  # One forward pass per stage for the whole batch
+        outputs = []
+        for array, page in zip(arrays, doc.pages):
+            height, width = array.shape[:2]
+            words = []
+            for block in page.blocks:
+                for line in block.lines:
+                    for word in line.words:
+                        (x0, y0), (x1, y1) = word.geometry  # Relative coordinates
+                        words.append(OCRWord(
+                            text=word.value,
+                            box=(x0 * width, y0 * height, x1 * width, y1 * height),
+                            confidence=float(word.confidence),
+                        ))
+            outputs.append(("\n".join(word.text for word in words), words))
+        return outputs
+
+
+@register_engine
+class VisionEngine(OCREngine):
+    """Google Cloud Vision; pass client= (e.g. fake_vision.FakeVisionClient) to run locally.
+
+    Batches go out as batch_annotate_images requests of up to 16 images (image_processing.py).
+    """
+
+    name = "google_vision"
+    label = "Google Vision"
+    requires = ("google.cloud.vision",)
+    settings = {"feature": "text_detection"}
+    takes_encoded = True
+
+    def __init__(self, client=None, preprocess=None):
+        super().__init__(preprocess)
+        self._client = client
+
+    @classmethod
+    def is_available(cls):
+        return super().is_available() and bool(os.getenv("GOOGLE_APPLICATION_CREDENTIALS"))
+
+    def _load(self):
+        if self._client is not None:
+            return self._client
+        from image_processing import get_vision_client
+
+        return get_vision_client()
+
+    def _recognize(self, client, image):
+        from image_processing import parse_response
+
+        result = parse_response(client.text_detection(image=_vision_image(to_bytes(image))))
+        if result.error:
+            raise Exception(result.error)
+        return result.text, result.words
+
+    def _recognize_batch(self, client, images):
+        from image_processing import annotate_batch
+
+        results = annotate_batch([to_bytes(image) for image in images], client=client, feature="TEXT_DETECTION")
+        # A failed image only fails its own result, as annotate_batch() reports it
+        return [Exception(result.error) if result.error else (result.text, result.words) for result in results]
+
+
+# Confidence-driven cascade
+
+CASCADE_TIERS = os.getenv("CASCADE_TIERS", "tesseract,easyocr,doctr")
+CASCADE_PAGE_CONFIDENCE = float(os.getenv("CASCADE_PAGE_CONFIDENCE", "0.75"))  # Below: the whole page escalates
+CASCADE_WORD_CONFIDENCE = float(os.getenv("CASCADE_WORD_CONFIDENCE", "0.60"))  # Below: the word's region escalates
+CASCADE_MAX_REGION_SHARE = float(os.getenv("CASCADE_MAX_REGION_SHARE", "0.4"))  # More low words: the page escalates
+
+
+@register_engine
+class CascadeEngine(OCREngine):
+    """Tesseract first; low-confidence regions, or whole pages, go to the heavier tiers.
+
+    The image is preprocessed once (geometry only), so every tier's word boxes
+    share one coordinate space. Words read by the first tier below
+    word_threshold are grouped into line regions, cropped and re-read by the
+    next tier, and that tier's words replace them when they are more confident.
+    A page whose mean confidence is below page_threshold, or with more than
+    max_region_share of its words uncertain, is read whole by each further tier
+    until one is confident enough. stats counts how each page was served.
+    """
+
+    name = "cascade"
+    label = "Cascade"
+    requires = ("pytesseract",)
+
+    def __init__(self, tiers=CASCADE_TIERS, page_threshold=CASCADE_PAGE_CONFIDENCE,
+                 word_threshold=CASCADE_WORD_CONFIDENCE, max_region_share=CASCADE_MAX_REGION_SHARE, preprocess=None):
+        super().__init__(preprocess)
+        tiers = [t.strip() for t in tiers.split(",")] if isinstance(tiers, str) else list(tiers)
+        self.settings = {"tiers": tiers, "page_threshold": page_threshold, "word_threshold": word_threshold,
+                         "max_region_share": max_region_share}
+        self.stats = Counter()
+        registry.gauge("ocr_cascade_pages", "Pages by the cascade tier that produced their text.",
+                       lambda: dict(self.stats), label="outcome")
+
+    @classmethod
+    def is_available(cls):
+        from model_client import served
+
+        return served("tesseract") or super().is_available()
+
+    def _load(self):
+        from model_client import RemoteEngine, served
+        from preprocessing import DISABLED
+
+        # Heavier tiers are built here but only load their models when first escalated to;
+        # tiers the model server holds are proxies, so their models are never loaded in this process
+        engines = [RemoteEngine(name, preprocess=DISABLED) if served(name) else _ENGINES[name](preprocess=DISABLED)
+                   for name in self.settings["tiers"]
+                   if name in _ENGINES and (served(name) or _ENGINES[name].is_available())]
+        if not engines:
+            raise RuntimeError(f"No cascade tier is available: {', '.join(self.settings['tiers'])}")
+        engines[0].load()
+        return engines
+
+    def _recognize(self, engines, image):
+        from preprocessing import adaptive_threshold, to_grayscale
+
+        image = to_array(image)
+        first = engines[0]
+        with stage(f"ocr.cascade.{first.name}"):
+            # Tesseract reads binarised text best; the neural tiers get the colour image
+            result = first.recognize(adaptive_threshold(to_grayscale(image)) if first.name == "tesseract" else image)
+        words = result.words
+        low = [w for w in words if w.confidence is not None and w.confidence < self.settings["word_threshold"]]
+        if len(engines) == 1 or not low and mean_confidence(words, 1.0) >= self.settings["page_threshold"]:
+            self.stats[first.name] += 1
+            return result.text, words
+        try:
+            if (mean_confidence(words, 0.0) < self.settings["page_threshold"]
+                    or len(low) > self.settings["max_region_share"] * len(words)):
+                return self._escalate_page(engines, image, result)
+            return self._escalate_regions(engines[1], image, words, low, first.name)
+        except Exception:  # A heavier tier failed to load or run: keep the first tier's reading
+            self.stats[f"{first.name}:fallback"] += 1
+            return result.text, words
+
+    def _escalate_page(self, engines, image, best):
+        best_confidence, tier = mean_confidence(best.words, 0.0), engines[0].name
+        for engine in engines[1:]:
+            with stage(f"ocr.cascade.{engine.name}"):
+                result = engine.recognize(image)
+            confidence = mean_confidence(result.words, 0.0)
+            if confidence > best_confidence:
+                best, best_confidence, tier = result, confidence, engine.name
+            if confidence >= self.settings["page_threshold"]:
+                break
+        self.stats[f"page:{tier}"] += 1
+        return best.text, best.words
+
+    def _escalate_regions(self, engine, image, words, low, first_tier):
+        height, width = image.shape[:2]
+        regions = line_regions(low, width, height)
+        with stage(f"ocr.cascade.{engine.name}.regions"):
+            crops = engine.recognize_batch([image[y0:y1, x0:x1] for x0, y0, x1, y1 in regions])
+        kept = [w for w in words if not any(_center_in(w.box, region) for region in regions)]
+        replaced = 0
+        for region, crop in zip(regions, crops):
+            x0, y0 = region[:2]
+            original = [w for w in words if _center_in(w.box, region)]
+            redone = [OCRWord(text=w.text, box=(w.box[0] + x0, w.box[1] + y0, w.box[2] + x0, w.box[3] + y0),
+                              confidence=w.confidence) for w in crop.words]
+            if redone and mean_confidence(redone, 0.0) > mean_confidence(original, 0.0):
+                kept += redone
+                replaced += 1
+            else:
+                kept += original
+        self.stats[f"regions:{engine.name}" if replaced else first_tier] += 1
+        return words_to_text(kept), kept
+
+
+def mean_confidence(words, default):
+    """Character-weighted mean word confidence, or default when no word has one."""
+    scored = [(w.confidence, len(w.text)) for w in words if w.confidence is not None]
+    total = sum(length for _, length in scored)
+    return sum(c * length for c, length in scored) / total if total else default
+
+
+def _center_in(box, region):
+    cx, cy = (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+    return region[0] <= cx <= region[2] and region[1] <= cy <= region[3]
+
+
+def _group_lines(words):
+    # Words whose vertical centres fall inside the current line's extent share a line
+    lines = []
+    for word in sorted(words, key=lambda w: (w.box[1] + w.box[3]) / 2):
+        center = (word.box[1] + word.box[3]) / 2
+        if lines and lines[-1][1] <= center <= lines[-1][2]:
+            line = lines[-1]
+            line[0].append(word)
+            line[1], line[2] = min(line[1], word.box[1]), max(line[2], word.box[3])
+        else:
+            lines.append([[word], word.box[1], word.box[3]])
+    return [sorted(line[0], key=lambda w: w.box[0]) for line in lines]
+
+
+def words_to_text(words):
+    """Text rebuilt from word boxes: lines top to bottom, words left to right."""
+    return "\n".join(" ".join(w.text for w in line) for line in _group_lines(words))
+
+
+def line_regions(words, width, height, pad=0.4):
+    """Padded boxes around the given words, one per line, with overlapping boxes merged."""
+    regions = []
+    for line in _group_lines(words):
+        x0, y0 = min(w.box[0] for w in line), min(w.box[1] for w in line)
+        x1, y1 = max(w.box[2] for w in line), max(w.box[3] for w in line)
+        margin = pad * (y1 - y0)
+        regions.append([max(0, int(x0 - 2 * margin)), max(0, int(y0 - margin)),
+                        min(width, int(x1 + 2 * margin)), min(height, int(y1 + margin))])
+    merged = []
+    for region in sorted(regions, key=lambda r: (r[1], r[0])):
+        overlap = next((m for m in merged if region[0] < m[2] and m[0] < region[2]
+                        and region[1] < m[3] and m[1] < region[3]), None)
+        if overlap is None:
+            merged.append(region)
+        else:
+            overlap[:] = [min(overlap[0], region[0]), min(overlap[1], region[1]),
+                          max(overlap[2], region[2]), max(overlap[3], region[3])]
+    return [tuple(region) for region in merged if region[2] > region[0] and region[3] > region[1]]
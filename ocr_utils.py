@@ -1,13 +1,16 @@
 import streamlit as st
-import cv2
-import pytesseract
-import easyocr
-import numpy as np
 import os
-from groq import Groq
-from PIL import Image
 import sys
 import locale
+from async_llm import analyze_and_translate
+from history import ConversationHistory
+from image_ingest import ImageTooLarge, preview
+from label_parser import answer_locally, label_context, parse_label
+from llm_client import ask, cache_bypass_checkbox, use_llm_cache
+from metrics import bind_session, debug_sidebar
+from model_loader import warm_up
+from ocr_engines import available_engines, extract_text
+from translation import get_translator, translation_backend_selector
 
 # Ensure UTF-8 encoding
 sys.stdout.reconfigure(encoding='utf-8')
@@ -15,138 +18,193 @@ locale.setlocale(locale.LC_ALL, 'en_US.utf8')
 
 # Set Groq API Key
 GROQ_API_KEY = "your_groq_api_key_here"  # Replace with your actual API key
-client = Groq(api_key=GROQ_API_KEY)
 
-# Initialize EasyOCR Reader
-reader = easyocr.Reader(["en"])
-
-# Ensure Tesseract is correctly configured (Windows users must set this path)
-TESSERACT_PATH = r"C:\\Program Files\\Tesseract-OCR\\tesseract.exe"  # Update if needed
-if os.name == "nt":  # Windows
-    pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
+# OCR engine used by default (any name registered in ocr_engines)
+OCR_ENGINE = os.getenv("OCR_ENGINE", "tesseract")
 
 # Store session state variables
-if "conversation_history" not in st.session_state:
-    st.session_state.conversation_history = []
+def init_session_state():
+    if "conversation_history" not in st.session_state:
+        st.session_state.conversation_history = ConversationHistory()
 
-if "extracted_text" not in st.session_state:
-    st.session_state.extracted_text = ""
+    if "extracted_text" not in st.session_state:
+        st.session_state.extracted_text = ""
 
-if "ai_response" not in st.session_state:
-    st.session_state.ai_response = ""
+    if "ai_response" not in st.session_state:
+        st.session_state.ai_response = ""
 
-if "translated_response" not in st.session_state:
-    st.session_state.translated_response = ""
+    if "translated_response" not in st.session_state:
+        st.session_state.translated_response = ""
 
 def extract_text_tesseract(image):
-    """Extract text using Tesseract OCR."""
-    try:
-        image = np.array(image)
-        text = pytesseract.image_to_string(image)
-        return text.strip()
-    except Exception as e:
-        return f"Error in Tesseract OCR: {str(e)}"
+    """Extract text using Tesseract OCR (cached across reruns)."""
+    return extract_text(image, "tesseract")
 
-def analyze_text_with_groq(text):
-    """Analyze extracted text using Groq AI."""
+def select_ocr_engine():
+    """Let the user pick any installed OCR engine, defaulting to OCR_ENGINE."""
+    engines = available_engines() or [OCR_ENGINE]
+    default = engines.index(OCR_ENGINE) if OCR_ENGINE in engines else 0
+    return st.sidebar.selectbox("OCR Engine", engines, index=default)
+
+def ask_about_label(prompt, label_text, kind="analysis"):
+    """Send a prompt in the analysis thread; the label (parsed JSON when readable) is sent once as context."""
     if not GROQ_API_KEY:
         return "Error: Groq API key is not set."
 
     try:
-        st.session_state.conversation_history.append({
-            "role": "user", 
-            "content": f"Analyze the following text for nutritional insights:\n\n{text}"
-        })
-
-        chat_completion = client.chat.completions.create(
-            messages=st.session_state.conversation_history,
-            model="mixtral-8x7b-32768",
-            stream=False,
-        )
-
-        response = chat_completion.choices[0].message.content if chat_completion.choices else "Error: No response from Groq AI."
-        
-        st.session_state.conversation_history.append({"role": "assistant", "content": response})
+        history = st.session_state.conversation_history
+        history.set_context(label_context(label_text))
+        result = ask(history.messages_for(prompt), GROQ_API_KEY, kind=kind, use_cache=use_llm_cache())
+
+        response = result.text if result.text else "Error: No response from Groq AI."
+        if result.cancelled:
+            return response  # Partial reply: keep it out of the conversation
+
+        history.add_turn(prompt, response)
         st.session_state.ai_response = response  # Store response
         return response
     except Exception as e:
         return f"Error connecting to Groq API: {str(e)}"
 
+def analyze_text_with_groq(text):
+    """Analyze extracted text using Groq AI."""
+    return ask_about_label("Analyze the extracted text for nutritional insights.", text)
+
+def analyze_and_translate_with_groq(text):
+    """Analyze extracted text and translate the analysis to Hindi while it streams."""
+    if not GROQ_API_KEY:
+        return "Error: Groq API key is not set."
+
+    history = st.session_state.conversation_history
+    history.set_context(label_context(text))
+    prompt = "Analyze the extracted text for nutritional insights."
+
+    placeholder = st.empty()
+    streamed = []
+
+    def show(token):
+        streamed.append(token)
+        placeholder.markdown("".join(streamed))
+
+    analysis, translation = analyze_and_translate(
+        GROQ_API_KEY, history.messages_for(prompt), on_token=show, use_cache=use_llm_cache(),
+        translator=get_translator(st.session_state.get("translation_backend"), GROQ_API_KEY),
+    )
+    if analysis.error:
+        return f"Error connecting to Groq API: {analysis.error}"
+
+    response = analysis.text if analysis.text else "Error: No response from Groq AI."
+    history.add_turn(prompt, response)
+    st.session_state.ai_response = response
+    st.session_state.translated_response = translation or ""
+    return response
+
+def ask_question_with_groq(question, text):
+    """Answer a question about the extracted text; amounts printed on the label are answered locally."""
+    local_answer = answer_locally(question, text)
+    if local_answer:
+        st.session_state.conversation_history.add_turn(f"User question: {question}", local_answer)
+        return local_answer
+    return ask_about_label(f"User question: {question}", text, kind="chat")
+
 def translate_text_to_hindi(text):
-    """Translate given text to Hindi using Groq AI."""
+    """Translate given text to Hindi with the selected backend (Groq or the local model)."""
     try:
-        translation_prompt = f"Translate the following text into Hindi:\n\n{text}"
-        st.session_state.conversation_history.append({"role": "user", "content": translation_prompt})
-        
-        chat_completion = client.chat.completions.create(
-            messages=st.session_state.conversation_history,
-            model="mixtral-8x7b-32768",
-            stream=False,
-        )
-        
-        translated_text = chat_completion.choices[0].message.content if chat_completion.choices else "Error: No response from Groq AI."
-        
-        st.session_state.conversation_history.append({"role": "assistant", "content": translated_text})
+        translator = get_translator(st.session_state.get("translation_backend"), GROQ_API_KEY)
+        result = translator.translate(text, use_cache=use_llm_cache())
+
+        translated_text = result.text if result.text else "Error: No response from Groq AI."
+        if result.cancelled:
+            return translated_text
+
         st.session_state.translated_response = translated_text  # Store translated response
         return translated_text
     except Exception as e:
         return f"Translation Error: {str(e)}"
 
 # Streamlit UI
-st.title("📸 NutriScan - AI Nutrition Chatbot")
-st.write("Upload a food label image to extract nutritional information and analyze it using AI.")
-
-uploaded_file = st.file_uploader("Upload Image", type=["jpg", "png", "jpeg"])
-
-if uploaded_file is not None:
-    image = Image.open(uploaded_file)
-    st.image(image, caption="Uploaded Image", use_column_width=True)
-
-    st.write("🔍 Extracting text from image...")
-    extracted_text = extract_text_tesseract(image)
-    st.session_state.extracted_text = extracted_text
-    st.text_area("Extracted Text", extracted_text, height=150)
-
-    if st.button("Analyze with AI"):
-        st.write("🤖 AI is analyzing...")
-        analysis = analyze_text_with_groq(extracted_text)
-        st.success("✅ AI Analysis Complete!")
-        st.session_state.ai_response = analysis  # Store analysis
-        st.session_state.translated_response = ""  # Reset translation
+def main():
+    warm_up()  # No-op unless WARM_UP_MODELS is set
+    init_session_state()
+    ocr_engine = select_ocr_engine()
+    cache_bypass_checkbox()
+    translation_backend_selector()
+    together = st.sidebar.checkbox("Analyze + translate together",
+                                   help="Translate to Hindi while the analysis is still being written")
+
+    st.title("📸 NutriScan - AI Nutrition Chatbot")
+    st.write("Upload a food label image to extract nutritional information and analyze it using AI.")
+
+    uploaded_file = st.file_uploader("Upload Image", type=["jpg", "png", "jpeg"])
+
+    # Only a small preview is decoded here (within the upload caps); the OCR input is decoded at OCR size
+    # when the cache has no text for these bytes yet
+    preview_image = None
+    if uploaded_file is not None:
+        try:
+            preview_image = preview(uploaded_file)
+        except ImageTooLarge as e:
+            st.error(f"⚠ {e}")
+
+    if preview_image is not None:
+        st.image(preview_image, caption="Uploaded Image", use_column_width=True)
+
+        st.write("🔍 Extracting text from image...")
+        extracted_text = extract_text(uploaded_file, ocr_engine)
+        st.session_state.extracted_text = extracted_text
+        st.text_area("Extracted Text", extracted_text, height=150)
+        label = parse_label(extracted_text)
+        if label.is_useful():
+            with st.expander("📊 Nutrition Facts (read locally)"):
+                st.json(label.summary())
+
+        if st.button("Analyze with AI"):
+            st.write("🤖 AI is analyzing...")
+            if together:
+                analysis = analyze_and_translate_with_groq(extracted_text)
+            else:
+                analysis = analyze_text_with_groq(extracted_text)
+                st.session_state.translated_response = ""  # Reset translation
+            st.success("✅ AI Analysis Complete!")
+            st.session_state.ai_response = analysis  # Store analysis
        
-    # Display AI response
-    if st.session_state.ai_response:
-        st.text_area("AI Response", st.session_state.ai_response, height=200)
-
-        # Translation button
-        if st.button("Translate to Hindi"):
-            translated_analysis = translate_text_to_hindi(st.session_state.ai_response)
-            st.session_state.translated_response = translated_analysis  # Store translated response
-
-    # Display Translated Response
-    if st.session_state.translated_response:
-        st.text_area("AI Response in Hindi", st.session_state.translated_response, height=200)
-
-# Chatbot Section
-st.subheader("💬 Chat with AI")
-user_question = st.text_input("Ask a question about the extracted information:")
-
-if st.button("Ask AI"):
-    if user_question:
-        question_with_context = f"User question: {user_question}\n\nHere is the nutritional text extracted from the image:\n{st.session_state.extracted_text}"
-        response = analyze_text_with_groq(question_with_context)
-        st.session_state.ai_response = response  # Store chatbot response
-        st.session_state.translated_response = ""  # Reset translation
-
-    # Display Chatbot Response
-    if st.session_state.ai_response:
-        st.text_area("AI Response", st.session_state.ai_response, height=150)
-
-        # Translation button for chat response
-        if st.button("Translate Chat Response to Hindi"):
-            translated_chat_response = translate_text_to_hindi(st.session_state.ai_response)
-            st.session_state.translated_response = translated_chat_response  # Store translation
-
-    # Display Translated Chat Response
-    if st.session_state.translated_response:
-        st.text_area("AI Chat Response in Hindi", st.session_state.translated_response, height=150)
+        # Display AI response
+        if st.session_state.ai_response:
+            st.text_area("AI Response", st.session_state.ai_response, height=200)
+
+            # Translation button
+            if st.button("Translate to Hindi"):
+                translated_analysis = translate_text_to_hindi(st.session_state.ai_response)
+                st.session_state.translated_response = translated_analysis  # Store translated response
+
+        # Display Translated Response
+        if st.session_state.translated_response:
+            st.text_area("AI Response in Hindi", st.session_state.translated_response, height=200)
+
+    # Chatbot Section
+    st.subheader("💬 Chat with AI")
+    user_question = st.text_input("Ask a question about the extracted information:")
+
+    if st.button("Ask AI"):
+        if user_question:
+            response = ask_question_with_groq(user_question, st.session_state.extracted_text)
+            st.session_state.ai_response = response  # Store chatbot response
+            st.session_state.translated_response = ""  # Reset translation
+
+        # Display Chatbot Response
+        if st.session_state.ai_response:
+            st.text_area("AI Response", st.session_state.ai_response, height=150)
+
+            # Translation button for chat response
+            if st.button("Translate Chat Response to Hindi"):
+                translated_chat_response = translate_text_to_hindi(st.session_state.ai_response)
+                st.session_state.translated_response = translated_chat_response  # Store translation
+
+        # Display Translated Chat Response
+        if st.session_state.translated_response:
+            st.text_area("AI Chat Response in Hindi", st.session_state.translated_response, height=150)
+
+if __name__ == "__main__":
+    bind_session()  # Stage timings for the ?debug=1 sidebar
+    main()
+    debug_sidebar()
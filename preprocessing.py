@@ -0,0 +1,195 @@
+"""OpenCV preprocessing run before every OCR engine.
+
+A 12 MP phone photo of a food label is mostly background, so each image is
+downscaled (DPI-aware), converted to grayscale, optionally binarised with an
+adaptive threshold, deskewed and cropped to the "Nutrition Facts" panel or
+the main text region before it reaches the engine. Every step is timed so
+the benchmark can show where the time goes.
+"""
+import os
+import time
+from dataclasses import asdict, dataclass
+
+import cv2
+import numpy as np
+
+
+@dataclass(frozen=True)
+class PreprocessConfig:
+    enabled: bool = True
+    max_side: int = 2000  # Longest side in pixels after downscaling
+    target_dpi: int = 300  # Scans above this resolution are scaled down to it
+    grayscale: bool = True
+    threshold: bool = False  # Adaptive threshold (helps Tesseract, hurts neural engines)
+    deskew: bool = True
+    crop: bool = True
+
+    def as_dict(self):
+        return asdict(self)
+
+
+DISABLED = PreprocessConfig(enabled=False)
+
+# Per-engine defaults; OCR_PREPROCESS=0 turns preprocessing off everywhere
+ENGINE_DEFAULTS = {
+    "tesseract": PreprocessConfig(threshold=True),
+    "easyocr": PreprocessConfig(),
+    "doctr": PreprocessConfig(grayscale=False),
+    "cascade": PreprocessConfig(grayscale=False),  # Geometry only; Tesseract's tier binarises its own copy
+}
+
+
+def default_config(engine):
+    """Preprocessing config for an engine name (disabled when unknown)."""
+    if os.getenv("OCR_PREPROCESS", "1") == "0":
+        return DISABLED
+    return ENGINE_DEFAULTS.get(engine, DISABLED)
+
+
+def downscale(image, config, dpi=None):
+    """Shrink to target_dpi (for real scan DPIs) and to max_side, never enlarging."""
+    height, width = image.shape[:2]
+    scale = min(1.0, config.max_side / max(height, width))
+    # Phone photos report 72/96 DPI, which says nothing about print size
+    if dpi and dpi >= 150:
+        scale = min(scale, config.target_dpi / dpi)
+    if scale >= 1.0:
+        return image
+    size = (max(1, int(width * scale)), max(1, int(height * scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+def to_grayscale(image):
+    if image.ndim == 2:
+        return image
+    code = cv2.COLOR_RGBA2GRAY if image.shape[2] == 4 else cv2.COLOR_RGB2GRAY
+    return cv2.cvtColor(image, code)
+
+
+def adaptive_threshold(gray):
+    """Binarise unevenly lit labels: dark text on white."""
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 15)
+
+
+def _text_mask(gray):
+    # Otsu on the inverted image: text pixels become 255
+    _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    return mask
+
+
+def estimate_skew(gray, max_angle=15.0, step=0.5, work_side=800, max_points=20000):
+    """Text angle in degrees by projection profile: the rotation whose row
+    histogram of dark pixels is most peaked has horizontal text lines."""
+    scale = min(1.0, work_side / max(gray.shape[:2]))
+    if scale < 1.0:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    mask = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 25, 15)
+    ys, xs = np.nonzero(mask)
+    if len(xs) < 50:
+        return 0.0
+    stride = max(1, len(xs) // max_points)
+    ys, xs = ys[::stride].astype(np.float32), xs[::stride].astype(np.float32)
+
+    # Row of every text pixel under every candidate rotation, all at once
+    angles = np.arange(-max_angle, max_angle + step / 2, step, dtype=np.float32)
+    radians = np.deg2rad(angles)[:, None]
+    rows = np.rint(ys[None, :] * np.cos(radians) + xs[None, :] * np.sin(radians)).astype(np.int64)
+    rows -= rows.min()
+    height = int(rows.max()) + 1
+    offsets = (np.arange(len(angles)) * height)[:, None]
+    profile = np.bincount((rows + offsets).ravel(), minlength=len(angles) * height).reshape(len(angles), height)
+    # Pixel count is the same for every angle, so the sum of squares ranks peakedness
+    score = (profile.astype(np.float64) ** 2).sum(axis=1)
+    return float(angles[int(np.argmax(score))])
+
+
+def deskew(image, gray=None, min_angle=0.5):
+    """Rotate so text lines are horizontal; angles below min_angle are ignored."""
+    angle = estimate_skew(gray if gray is not None else to_grayscale(image))
+    if abs(angle) < min_angle:
+        return image
+    height, width = image.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), -angle, 1.0)
+    border = 255 if image.ndim == 2 else (255,) * image.shape[2]
+    return cv2.warpAffine(image, matrix, (width, height), flags=cv2.INTER_LINEAR,
+                          borderMode=cv2.BORDER_CONSTANT, borderValue=border)
+
+
+def find_text_region(gray, min_panel_ratio=0.15, max_panel_ratio=0.95, pad=0.02):
+    """(x0, y0, x1, y1) of the nutrition/prescription panel, or None to keep the full image.
+
+    A bordered "Nutrition Facts" box is found as the largest four-sided contour;
+    otherwise the bounding box of all text-like blobs is used.
+    """
+    height, width = gray.shape[:2]
+    area = float(height * width)
+
+    edges = cv2.Canny(gray, 50, 150)
+    edges = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    best = None
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        ratio = (w * h) / area
+        if not (min_panel_ratio <= ratio <= max_panel_ratio):
+            continue
+        approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+        if len(approx) == 4 and (best is None or w * h > best[2] * best[3]):
+            best = (x, y, w, h)
+
+    if best is None:
+        mask = _text_mask(gray)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (15, 5)))
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+        if count <= 1:
+            return None
+        stats = stats[1:]  # Drop the background component
+        # Text blobs: not specks, not huge background regions
+        keep = (stats[:, cv2.CC_STAT_AREA] >= area * 1e-4) & (stats[:, cv2.CC_STAT_AREA] <= area * 0.5)
+        if not keep.any():
+            return None
+        stats = stats[keep]
+        x0 = stats[:, cv2.CC_STAT_LEFT].min()
+        y0 = stats[:, cv2.CC_STAT_TOP].min()
+        x1 = (stats[:, cv2.CC_STAT_LEFT] + stats[:, cv2.CC_STAT_WIDTH]).max()
+        y1 = (stats[:, cv2.CC_STAT_TOP] + stats[:, cv2.CC_STAT_HEIGHT]).max()
+        best = (x0, y0, x1 - x0, y1 - y0)
+
+    x, y, w, h = best
+    if (w * h) / area > max_panel_ratio:
+        return None  # Cropping would save almost nothing
+    pad_x, pad_y = int(width * pad), int(height * pad)
+    return (max(0, x - pad_x), max(0, y - pad_y), min(width, x + w + pad_x), min(height, y + h + pad_y))
+
+
+def preprocess(image, config, dpi=None):
+    """Run the configured steps on an RGB/grayscale array; returns (array, step timings)."""
+    timings = {}
+    if not config.enabled:
+        return image, timings
+
+    def timed(step, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        timings[step] = time.perf_counter() - start
+        return result
+
+    image = timed("downscale", downscale, image, config, dpi)
+    gray = timed("grayscale", to_grayscale, image)
+    if config.grayscale:
+        image = gray
+    if config.deskew:
+        rotated = timed("deskew", deskew, image, gray)
+        if rotated is not image:
+            image = rotated
+            gray = to_grayscale(image)
+    if config.crop:
+        region = timed("crop", find_text_region, gray)
+        if region is not None:
+            x0, y0, x1, y1 = region
+            image = image[y0:y1, x0:x1]
+            gray = gray[y0:y1, x0:x1]
+    if config.threshold:
+        image = timed("threshold", adaptive_threshold, gray)
+    return np.ascontiguousarray(image), timings
+
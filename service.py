@@ -0,0 +1,396 @@
+"""Headless HTTP service for the mobile backend.
+
+A plain ASGI application, run with any ASGI server:
+
+    uvicorn service:app --host 0.0.0.0 --port 8000
+
+Endpoints (JSON in and out; images as base64 in an "image" field, or as the raw
+body for /ocr):
+
+    GET  /health                 pool and queue statistics
+    GET  /metrics                Prometheus text format (metrics.py)
+    POST /ocr?engine=tesseract   raw image body -> text
+    POST /label/analyze          {"text" | "image", "current_health", "use_llm"}
+    POST /prescription/analyze   {"text" | "image", "use_llm"}
+    POST /translate              {"text", "backend": "groq" | "local"}
+    POST /diet-plan              {"age", "weight", "height", "gender", "activity_level", "conditions", "top_n"}
+
+OCR runs in a bounded process pool (SERVICE_OCR_WORKERS, models loaded once
+per worker), model calls go through AsyncLLM on the event loop, and the rest
+reuses the same functions as the Streamlit apps. Each pool admits at most
+SERVICE_MAX_QUEUE waiting requests; beyond that the service answers 503 with
+Retry-After instead of letting latency grow without bound. load_test.py
+measures requests/s and latency percentiles against a running instance.
+"""
+import asyncio
+import base64
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import metrics
+from batch_ocr import available_cpus
+
+OCR_WORKERS = int(os.getenv("SERVICE_OCR_WORKERS", str(available_cpus())))
+OCR_EXECUTOR = os.getenv("SERVICE_OCR_EXECUTOR", "process")  # "process" or "thread"
+OCR_ENGINES = [e for e in os.getenv("SERVICE_OCR_ENGINES", "tesseract").split(",") if e]  # Loaded per worker
+MAX_QUEUE = int(os.getenv("SERVICE_MAX_QUEUE", "64"))
+MAX_BODY_BYTES = int(float(os.getenv("SERVICE_MAX_BODY_MB", "10")) * 1024 * 1024)
+MAX_TOP_N = int(os.getenv("SERVICE_MAX_TOP_N", "100"))  # Largest /diet-plan recommendation list
+GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
+TRANSLATION_BACKEND = os.getenv("TRANSLATION_BACKEND", "groq")  # Default for /translate; "local" needs no key
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message, headers=()):
+        super().__init__(message)
+        self.status = status
+        self.headers = list(headers)
+
+
+class Overloaded(HTTPError):
+    def __init__(self, pool):
+        super().__init__(503, f"{pool} queue is full, retry shortly", headers=[(b"retry-after", b"1")])
+
+
+class BoundedPool:
+    """Runs calls in an executor, refusing new ones once max_pending are queued or running."""
+
+    def __init__(self, name, executor, max_pending):
+        self.name = name
+        self.executor = executor
+        self.max_pending = max_pending
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def admit(self):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise Overloaded(self.name)
+        self.pending += 1
+
+    def release(self):
+        self.pending -= 1
+        self.completed += 1
+
+    async def run(self, fn, *args):
+        self.admit()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.release()
+
+    def stats(self):
+        return {"pending": self.pending, "max_pending": self.max_pending, "completed": self.completed,
+                "rejected": self.rejected}
+
+
+# OCR worker side (runs in the pool processes)
+
+def _init_ocr_worker(engines):
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")  # One image per worker; no nested OpenMP threads
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from ocr_engines import get_engine
+
+    for engine in engines:
+        try:
+            get_engine(engine).load()
+        except Exception:
+            pass  # Reported on first use instead
+
+
+def _ocr_bytes(data, engine):
+    from ocr_engines import extract_text
+
+    start = time.perf_counter()
+    # Cached by the body's bytes; decoded within the pixel cap only on a miss (the body cap is MAX_BODY_BYTES)
+    text = extract_text(data, engine)
+    if text.startswith(("Error", "⚠ Error")):
+        return {"engine": engine, "error": text}
+    return {"engine": engine, "text": text, "seconds": round(time.perf_counter() - start, 4)}
+
+
+def _diet_plan(payload):
+    from diet_engine import bmi, bmr, daily_calories, get_food_matrix
+
+    try:
+        age, weight, height = float(payload["age"]), float(payload["weight"]), float(payload["height"])
+    except (KeyError, TypeError, ValueError):
+        raise HTTPError(400, "age, weight and height are required numbers")
+    try:
+        top_n = int(payload.get("top_n", 10))
+    except (TypeError, ValueError):
+        raise HTTPError(400, "top_n must be an integer")
+    if not 1 <= top_n <= MAX_TOP_N:
+        raise HTTPError(400, f"top_n must be between 1 and {MAX_TOP_N}")
+    gender = payload.get("gender", "Other")
+    activity_level = payload.get("activity_level", "Sedentary")
+    conditions = payload.get("conditions") or []
+    calories = daily_calories(gender, age, weight, height, activity_level)
+    foods = get_food_matrix(_food_index()).recommend(conditions, calories, top_n)
+    return {
+        "bmi": float(bmi(weight, height)),
+        "bmr": round(bmr(gender, age, weight, height), 1),
+        "daily_calories": round(calories),
+        "recommendations": [
+            {"fdc_id": f.fdc_id, "description": f.description, "portion_grams": f.portion_grams,
+             "score": f.score, "nutrients": f.nutrients}
+            for f in foods
+        ],
+    }
+
+
+_index = None
+
+
+def _food_index():
+    global _index
+    if _index is None:
+        from food_index import FoodIndex
+
+        _index = FoodIndex()
+    return _index
+
+
+class Service:
+    def __init__(self):
+        self.ocr = None
+        self.cpu = None
+        self.llm_pool = None
+        self._llm = None
+        self.started = time.time()
+        self.requests = 0
+
+    def start(self):
+        if OCR_EXECUTOR == "process":
+            executor = ProcessPoolExecutor(max_workers=OCR_WORKERS, initializer=_init_ocr_worker,
+                                           initargs=(OCR_ENGINES,))
+        else:
+            executor = ThreadPoolExecutor(max_workers=OCR_WORKERS, initializer=_init_ocr_worker,
+                                          initargs=(OCR_ENGINES,))
+        self.ocr = BoundedPool("ocr", executor, OCR_WORKERS + MAX_QUEUE)
+        # Parsing, matching and diet plans are light but not free; keep them off the event loop
+        self.cpu = BoundedPool("cpu", ThreadPoolExecutor(max_workers=4), 4 + MAX_QUEUE)
+        self.llm_pool = BoundedPool("llm", None, MAX_QUEUE)
+        pools = (self.ocr, self.cpu, self.llm_pool)
+        metrics.registry.gauge("service_pending", "Calls queued or running per pool.",
+                               lambda: {pool.name: pool.pending for pool in pools}, label="pool")
+        metrics.registry.gauge("service_rejected", "Calls refused with 503 per pool since start.",
+                               lambda: {pool.name: pool.rejected for pool in pools}, label="pool")
+
+    async def stop(self):
+        if self._llm is not None:
+            await self._llm.__aexit__(None, None, None)
+        for pool in (self.ocr, self.cpu):
+            if pool is not None:
+                pool.executor.shutdown(wait=False, cancel_futures=True)
+
+    def llm(self):
+        if not GROQ_API_KEY:
+            raise HTTPError(503, "Groq API key is not set")
+        if self._llm is None:
+            from async_llm import AsyncLLM
+
+            self._llm = AsyncLLM(GROQ_API_KEY)
+        return self._llm
+
+    async def ask(self, messages, kind):
+        """Model reply through AsyncLLM; for translations, messages is the text to translate."""
+        llm = self.llm()
+        self.llm_pool.admit()
+        try:
+            if kind == "translation":
+                result = await llm.translate(messages)
+            else:
+                result = await llm.chat(messages, kind=kind)
+        finally:
+            self.llm_pool.release()
+        if result.error:
+            raise HTTPError(502, f"Model error: {result.error}")
+        return {"text": result.text, "cached": result.cached, "seconds": round(result.total or 0.0, 3)}
+
+    async def text_from(self, payload, engine):
+        """"text" from the payload, or OCR of its base64 "image"."""
+        if payload.get("text"):
+            return payload["text"], None
+        if not payload.get("image"):
+            raise HTTPError(400, 'Send "text" or a base64 "image"')
+        try:
+            data = base64.b64decode(payload["image"], validate=True)
+        except ValueError:
+            raise HTTPError(400, '"image" is not valid base64')
+        result = await self.ocr.run(_ocr_bytes, data, engine)
+        if "error" in result:
+            raise HTTPError(422, result["error"])
+        return result["text"], result
+
+    # Handlers
+
+    async def health(self, request):
+        return {
+            "status": "ok",
+            "uptime_seconds": round(time.time() - self.started),
+            "requests": self.requests,
+            "ocr_workers": OCR_WORKERS,
+            "pools": {pool.name: pool.stats() for pool in (self.ocr, self.cpu, self.llm_pool)},
+        }
+
+    async def metrics(self, request):
+        return metrics.render()
+
+    async def ocr_image(self, request):
+        engine = request["query"].get("engine", OCR_ENGINES[0] if OCR_ENGINES else "tesseract")
+        if not request["body"]:
+            raise HTTPError(400, "Send the image as the request body")
+        result = await self.ocr.run(_ocr_bytes, request["body"], engine)
+        if "error" in result:
+            raise HTTPError(422, result["error"])
+        return result
+
+    async def analyze_label(self, request):
+        from label_parser import check_conditions, label_context, parse_label
+
+        payload = request["json"]
+        text, ocr = await self.text_from(payload, payload.get("engine", "tesseract"))
+        current_health = payload.get("current_health")
+        label = await self.cpu.run(parse_label, text)
+        flags, unchecked = check_conditions(label, current_health) if current_health else ([], [])
+        response = {
+            "text": text,
+            "label": label.summary(),
+            "flags": [flag.message for flag in flags],
+            "unchecked_conditions": unchecked,
+        }
+        if payload.get("use_llm"):
+            prompt = (
+                f"Now analyze the following label:\n{label_context(text, current_health)}\n\n"
+                f"The user's current health: {current_health or 'not given'}. Give recommendations."
+            )
+            response["analysis"] = await self.ask([{"role": "user", "content": prompt}], "analysis")
+        return response
+
+    async def analyze_prescription(self, request):
+        from medications import extract_medications, medications_prompt
+
+        payload = request["json"]
+        text, ocr = await self.text_from(payload, payload.get("engine", "doctr"))
+        medications = await self.cpu.run(extract_medications, text)
+        response = {"text": text, "medications": [m.as_dict() for m in medications]}
+        if payload.get("use_llm"):
+            content = medications_prompt(medications) if medications else text
+            response["analysis"] = await self.ask([{"role": "user", "content": content}], "analysis")
+        return response
+
+    async def translate(self, request):
+        text = request["json"].get("text")
+        if not text:
+            raise HTTPError(400, 'Send "text" to translate')
+        if request["json"].get("backend", TRANSLATION_BACKEND) == "local":
+            from translation import get_translator
+
+            result = await self.cpu.run(get_translator("local").translate, text)
+            if result.error:
+                raise HTTPError(502, f"Translation error: {result.error}")
+            return {"translation": result.text, "cached": result.cached, "seconds": round(result.total, 3)}
+        result = await self.ask(text, "translation")
+        return {"translation": result["text"], "cached": result["cached"], "seconds": result["seconds"]}
+
+    async def diet_plan(self, request):
+        return await self.cpu.run(_diet_plan, request["json"])
+
+
+service = Service()
+
+ROUTES = {
+    ("GET", "/health"): service.health,
+    ("GET", "/metrics"): service.metrics,
+    ("POST", "/ocr"): service.ocr_image,
+    ("POST", "/label/analyze"): service.analyze_label,
+    ("POST", "/prescription/analyze"): service.analyze_prescription,
+    ("POST", "/translate"): service.translate,
+    ("POST", "/diet-plan"): service.diet_plan,
+}
+
+
+async def _read_body(receive):
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise HTTPError(413, f"Request body is larger than {MAX_BODY_BYTES} bytes")
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def _send_json(send, status, payload, headers=()):
+    if isinstance(payload, str):  # /metrics
+        body, content_type = payload.encode(), b"text/plain; version=0.0.4; charset=utf-8"
+    else:
+        body, content_type = json.dumps(payload, ensure_ascii=False).encode(), b"application/json"
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode()), *headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            service.start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await service.stop()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+    if service.ocr is None:  # Server without lifespan support
+        service.start()
+    service.requests += 1
+    path = scope["path"].rstrip("/") or "/"  # "/ocr/" is "/ocr" for routing and for the body type
+    handler = ROUTES.get((scope["method"], path))
+    try:
+        if handler is None:
+            raise HTTPError(404, f"No route for {scope['method']} {scope['path']}")
+        body = await _read_body(receive)
+        request = {
+            "query": {k: v[-1] for k, v in parse_qs(scope.get("query_string", b"").decode()).items()},
+            "body": body,
+            "json": {},
+        }
+        if scope["method"] == "POST" and path != "/ocr":
+            try:
+                request["json"] = json.loads(body or b"{}")
+            except ValueError:
+                raise HTTPError(400, "Body is not valid JSON")
+            if not isinstance(request["json"], dict):
+                raise HTTPError(400, "Body must be a JSON object")
+        with metrics.stage(f"service.{path.strip('/')}"):
+            response = await handler(request)
+        await _send_json(send, 200, response)
+    except HTTPError as e:
+        await _send_json(send, e.status, {"error": str(e)}, e.headers)
+    except Exception as e:
+        await _send_json(send, 500, {"error": f"Internal error: {str(e)}"})
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run("service:app", host=os.getenv("SERVICE_HOST", "127.0.0.1"), port=int(os.getenv("SERVICE_PORT", "8000")))
@@ -1,26 +1,19 @@
 import streamlit as st
-import pytesseract
-import easyocr
-from PIL import Image
-import numpy as np
-from transformers import pipeline
-import requests
-
-# Set page config
-st.set_page_config(
-    page_title="Health Analysis App",
-    page_icon="🏥",
-    layout="wide"
-)
-
-# Cache resources for better performance
-@st.cache_resource
-def load_easyocr():
-    return easyocr.Reader(['en'])
+import os
+import sys
 
-@st.cache_resource
-def load_nlp_pipeline():
-    return pipeline("summarization", model="facebook/bart-large-cnn")
+# Make the shared helpers in the repository root importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from diet_engine import bmi, daily_calories as calculate_daily_calories, food_query as diet_food_query, get_food_matrix
+from food_index import FoodIndex
+from image_ingest import ImageTooLarge, preview
+from metrics import bind_session, debug_sidebar, stage
+from model_loader import warm_up
+from ocr_engines import extract_text as run_ocr
+from summarizer import get_text_summarizer
+
+# get_text_summarizer() is shared per process; transformers is imported and BART loaded only when a
+# prescription is summarized (long text is chunked and summarized in batches; SUMMARIZER_QUANTIZE=1 uses int8 weights)
 
 # Sidebar navigation
 def sidebar():
@@ -30,53 +23,61 @@ def sidebar():
         ["Food Label Analysis", "Prescription Analysis", "Diet Planning"]
     )
 
-# Extract text using EasyOCR
+# Extract text using EasyOCR (reader shared through the engine registry, cached across reruns);
+# FX_OCR_ENGINE=cascade tries Tesseract first and only uses EasyOCR where it is unsure
+OCR_ENGINE = os.getenv("FX_OCR_ENGINE", "easyocr")
+
 def extract_text(image):
-    reader = load_easyocr()
-    results = reader.readtext(np.array(image))
-    return "\n".join([result[1] for result in results])
+    return run_ocr(image, OCR_ENGINE)
+
+# Only a small preview is decoded here (within the upload caps); extract_text decodes the upload
+# at OCR size when the cache has no text for its bytes yet
+def load_preview(uploaded_file):
+    try:
+        return preview(uploaded_file)
+    except ImageTooLarge as e:
+        st.error(f"⚠ {e}")
+        return None
 
 # Food Label Analysis
 def food_label_analysis():
     st.header("Food Label Analysis 🏷️")
     uploaded_file = st.file_uploader("Upload an image...", type=["jpg", "jpeg", "png"])
-    if uploaded_file:
-        image = Image.open(uploaded_file)
-        st.image(image, caption="Uploaded Food Label", use_column_width=True)
+    preview_image = load_preview(uploaded_file) if uploaded_file else None
+    if preview_image is not None:
+        st.image(preview_image, caption="Uploaded Food Label", use_column_width=True)
         with st.spinner("Extracting text..."):
-            text = extract_text(image)
+            text = extract_text(uploaded_file)
             st.text_area("Extracted Text:", text, height=200)
 
 # Prescription Analysis
 def prescription_analysis():
     st.header("Prescription Analysis 📝")
     uploaded_file = st.file_uploader("Upload an image...", type=["jpg", "jpeg", "png"])
-    if uploaded_file:
-        image = Image.open(uploaded_file)
-        st.image(image, caption="Uploaded Prescription", use_column_width=True)
+    preview_image = load_preview(uploaded_file) if uploaded_file else None
+    if preview_image is not None:
+        st.image(preview_image, caption="Uploaded Prescription", use_column_width=True)
         with st.spinner("Analyzing prescription..."):
-            text = extract_text(image)
-            summarizer = load_nlp_pipeline()
-            summary = summarizer(text, max_length=130, min_length=30)[0]['summary_text'] if len(text) > 100 else text
+            text = extract_text(uploaded_file)
+            summarizer = get_text_summarizer()
+            with stage("summarize"):
+                summary = summarizer.summarize(text, max_length=130, min_length=30)
             st.subheader("Simplified Interpretation")
             st.write(summary)
             st.text_area("Extracted Text:", text, height=200)
 
 # Calculate BMI
 def calculate_bmi(weight, height):
-    return round(weight / ((height / 100) ** 2), 2)
+    return float(bmi(weight, height))
+
+# Local FoodData Central index (see food_index.py), opened once per process
+@st.cache_resource
+def load_food_index():
+    return FoodIndex()
 
-# Fetch food nutrition data using the API key
+# Look up food nutrition data; the USDA API is only asked when the local index has no match
 def get_food_nutrition(food_query):
-    api_key = "ha6WbCNn0HkQonQpJHHh6CWRLRLSpdUgXg84trte"
-    url = f"https://api.nal.usda.gov/fdc/v1/foods/search?query={food_query}&api_key={api_key}"
-    response = requests.get(url)
-    if response.status_code == 200:
-        foods = response.json().get("foods", [])
-        if foods:
-            # Return the first result instead of a random one
-            return foods[0]
-    return None
+    return load_food_index().lookup(food_query)
 
 # Diet Planning
 def diet_planning():
@@ -96,71 +97,33 @@ def diet_planning():
         health_condition = st.multiselect("Health Conditions", diseases)
     if st.button("Generate Diet Plan"):
         with st.spinner("Generating your personalized diet plan..."):
-            # Calculate Basal Metabolic Rate (BMR) based on gender, age, weight, and height
-            if gender == "Male":
-                bmr = 88.362 + (13.397 * weight) + (4.799 * height) - (5.677 * age)
-            elif gender == "Female":
-                bmr = 447.593 + (9.247 * weight) + (3.098 * height) - (4.330 * age)
-            else:
-                bmr = 500 + (10 * weight) + (6.25 * height) - (5 * age)  # Default calculation for "Other"
-
-            # Adjust BMR based on activity level
-            activity_multipliers = {
-                "Sedentary": 1.2,
-                "Light": 1.375,
-                "Moderate": 1.55,
-                "Active": 1.725,
-                "Very Active": 1.9
-            }
-            daily_calories = bmr * activity_multipliers.get(activity_level, 1.2)
-
-            # Determine the food query based on health conditions
-            if "Diabetes" in health_condition:
-                food_query = "low glycemic index foods"
-            elif "Hypertension" in health_condition:
-                food_query = "potassium-rich foods"
-            elif "Obesity" in health_condition:
-                food_query = "low calorie high protein foods"
-            elif "Heart Disease" in health_condition:
-                food_query = "heart-healthy foods"
-            elif "Asthma" in health_condition:
-                food_query = "anti-inflammatory foods"
-            elif "Anemia" in health_condition:
-                food_query = "iron-rich foods"
-            elif "Cancer" in health_condition:
-                food_query = "antioxidant-rich foods"
-            elif "Chronic Kidney Disease" in health_condition:
-                food_query = "low sodium low potassium foods"
-            elif "Stroke" in health_condition:
-                food_query = "low sodium high fiber foods"
-            elif "COVID-19" in health_condition or "Influenza" in health_condition:
-                food_query = "immune-boosting foods"
-            elif "Tuberculosis" in health_condition:
-                food_query = "high calorie high protein foods"
-            elif "Dengue" in health_condition:
-                food_query = "hydration-rich foods"
-            elif "HIV/AIDS" in health_condition:
-                food_query = "high calorie high protein foods"
-            elif "Malaria" in health_condition:
-                food_query = "hydration-rich foods"
-            elif "Hepatitis" in health_condition:
-                food_query = "liver-friendly foods"
-            elif "Pneumonia" in health_condition:
-                food_query = "immune-boosting foods"
-            elif "Arthritis" in health_condition:
-                food_query = "anti-inflammatory foods"
-            elif "Liver Disease" in health_condition:
-                food_query = "liver-friendly foods"
-            elif "Epilepsy" in health_condition:
-                food_query = "ketogenic diet foods"
-            elif "Depression" in health_condition:
-                food_query = "mood-boosting foods"
-            elif "Thyroid Disorder" in health_condition:
-                food_query = "iodine-rich foods"
-            else:
-                food_query = "balanced diet"
+            # Daily calories from BMR (gender, age, weight, height) and activity level
+            daily_calories = calculate_daily_calories(gender, age, weight, height, activity_level)
 
-            # Fetch food nutrition data using the API key
+            # Rank foods against all selected conditions at once
+            recommendations = get_food_matrix(load_food_index()).recommend(health_condition, daily_calories, top_n=10)
+            if recommendations:
+                best = recommendations[0]
+                st.write(f"**Food Recommendation:** {best.description}")
+                st.markdown("**Nutritional Breakdown (per 100 g):**")
+                st.write(f"- **Calories:** {best.nutrients.get('energy', 'N/A')} kcal")
+                st.write(f"- **Protein:** {best.nutrients.get('protein', 'N/A')} g")
+                st.write(f"- **Carbohydrates:** {best.nutrients.get('carbohydrate', 'N/A')} g")
+                st.write(f"- **Fat:** {best.nutrients.get('fat', 'N/A')} g")
+                st.markdown("**More Suggestions:**")
+                st.table([
+                    {"Food": r.description, "Portion (g)": r.portion_grams,
+                     "kcal/100 g": r.nutrients.get("energy"), "Score": r.score}
+                    for r in recommendations
+                ])
+                st.subheader("Daily Calorie Intake Recommendation")
+                st.write(f"Based on your age, weight, height, gender, and activity level, your estimated daily calorie intake is **{daily_calories:.0f} kcal**.")
+                return
+
+            # No local match: single query for the first condition, answered from the index or the API
+            food_query = diet_food_query(health_condition)
+
+            # Fetch food nutrition data from the local index
             nutrition_data = get_food_nutrition(food_query)
             if nutrition_data:
                 st.write(f"**Food Recommendation:** {nutrition_data.get('description', 'N/A')}")
@@ -179,6 +142,12 @@ def diet_planning():
 
 # Main app
 def main():
+    # Set page config
+    st.set_page_config(
+        page_title="Health Analysis App",
+        page_icon="🏥",
+        layout="wide"
+    )
     st.markdown("""
         <style>
         .main .block-container {
@@ -187,6 +156,7 @@ def main():
         }
         </style>
     """, unsafe_allow_html=True)
+    warm_up()  # No-op unless WARM_UP_MODELS is set
     page = sidebar()
     if page == "Food Label Analysis":
         food_label_analysis()
@@ -196,4 +166,6 @@ def main():
         diet_planning()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    bind_session()  # Stage timings for the ?debug=1 sidebar
+    main()
+    debug_sidebar()
\ No newline at end of file
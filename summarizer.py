@@ -0,0 +1,264 @@
+"""Chunked, batched and optionally quantized BART summarization.
+
+The prescription page used to hand the whole OCR text to a summarization
+pipeline in one call: anything past BART's 1024-token window was silently
+dropped, and full-precision BART on CPU took seconds per page. Summarizer
+splits long text into sentence-aligned chunks of at most SUMMARY_CHUNK_TOKENS
+tokens, summarizes them SUMMARY_BATCH_SIZE at a time in one generate() call,
+and summarizes the joined partial summaries again while they are still longer
+than the requested summary. Summaries are cached by content hash in the
+response cache (llm_cache.py).
+
+CPU inference can be tuned with SUMMARIZER_QUANTIZE=1 (dynamic int8
+quantization of the Linear layers, roughly half the memory) and
+SUMMARIZER_THREADS. Compare the two with
+
+    python summarizer.py --benchmark [--text-file prescription.txt]
+
+which loads each variant in a fresh interpreter and reports input tokens per
+second and peak memory.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from functools import lru_cache
+
+from llm_cache import llm_cache
+from metrics import peak_rss, stage
+from model_loader import SUMMARIZER_MODEL, set_torch_threads, timed
+
+QUANTIZE = os.getenv("SUMMARIZER_QUANTIZE", "0") == "1"
+THREADS = int(os.getenv("SUMMARIZER_THREADS", "0"))  # 0: torch default
+CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "0"))  # 0: the model's input window minus a margin
+BATCH_SIZE = int(os.getenv("SUMMARY_BATCH_SIZE", "4"))
+MAX_SUMMARY_TOKENS = 130
+MIN_SUMMARY_TOKENS = 30
+MIN_CHARS = 100  # Shorter text is returned as it is
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?;])\s+|\n+")
+
+
+class Summarizer:
+    def __init__(self, model=SUMMARIZER_MODEL, quantize=QUANTIZE, threads=THREADS, chunk_tokens=CHUNK_TOKENS,
+                 batch_size=BATCH_SIZE):
+        self.model_name = model
+        self.quantize = quantize
+        self.threads = threads
+        self.chunk_tokens = chunk_tokens
+        self.batch_size = batch_size
+        self.input_tokens = 0  # Totals across generate() calls, for the benchmark
+        self.output_tokens = 0
+        self._loaded = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """(tokenizer, model), built on first use."""
+        with self._lock:
+            if self._loaded is None:
+                with timed("import", "transformers"):
+                    import torch
+                    from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+                if self.threads:
+                    set_torch_threads(self.threads)
+                variant = f"summarizer:{self.model_name}" + (":int8" if self.quantize else "")
+                with timed("model", variant):
+                    tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                    model = AutoModelForSeq2SeqLM.from_pretrained(self.model_name).eval()
+                    if self.quantize:
+                        quantization = getattr(torch, "ao", torch).quantization
+                        model = quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+                if not self.chunk_tokens:
+                    window = min(tokenizer.model_max_length, 1024)  # Some tokenizers report a huge sentinel
+                    self.chunk_tokens = window - 24  # Room for special tokens and sentence overshoot
+                self._loaded = (tokenizer, model)
+            return self._loaded
+
+    def count_tokens(self, text):
+        tokenizer, _ = self.load()
+        return len(tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    def chunk(self, text):
+        """Sentence-aligned pieces of at most chunk_tokens tokens; overlong sentences are cut."""
+        tokenizer, _ = self.load()
+        sentences = [s.strip() for s in _SENTENCE_RE.split(text) if s.strip()]
+        if not sentences:
+            return []
+        counts = [len(ids) for ids in tokenizer(sentences, add_special_tokens=False)["input_ids"]]
+        chunks, current, size = [], [], 0
+        for sentence, count in zip(sentences, counts):
+            if current and size + count > self.chunk_tokens:
+                chunks.append(" ".join(current))
+                current, size = [], 0
+            if count > self.chunk_tokens:
+                ids = tokenizer(sentence, add_special_tokens=False)["input_ids"]
+                chunks += [tokenizer.decode(ids[i:i + self.chunk_tokens])
+                           for i in range(0, len(ids), self.chunk_tokens)]
+                continue
+            current.append(sentence)
+            size += count
+        if current:
+            chunks.append(" ".join(current))
+        return chunks
+
+    def generate(self, texts, max_length=MAX_SUMMARY_TOKENS, min_length=MIN_SUMMARY_TOKENS):
+        """One summary per text, batch_size texts per generate() call."""
+        if not texts:
+            return []  # Nothing to summarize: the model is not loaded
+        import torch
+
+        tokenizer, model = self.load()
+        summaries = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            inputs = tokenizer(batch, truncation=True, max_length=self.chunk_tokens + 24, padding=True,
+                               return_tensors="pt")
+            shortest = int(inputs["attention_mask"].sum(dim=1).min())
+            with stage("summarize.generate"), torch.inference_mode():
+                output = model.generate(**inputs, max_length=max_length,
+                                        min_length=min(min_length, shortest // 2))  # Short chunks stay short
+            self.input_tokens += int(inputs["attention_mask"].sum())
+            self.output_tokens += int((output != tokenizer.pad_token_id).sum())
+            summaries += [summary.strip() for summary in tokenizer.batch_decode(output, skip_special_tokens=True)]
+        return summaries
+
+    def summarize(self, text, max_length=MAX_SUMMARY_TOKENS, min_length=MIN_SUMMARY_TOKENS, use_cache=True):
+        """Summary of text of any length; text under MIN_CHARS characters is returned unchanged."""
+        return self.summarize_many([text], max_length, min_length, use_cache)[0]
+
+    def summarize_many(self, texts, max_length=MAX_SUMMARY_TOKENS, min_length=MIN_SUMMARY_TOKENS, use_cache=True):
+        """Summaries of several texts; the chunks of all of them share generate() batches."""
+        results, pending = [None] * len(texts), {}
+        for i, text in enumerate(texts):
+            text = (text or "").strip()
+            key = None
+            if len(text) <= MIN_CHARS:
+                results[i] = text
+                continue
+            if use_cache:
+                settings = f"{self.model_name}|{self.quantize}|{max_length}|{min_length}"
+                key = "summary:" + hashlib.sha256(f"{settings}|{text}".encode()).hexdigest()
+                results[i] = llm_cache.get(key)
+            if results[i] is None:
+                pending[i] = (self.chunk(text), key)
+        if not pending:
+            return results
+        partials = iter(self.generate([c for chunks, _ in pending.values() for c in chunks], max_length, min_length))
+        for i, (chunks, key) in pending.items():
+            summaries = [next(partials) for _ in chunks]
+            # Merge: summarize the joined partial summaries until they fit the requested length
+            while len(summaries) > 1:
+                joined = " ".join(summaries)
+                if self.count_tokens(joined) <= max_length:
+                    summaries = [joined]
+                    break
+                summaries = self.generate(self.chunk(joined), max_length, min_length)
+            results[i] = summaries[0] if summaries else ""
+            if key is not None and results[i]:
+                llm_cache.put(key, results[i])
+        return results
+
+
+@lru_cache(maxsize=None)
+def get_text_summarizer(model=SUMMARIZER_MODEL, quantize=QUANTIZE):
+    """Shared Summarizer per model and quantization setting (the model server's, when it serves "summarizer")."""
+    from model_client import RemoteSummarizer, served
+
+    if served("summarizer"):
+        return RemoteSummarizer()
+    return Summarizer(model, quantize=quantize)
+
+
+# Benchmark
+
+SAMPLE_TEXT = (
+    "Patient presents with type 2 diabetes mellitus and stage 1 hypertension. "
+    "Tab Metformin 500 mg twice daily after meals for 3 months. "
+    "Tab Telmisartan 40 mg once daily in the morning. "
+    "Tab Atorvastatin 10 mg at bedtime. "
+    "Advised low salt, low sugar diet with 30 minutes of brisk walking daily. "
+    "Review fasting and post-prandial blood sugar, HbA1c and lipid profile after 12 weeks. "
+    "Report dizziness, swelling of feet or muscle pain immediately. "
+)
+
+
+def _benchmark_run(variant, text, repeats):
+    # Runs inside a fresh interpreter so each variant's peak RSS is its own
+    summarizer = Summarizer(quantize=variant == "int8")
+    start = time.perf_counter()
+    summarizer.load()
+    load_seconds = time.perf_counter() - start
+    summarizer.summarize(text, use_cache=False)  # Warm-up
+    summarizer.input_tokens = summarizer.output_tokens = 0
+    start = time.perf_counter()
+    for _ in range(repeats):
+        summary = summarizer.summarize(text, use_cache=False)
+    seconds = time.perf_counter() - start
+    return {
+        "variant": variant,
+        "load_seconds": round(load_seconds, 2),
+        "chunks": len(summarizer.chunk(text)),
+        "input_tokens": summarizer.input_tokens // repeats,
+        "seconds": round(seconds / repeats, 3),
+        "tokens_per_second": round(summarizer.input_tokens / seconds, 1),
+        "output_tokens_per_second": round(summarizer.output_tokens / seconds, 1),
+        "peak_rss_mb": round(peak_rss() / 2 ** 20),
+        "summary": summary,
+    }
+
+
+def benchmark(text, repeats=3, variants=("fp32", "int8")):
+    """One result dict per variant, each measured in a fresh interpreter."""
+    rows = []
+    for variant in variants:
+        command = [sys.executable, os.path.abspath(__file__), "--benchmark-run", variant,
+                   "--repeats", str(repeats)]
+        output = subprocess.run(command, input=text, capture_output=True, text=True)
+        try:
+            rows.append(json.loads(output.stdout.strip().splitlines()[-1]))
+        except (ValueError, IndexError):
+            rows.append({"variant": variant, "error": (output.stderr.strip().splitlines() or ["no output"])[-1]})
+    return rows
+
+
+def format_benchmark(rows):
+    lines = [f"{'variant':<8} {'load s':>7} {'chunks':>6} {'tokens':>7} {'s/text':>7} {'tok/s':>8} {'peak MB':>8}"]
+    for row in rows:
+        if "error" in row:
+            lines.append(f"{row['variant']:<8} failed: {row['error']}")
+            continue
+        lines.append(f"{row['variant']:<8} {row['load_seconds']:>7} {row['chunks']:>6} {row['input_tokens']:>7} "
+                     f"{row['seconds']:>7} {row['tokens_per_second']:>8} {row['peak_rss_mb']:>8}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize text, or benchmark fp32 against int8 BART.")
+    parser.add_argument("--text-file", help="Text to summarize (default: a long sample prescription)")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--benchmark-run", choices=["fp32", "int8"], help=argparse.SUPPRESS)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--quantize", action="store_true", help="Use int8 weights when summarizing")
+    args = parser.parse_args()
+
+    if args.benchmark_run:
+        print(json.dumps(_benchmark_run(args.benchmark_run, sys.stdin.read(), args.repeats)))
+        return
+    if args.text_file:
+        with open(args.text_file, encoding="utf-8") as f:
+            text = f.read()
+    else:
+        text = SAMPLE_TEXT * 12  # Well past BART's 1024-token window
+    if args.benchmark:
+        print(format_benchmark(benchmark(text, args.repeats)))
+    else:
+        print(Summarizer(quantize=args.quantize or QUANTIZE).summarize(text))
+
+
+if __name__ == "__main__":
+    main()
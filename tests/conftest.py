@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root, as for the Streamlit apps
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_CACHE_DB", "")  # Tests never write the response cache database
+
+# FoodData Central nutrient ids: energy, protein, fiber, sugar, sodium, potassium
+ENERGY, PROTEIN, FIBER, SUGAR, SODIUM, POTASSIUM = 1008, 1003, 1079, 2000, 1093, 1092
+FOODS = [
+    (1, "Apple, raw", {ENERGY: 52, SUGAR: 10.4, FIBER: 2.4, SODIUM: 1, POTASSIUM: 107}),
+    (2, "Apple juice, canned, sweetened", {ENERGY: 46, SUGAR: 20, SODIUM: 4, POTASSIUM: 101}),
+    (3, "Oatmeal, cooked", {ENERGY: 71, PROTEIN: 2.5, FIBER: 1.7, SUGAR: 0.3, SODIUM: 4}),
+    (4, "Crackers, salted", {ENERGY: 421, PROTEIN: 9, FIBER: 3, SUGAR: 2, SODIUM: 900}),
+    (5, "Lentils, boiled", {ENERGY: 116, PROTEIN: 9, FIBER: 7.9, SUGAR: 1.8, SODIUM: 2, POTASSIUM: 369}),
+    (6, "Spinach, raw", {ENERGY: 23, PROTEIN: 2.9, FIBER: 2.2, SUGAR: 0.4, SODIUM: 79, POTASSIUM: 558}),
+    (7, "Butter, salted", {ENERGY: 717, PROTEIN: 0.9}),
+]
+
+
+def api_food(fdc_id, description, nutrients):
+    """A food in the FoodData Central search-result shape."""
+    return {
+        "fdcId": fdc_id,
+        "description": description,
+        "dataType": "SR Legacy",
+        "foodNutrients": [{"nutrientId": nutrient_id, "value": value} for nutrient_id, value in nutrients.items()],
+    }
+
+
+@pytest.fixture
+def food_index(tmp_path):
+    """A FoodIndex holding FOODS."""
+    from food_index import FoodIndex
+
+    index = FoodIndex(str(tmp_path / "foods.sqlite3"))
+    index.add_foods([api_food(*food) for food in FOODS])
+    yield index
+    index.close()
@@ -0,0 +1,45 @@
+import json
+
+from batch_ocr import collect_images, compact_output, load_done
+
+
+def write_lines(path, lines):
+    path.write_text("".join(line + "\n" for line in lines), encoding="utf-8")
+
+
+def record(path, error=None):
+    return json.dumps({"path": path, "text": "" if error else f"text of {path}", "error": error})
+
+
+def test_manifest_first_csv_column_is_the_path(tmp_path):
+    manifest = tmp_path / "manifest.csv"
+    write_lines(manifest, ["# path,label", "a.jpg,label a", '"scans/b, front.jpg",label b', "", "/abs/c.png"])
+
+    assert collect_images(str(manifest)) == [str(tmp_path / "a.jpg"), str(tmp_path / "scans/b, front.jpg"),
+                                             "/abs/c.png"]
+
+
+def test_failed_and_partial_records_are_not_done(tmp_path):
+    output = tmp_path / "results.jsonl"
+    write_lines(output, [record("a.jpg"), record("b.jpg", error="Error in Tesseract OCR: boom"), '{"path": "c.j'])
+
+    assert load_done(str(output)) == {"a.jpg"}
+    assert load_done(str(tmp_path / "missing.jsonl")) == set()
+
+
+def test_compaction_keeps_the_latest_record_per_path(tmp_path):
+    output = tmp_path / "results.jsonl"
+    write_lines(output, [record("a.jpg"), record("b.jpg", error="boom"), '{"path": "c.j', record("b.jpg")])
+
+    assert compact_output(str(output)) == 2
+    lines = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    assert [(r["path"], r["error"]) for r in lines] == [("a.jpg", None), ("b.jpg", None)]
+
+
+def test_compaction_leaves_a_clean_file_alone(tmp_path):
+    output = tmp_path / "results.jsonl"
+    write_lines(output, [record("a.jpg"), record("b.jpg")])
+    before = output.stat().st_mtime_ns
+
+    assert compact_output(str(output)) == 0
+    assert output.stat().st_mtime_ns == before
@@ -0,0 +1,143 @@
+import numpy as np
+import pytest
+
+from ocr_engines import CascadeEngine, OCREngine, OCRWord, register_engine
+from preprocessing import DISABLED
+
+PAGE = np.full((100, 200, 3), 255, dtype=np.uint8)
+
+
+class ScriptedEngine(OCREngine):
+    """Returns page_words for a whole page and crop_words for a crop; records the shapes it was given."""
+
+    page_words = []
+    crop_words = []
+    fail = False
+    seen = []
+
+    def _load(self):
+        if self.fail:
+            raise RuntimeError(f"{self.name} is not installed")
+        return object()
+
+    def _recognize(self, model, image):
+        type(self).seen.append(image.shape)
+        words = self.page_words if image.shape[:2] == PAGE.shape[:2] else self.crop_words
+        return " ".join(w.text for w in words), list(words)
+
+
+@register_engine
+class FastEngine(ScriptedEngine):
+    name = "test_fast"
+
+
+@register_engine
+class HeavyEngine(ScriptedEngine):
+    name = "test_heavy"
+
+
+@register_engine
+class HeavierEngine(ScriptedEngine):
+    name = "test_heavier"
+
+
+@pytest.fixture(autouse=True)
+def reset_tiers():
+    for cls in (FastEngine, HeavyEngine, HeavierEngine):
+        cls.page_words, cls.crop_words, cls.fail, cls.seen = [], [], False, []
+
+
+def line(y, *confidences, texts=None):
+    """One line of four-letter words at height y with the given confidences."""
+    texts = texts or [f"w{y:02d}{i}" for i in range(len(confidences))]
+    return [OCRWord(text, (10 + 40 * i, y, 40 + 40 * i, y + 10), confidence)
+            for i, (text, confidence) in enumerate(zip(texts, confidences))]
+
+
+def cascade(**settings):
+    return CascadeEngine(tiers=["test_fast", "test_heavy", "test_heavier"], preprocess=DISABLED, **settings)
+
+
+def test_confident_page_stays_on_the_first_tier():
+    FastEngine.page_words = line(10, 0.9, 0.95) + line(50, 0.8, 0.9)
+    engine = cascade()
+
+    result = engine.recognize(PAGE)
+
+    assert result.text == "w100 w101 w500 w501"
+    assert HeavyEngine.seen == [] and dict(engine.stats) == {"test_fast": 1}
+    assert FastEngine.seen == [PAGE.shape]  # Only a "tesseract" first tier gets a binarised page
+
+
+def test_low_page_confidence_escalates_the_whole_page():
+    FastEngine.page_words = line(10, 0.7, 0.7)  # No single word is low, the page is
+    HeavyEngine.page_words = line(10, 0.9, 0.9, texts=["good", "read"])
+    engine = cascade()
+
+    assert engine.recognize(PAGE).text == "good read"
+    assert HeavierEngine.seen == []  # The heavy tier was confident enough
+    assert dict(engine.stats) == {"page:test_heavy": 1}
+
+
+def test_page_escalation_keeps_the_most_confident_reading():
+    FastEngine.page_words = line(10, 0.7, 0.7)
+    HeavyEngine.page_words = line(10, 0.5, 0.5, texts=["bad1", "bad2"])
+    HeavierEngine.page_words = line(10, 0.6, 0.6, texts=["bad3", "bad4"])
+    engine = cascade()
+
+    assert engine.recognize(PAGE).text == "w100 w101"
+    assert len(HeavierEngine.seen) == 1
+    assert dict(engine.stats) == {"page:test_fast": 1}
+
+
+def test_low_words_are_reread_by_region():
+    FastEngine.page_words = line(10, 0.95, 0.95, 0.95) + line(50, 0.95, 0.3, 0.95, texts=["Sugar", "l2q", "10%"])
+    HeavyEngine.crop_words = [OCRWord("12g", (20, 2, 50, 12), 0.9)]
+    engine = cascade()
+
+    result = engine.recognize(PAGE)
+
+    assert result.text == "w100 w101 w102\nSugar 12g 10%"
+    assert len(HeavyEngine.seen) == 1 and HeavyEngine.seen[0][0] < PAGE.shape[0]  # One crop around line 2
+    assert dict(engine.stats) == {"regions:test_heavy": 1}
+
+
+def test_less_confident_region_reading_is_discarded():
+    FastEngine.page_words = line(10, 0.95, 0.95, 0.95) + line(50, 0.95, 0.3, 0.95, texts=["Sugar", "l2q", "10%"])
+    HeavyEngine.crop_words = [OCRWord("???", (20, 2, 50, 12), 0.2)]
+    engine = cascade()
+
+    assert engine.recognize(PAGE).text == "w100 w101 w102\nSugar l2q 10%"
+    assert dict(engine.stats) == {"test_fast": 1}
+
+
+@pytest.mark.parametrize("max_region_share, outcome", [(0.4, "page:test_heavy"), (0.6, "regions:test_heavy")])
+def test_region_share_threshold(max_region_share, outcome):
+    FastEngine.page_words = line(10, 1.0, 0.55) + line(50, 1.0, 0.55)  # Mean 0.775: only the share decides
+    HeavyEngine.page_words = line(10, 0.9, 0.9)
+    HeavyEngine.crop_words = [OCRWord("redo", (20, 2, 50, 12), 0.9)]
+    engine = cascade(max_region_share=max_region_share)
+
+    engine.recognize(PAGE)
+
+    assert dict(engine.stats) == {outcome: 1}
+
+
+@pytest.mark.parametrize("page_words", [line(10, 0.7, 0.7), line(10, 0.95, 0.2, 0.95)])
+def test_failing_tier_falls_back_to_the_first_reading(page_words):
+    FastEngine.page_words = page_words
+    HeavyEngine.fail = True
+    engine = cascade()
+
+    result = engine.recognize(PAGE)
+
+    assert result.text == " ".join(w.text for w in page_words)
+    assert dict(engine.stats) == {"test_fast:fallback": 1}
+
+
+def test_unavailable_tiers_are_skipped():
+    FastEngine.page_words = line(10, 0.2, 0.2)
+    engine = CascadeEngine(tiers=["test_fast", "not_registered"], preprocess=DISABLED)
+
+    assert engine.recognize(PAGE).text == "w100 w101"  # A single tier has nothing to escalate to
+    assert dict(engine.stats) == {"test_fast": 1}
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from diet_engine import FoodMatrix, daily_calories, food_query, get_food_matrix
+
+CALORIES = 2000  # Portions over 600 g (energy under ~33 kcal/100 g) are left out: spinach here
+
+
+@pytest.fixture
+def matrix(food_index):
+    return FoodMatrix.from_index(food_index)
+
+
+def ids(recommendations):
+    return [r.fdc_id for r in recommendations]
+
+
+def test_recommend_returns_best_first(matrix):
+    foods = matrix.recommend([], CALORIES, top_n=3)
+
+    assert len(foods) == 3
+    assert [f.score for f in foods] == sorted((f.score for f in foods), reverse=True)
+    assert foods[0].portion_grams == round(CALORIES * 0.1 * 100 / foods[0].nutrients["energy"])
+
+
+def test_condition_limits_exclude_foods(matrix):
+    assert 2 not in ids(matrix.recommend(["Diabetes"], CALORIES, top_n=10))  # 20 g sugar
+    assert 4 not in ids(matrix.recommend(["Hypertension"], CALORIES, top_n=10))  # 900 mg sodium
+    both = ids(matrix.recommend(["Diabetes", "Hypertension"], CALORIES, top_n=10))
+    assert 2 not in both and 4 not in both
+    assert 6 not in both  # Portion too large
+
+
+def test_top_n_larger_than_matches_returns_every_match(matrix):
+    foods = matrix.recommend(["Diabetes", "Hypertension"], CALORIES, top_n=50)
+
+    assert sorted(ids(foods)) == [1, 3, 5, 7]
+
+
+def test_unknown_limited_nutrient_ranks_lower(matrix):
+    foods = ids(matrix.recommend(["Diabetes"], CALORIES, top_n=10))
+
+    assert foods[-1] == 7  # Butter reports no sugar
+
+
+def test_empty_results(matrix):
+    assert matrix.recommend(["Diabetes"], CALORIES, top_n=0) == []
+    assert matrix.recommend(["Diabetes"], CALORIES, top_n=-3) == []
+    assert matrix.recommend(["Diabetes"], 1e6, top_n=5) == []  # Every portion over the cap
+    empty = FoodMatrix([], [], np.empty((0, len(matrix.columns))), matrix.columns)
+    assert empty.recommend(["Diabetes"], CALORIES) == []
+
+
+def test_unknown_conditions_fall_back_to_general_rules(matrix):
+    general = matrix.recommend(["None"], CALORIES, top_n=10)
+
+    assert matrix.recommend(["Not a condition"], CALORIES, top_n=10) == general
+
+
+def test_matrix_is_rebuilt_when_the_index_grows(food_index):
+    from conftest import ENERGY, api_food
+
+    first = get_food_matrix(food_index)
+    assert get_food_matrix(food_index) is first
+    food_index.add_foods([api_food(8, "Pear, raw", {ENERGY: 57})])
+    assert len(get_food_matrix(food_index)) == len(first) + 1
+
+
+def test_matrix_is_rebuilt_when_a_food_is_updated_in_place(food_index):
+    from conftest import ENERGY, SODIUM, api_food
+
+    first = get_food_matrix(food_index)
+    food_index.add_foods([api_food(4, "Crackers, salted", {ENERGY: 421, SODIUM: 100})])
+    updated = get_food_matrix(food_index)
+
+    assert updated is not first and len(updated) == len(first)
+    assert updated.values[updated.descriptions.index("Crackers, salted"), updated.column_index["sodium"]] == 100
+
+
+def test_matrix_sees_writes_from_another_connection(food_index):
+    from conftest import ENERGY, api_food
+    from food_index import FoodIndex
+
+    first = get_food_matrix(food_index)
+    other = FoodIndex(food_index.path)
+    other.add_foods([api_food(4, "Crackers, unsalted", {ENERGY: 421})])
+    other.close()
+
+    assert "Crackers, unsalted" in get_food_matrix(food_index).descriptions
+    assert "Crackers, unsalted" not in first.descriptions
+
+
+def test_calories_accept_scalars_and_arrays():
+    scalar = daily_calories("Male", 45, 82, 172, "Light")
+    arrays = daily_calories("Male", np.array([45, 30]), np.array([82, 60]), np.array([172, 160]), "Light")
+
+    assert arrays[0] == pytest.approx(scalar)
+    assert food_query(["None", "Hypertension", "Diabetes"]) == "potassium-rich foods"
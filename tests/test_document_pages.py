@@ -0,0 +1,58 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+import document_pages
+from document_pages import iter_pages
+
+
+def pdf_bytes(pages):
+    images = [Image.new("RGB", (60, 40), (255, 255, 255)) for _ in range(pages)]
+    buffer = io.BytesIO()
+    images[0].save(buffer, format="PDF", save_all=True, append_images=images[1:])
+    return buffer.getvalue()
+
+
+def png_bytes():
+    buffer = io.BytesIO()
+    Image.new("RGB", (30, 20), (10, 20, 30)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_pages_are_only_rendered_when_their_image_is_read(monkeypatch):
+    rendered = []
+    render = document_pages._render
+
+    def counting_render(pdf, index, dpi):
+        rendered.append(index)
+        return render(pdf, index, dpi)
+
+    monkeypatch.setattr(document_pages, "_render", counting_render)
+
+    pages = list(iter_pages([pdf_bytes(3)], dpi=72))
+
+    assert [page.number for page in pages] == [1, 2, 3] and rendered == []
+    assert pages[1].image.size == (60, 40) and pages[1].image.info["dpi"] == (72, 72)
+    assert pages[1].image is pages[1].image
+    assert rendered == [1]
+
+
+def test_digests_identify_the_file_page_and_dpi():
+    data = pdf_bytes(2)
+
+    first = [page.digest for page in iter_pages([data], dpi=72)]
+    again = [page.digest for page in iter_pages([data], dpi=72)]
+    sharper = [page.digest for page in iter_pages([data], dpi=150)]
+
+    assert first == again and len(set(first + sharper)) == 4
+
+
+def test_image_files_are_decoded_on_first_access(monkeypatch):
+    decoded = []
+    monkeypatch.setattr(document_pages, "decode", lambda data, engine: decoded.append(engine) or np.zeros((2, 2)))
+
+    [page] = iter_pages([png_bytes()], engine="tesseract")
+
+    assert decoded == []
+    assert page.image.shape == (2, 2) and decoded == ["tesseract"]
@@ -0,0 +1,70 @@
+import pytest
+
+from conftest import ENERGY, FOODS, SODIUM, api_food
+from food_index import FoodIndex
+
+
+def descriptions(foods):
+    return [food["description"] for food in foods]
+
+
+def test_search_ranks_closer_matches_first(food_index):
+    assert descriptions(food_index.search("apple")) == ["Apple, raw", "Apple juice, canned, sweetened"]
+    assert descriptions(food_index.search("Apple juice")) == ["Apple juice, canned, sweetened"]
+
+
+def test_search_falls_back_to_any_word(food_index):
+    foods = descriptions(food_index.search("raw apple pie", limit=5))
+
+    assert foods[0] == "Apple, raw"  # Matches two of the words
+    assert set(foods) == {"Apple, raw", "Apple juice, canned, sweetened", "Spinach, raw"}
+
+
+def test_search_limit_and_empty_results(food_index):
+    assert len(food_index.search("salted", limit=1)) == 1
+    assert food_index.search("chocolate") == []
+    assert food_index.search("foods") == []  # Ignored words only
+
+
+def test_search_nutrient_bounds(food_index):
+    assert descriptions(food_index.search("apple", max_sugar=15)) == ["Apple, raw"]
+    assert descriptions(food_index.search("salted", min_protein=5)) == ["Crackers, salted"]
+    with pytest.raises(ValueError):
+        food_index.search("apple", max_caffeine=1)
+
+
+def test_food_shape_and_preferred_nutrient_ids(food_index):
+    food_index.add_foods([api_food(8, "Pear, raw", {2047: 60, ENERGY: 57})])  # 1008 is preferred over Atwater 2047
+    pear = food_index.get(8)
+
+    assert pear["fdcId"] == 8 and pear["dataType"] == "SR Legacy"
+    assert {"nutrientName": "Energy", "unitName": "KCAL", "value": 57} in pear["foodNutrients"]
+    assert food_index.get(99) is None
+
+
+def test_replacing_a_food_updates_the_text_index(food_index):
+    food_index.add_foods([api_food(1, "Pear, raw", {ENERGY: 57})])
+
+    assert descriptions(food_index.search("apple")) == ["Apple juice, canned, sweetened"]
+    assert descriptions(food_index.search("pear")) == ["Pear, raw"]
+    assert len(food_index) == len(FOODS)
+
+
+def test_lookup_without_remote_fallback(food_index):
+    assert food_index.lookup("lentils", remote=False)["fdcId"] == 5
+    assert food_index.lookup("quinoa", remote=False) is None
+
+
+def test_nutrient_rows_cover_foods_with_energy(food_index):
+    food_index.add_foods([api_food(9, "Salt, table", {SODIUM: 38758})])
+
+    rows = food_index.nutrient_rows()
+
+    assert sorted(row[0] for row in rows) == [fdc_id for fdc_id, _, _ in FOODS]
+
+
+def test_index_directory_is_created(tmp_path):
+    index = FoodIndex(str(tmp_path / "cache" / "foods.sqlite3"))
+    index.close()
+
+    assert (tmp_path / "cache" / "foods.sqlite3").exists()
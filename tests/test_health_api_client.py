@@ -0,0 +1,110 @@
+import pytest
+
+from health_api_client import HealthAPIClient, HealthAPIError
+from health_api_stub import SAMPLE_RECORDS, start_stub
+from health_repository import HealthDataError, HealthRepository, HTTPHealthSource
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(**kwargs):
+        server, url = start_stub(**kwargs)
+        servers.append(server)
+        return server, url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_get_returns_record_or_none(stub):
+    server, url = stub()
+    client = HealthAPIClient(url)
+
+    assert client.get(2) == SAMPLE_RECORDS["2"]
+    assert client.get(99) is None
+
+
+def test_get_many_uses_one_batch_request(stub):
+    server, url = stub()
+    client = HealthAPIClient(url)
+
+    records = client.get_many([1, 3, 99, 1])
+
+    assert records == {"1": SAMPLE_RECORDS["1"], "3": SAMPLE_RECORDS["3"], "99": None}
+    assert server.requests == 1
+
+
+def test_get_many_falls_back_to_parallel_gets(stub):
+    server, url = stub(batch=False)
+    client = HealthAPIClient(url)
+
+    assert client.get_many([1, 2]) == {"1": SAMPLE_RECORDS["1"], "2": SAMPLE_RECORDS["2"]}
+    assert client._has_batch is False
+    requests = server.requests
+    client.get_many([3])
+    assert server.requests == requests + 1  # The missing batch endpoint is not asked for again
+
+
+def test_unavailable_server_is_retried(stub):
+    server, url = stub(failures=2)
+    client = HealthAPIClient(url, backoff=0)
+
+    assert client.get(1) == SAMPLE_RECORDS["1"]
+    assert server.requests == 3
+
+
+def test_errors_raise_health_api_error(stub):
+    server, url = stub(failures=10)
+    client = HealthAPIClient(url, retries=1, backoff=0)
+
+    with pytest.raises(HealthAPIError, match="API Error: 503"):
+        client.get(1)
+
+
+def test_timeout_raises_health_api_error(stub):
+    server, url = stub(latency=0.5)
+    client = HealthAPIClient(url, read_timeout=0.05, retries=0)
+
+    with pytest.raises(HealthAPIError, match="Request Error"):
+        client.get(1)
+
+
+def test_failed_lookup_does_not_fail_the_batch(stub):
+    server, url = stub(batch=False, failures=1)
+    client = HealthAPIClient(url, retries=0)
+
+    records = client.get_many([1])
+
+    assert isinstance(records["1"], HealthAPIError)
+
+
+def test_repository_over_http_caches_and_batches(stub):
+    server, url = stub()
+    repository = HealthRepository(HTTPHealthSource(url))
+
+    assert repository.get(1)["name"] == "Asha Verma"
+    assert repository.get(1)["name"] == "Asha Verma"
+    assert server.requests == 1
+
+    records = repository.get_many([1, 2, 3])
+    assert [record["id"] for record in records.values()] == [1, 2, 3]
+    assert server.requests == 2  # User 1 from the cache, 2 and 3 in one batch
+
+    repository.invalidate(1)
+    repository.get(1)
+    assert server.requests == 3
+
+
+def test_repository_reports_api_errors(stub):
+    server, url = stub(batch=False, failures=10)
+    source = HTTPHealthSource(url)
+    source._client = HealthAPIClient(url, retries=0)
+    repository = HealthRepository(source)
+
+    with pytest.raises(HealthDataError, match="API Error: 503"):
+        repository.get(1)
+    assert isinstance(repository.get_many([2])["2"], HealthDataError)
@@ -0,0 +1,110 @@
+import pytest
+
+from health_repository import HealthDataError, HealthRepository, SQLiteHealthSource, init_sqlite
+
+ROWS = [
+    (1, "Asha Verma", "Diabetes", "None"),
+    (2, "Ravi Kumar", "Hypertension", "Heart Disease"),
+]
+
+
+class CountingSource:
+    """Wraps a source and counts the lookups that reach it."""
+
+    def __init__(self, source):
+        self.source = source
+        self.calls = []
+
+    def fetch(self, user_id):
+        self.calls.append(user_id)
+        return self.source.fetch(user_id)
+
+
+class BatchSource(CountingSource):
+    def fetch_many(self, user_ids):
+        self.calls.append(list(user_ids))
+        return {user_id: self.source.fetch(user_id) for user_id in user_ids}
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = str(tmp_path / "health.sqlite3")
+    init_sqlite(path, ROWS)
+    return CountingSource(SQLiteHealthSource(path))
+
+
+def test_record_is_cached_per_user(source):
+    repository = HealthRepository(source)
+
+    first = repository.get(1)
+    second = repository.get(" 1 ")
+
+    assert first == second == {"id": 1, "name": "Asha Verma", "current_health": "Diabetes", "past_health": "None"}
+    assert source.calls == ["1"]
+    assert (repository.hits, repository.misses) == (1, 1)
+
+
+def test_missing_user_is_not_cached(source):
+    repository = HealthRepository(source)
+
+    assert repository.get(3) is None
+    init_sqlite(source.source.path, [(3, "Meera Nair", "Chronic Kidney Disease", "Diabetes")])
+    assert repository.get(3)["name"] == "Meera Nair"
+    assert source.calls == ["3", "3"]
+
+
+def test_expired_record_is_fetched_again(source):
+    repository = HealthRepository(source, ttl=0)
+
+    repository.get(1)
+    repository.get(1)
+
+    assert source.calls == ["1", "1"]
+
+
+def test_invalidate_one_user_or_all(source):
+    repository = HealthRepository(source)
+    repository.get(1)
+    repository.get(2)
+
+    repository.invalidate(1)
+    repository.get(1)
+    repository.get(2)
+    assert source.calls == ["1", "2", "1"]
+
+    repository.invalidate()
+    repository.get(2)
+    assert source.calls == ["1", "2", "1", "2"]
+
+
+def test_get_many_batches_only_the_misses(tmp_path):
+    path = str(tmp_path / "health.sqlite3")
+    init_sqlite(path, ROWS)
+    source = BatchSource(SQLiteHealthSource(path))
+    repository = HealthRepository(source)
+    repository.get(1)
+
+    records = repository.get_many([1, 2, 2, 3])
+
+    assert list(records) == ["1", "2", "3"]
+    assert records["1"]["name"] == "Asha Verma" and records["2"]["name"] == "Ravi Kumar"
+    assert records["3"] is None
+    assert source.calls == ["1", ["2", "3"]]
+
+
+def test_get_many_without_batch_support_asks_one_by_one(source):
+    repository = HealthRepository(source)
+
+    records = repository.get_many(["2", "1"])
+
+    assert [record["id"] for record in records.values()] == [2, 1]
+    assert source.calls == ["2", "1"]
+
+
+def test_source_errors_are_health_data_errors(tmp_path):
+    repository = HealthRepository(SQLiteHealthSource(str(tmp_path / "empty.sqlite3")))  # No health_data table
+
+    with pytest.raises(HealthDataError, match="Database Error"):
+        repository.get(1)
+    records = repository.get_many([1])
+    assert isinstance(records["1"], HealthDataError)
@@ -0,0 +1,88 @@
+from history import ConversationHistory, count_message_tokens, estimate_tokens, format_health_context
+
+HEALTH = format_health_context({"name": "Asha", "current_health": "Diabetes", "past_health": "None"})
+LABEL = "Nutrition facts: Calories 230, Total Sugars 12g, Sodium 160mg, Protein 3g per serving of 55g."
+
+
+def exchange(i, words=60):
+    return f"Question {i}. " + "detail " * words, f"Answer {i}. " + "because " * words
+
+
+def test_context_is_sent_once_as_a_system_message():
+    history = ConversationHistory()
+    history.set_context(HEALTH)
+
+    messages = history.messages_for(f"{HEALTH}\n\nIs this product safe for me?")
+
+    assert messages == [{"role": "system", "content": HEALTH},
+                        {"role": "user", "content": "Is this product safe for me?"}]
+
+
+def test_prompt_paragraphs_sent_in_an_earlier_turn_are_dropped():
+    history = ConversationHistory()
+    history.add_turn(f"{LABEL}\n\nAnalyze this label.", "It is high in sugar.")
+
+    assert history.messages_for(f"{LABEL}\n\nWhat about sodium?")[-1]["content"] == "What about sodium?"
+    assert history.messages_for("Short.\n\nWhat next?")[-1]["content"] == "Short.\n\nWhat next?"
+    # A prompt that is entirely repeated is still sent rather than left empty
+    assert history.messages_for(LABEL)[-1]["content"] == LABEL
+
+
+def test_history_within_budget_is_sent_unchanged():
+    history = ConversationHistory(budget=3000)
+    for i in range(3):
+        history.add_turn(*exchange(i, words=5))
+
+    messages = history.messages_for("And now?")
+
+    assert len(messages) == 7 and history.summary == ""
+
+
+def test_oldest_turns_are_folded_into_a_summary_to_fit_the_budget():
+    history = ConversationHistory(budget=400, keep_recent_turns=2)
+    history.set_context(HEALTH)
+    for i in range(5):
+        history.add_turn(*exchange(i, words=30))
+
+    messages = history.messages_for("And now?")
+
+    assert count_message_tokens(messages) <= 400
+    assert [m["content"].split(".")[0] for m in messages[1:-1]] == ["Question 3", "Answer 3", "Question 4", "Answer 4"]
+    assert messages[0]["content"].startswith(HEALTH + "\n\nSummary of the earlier conversation:\n")
+    assert history.summary.splitlines()[0].startswith("- User: Question 0. / Assistant: Answer 0.")
+
+
+def test_recent_turns_are_kept_even_over_budget():
+    history = ConversationHistory(budget=50, keep_recent_turns=2)
+    for i in range(2):
+        history.add_turn(*exchange(i))
+
+    history.messages_for("And now?")
+
+    assert len(history) == 4 and history.summary == ""
+
+
+def test_custom_summarizer_and_summary_cap():
+    folded = []
+
+    def summarizer(messages):
+        folded.append([m["content"].split(".")[0] for m in messages])
+        return "summary line " * 20
+
+    history = ConversationHistory(budget=200, keep_recent_turns=1, summarizer=summarizer)
+    for i in range(4):
+        history.add_turn(*exchange(i, words=20))
+
+    history.messages_for("Next?")
+
+    assert folded[0] == ["Question 0", "Answer 0"]
+    assert estimate_tokens(history.summary) <= 200 // 4  # Older summary lines are dropped first
+
+
+def test_clear_forgets_everything():
+    history = ConversationHistory()
+    history.set_context(HEALTH)
+    history.add_turn("Hi", "Hello")
+    history.clear()
+
+    assert history.messages_for("Hi") == [{"role": "user", "content": "Hi"}] and len(history) == 0
@@ -0,0 +1,99 @@
+import pytest
+
+from label_parser import check_conditions, parse_label
+
+US_LABEL = """Nutrition Facts
+8 servings per container
+Serving size 2/3 cup (55g)
+Calories 230
+Total Fat 8g 10%
+Saturated Fat 1g 5%
+Trans Fat 0g
+Cholesterol 0mg 0%
+Sodium 160mg 7%
+Total Carbohydrate 37g 13%
+Dietary Fiber 4g 14%
+Total Sugars 12g
+Includes 10g Added Sugars 20%
+Protein 3g
+"""
+
+EU_LABEL = """NUTRITION INFORMATION
+Typical values per 100g
+Energy 1046kJ / 250kcal
+Fat 19
+of which saturates 3.1g
+Carbohydrate 12g
+of which sugars 5.2g
+Fibre 2.1g
+Protein 8.4g
+Salt 0.75g
+Serving size: 30g
+"""
+
+
+@pytest.mark.parametrize("text, name, amount, unit, daily_value", [
+    (US_LABEL, "total_fat", 8, "g", 10),
+    (US_LABEL, "saturated_fat", 1, "g", 5),
+    (US_LABEL, "sodium", 160, "mg", 7),
+    (US_LABEL, "total_sugars", 12, "g", None),
+    (US_LABEL, "added_sugars", 10, "g", 20),
+    (US_LABEL, "protein", 3, "g", None),
+    (EU_LABEL, "total_fat", 19, "g", None),
+    (EU_LABEL, "saturated_fat", 3.1, "g", None),
+    (EU_LABEL, "total_carbohydrate", 12, "g", None),
+    (EU_LABEL, "total_sugars", 5.2, "g", None),
+    (EU_LABEL, "fiber", 2.1, "g", None),
+    (EU_LABEL, "salt", 0.75, "g", None),
+])
+def test_nutrient_lines(text, name, amount, unit, daily_value):
+    nutrient = parse_label(text).nutrients[name]
+
+    assert (nutrient.amount, nutrient.unit, nutrient.daily_value) == (amount, unit, daily_value)
+
+
+@pytest.mark.parametrize("text, basis, calories, serving_grams, factor", [
+    (US_LABEL, "serving", 230, 55, 1.0),
+    (EU_LABEL, "100g", 250, 30, 0.3),
+    ("Per 100ml\nEnergy 180kJ\nSugars 4.5g", "100ml", 43, None, None),
+])
+def test_basis_and_serving(text, basis, calories, serving_grams, factor):
+    label = parse_label(text)
+
+    assert label.basis == basis
+    assert label.calories == calories
+    assert label.serving_grams() == serving_grams
+    assert label.per_serving_factor() == factor
+
+
+@pytest.mark.parametrize("text, expected_sodium", [
+    (US_LABEL, 160),
+    (EU_LABEL, 300),  # 0.75g salt / 2.5
+    ("Salt 1.5g", 600),
+    ("Sodium 19", 19),
+    ("Sodium 19mg 1%", 19),
+])
+def test_sodium_and_salt(text, expected_sodium):
+    assert parse_label(text).amount("sodium") == expected_sodium
+
+
+@pytest.mark.parametrize("line, name, amount", [
+    ("Total Fat 129 15%", "total_fat", 12),  # "12g" with the g read as 9
+    ("Protein 59 10%", "protein", 5),
+    ("Total Fat 19", "total_fat", 19),  # Unit-less table value: the 9 is a digit
+    ("Total Fat 19g 24%", "total_fat", 19),
+    ("Sodium 19", "sodium", 19),
+    ("Sodium 1909 8%", "sodium", 1909),  # Only g nutrients lose a trailing 9
+    ("Total Fat l2g", "total_fat", 12),
+    ("Saturated Fat O.5g", "saturated_fat", 0.5),
+])
+def test_ocr_confusions(line, name, amount):
+    assert parse_label(line).nutrients[name].amount == amount
+
+
+def test_condition_checks_use_per_serving_amounts():
+    us_flags, _ = check_conditions(parse_label(US_LABEL), "Type 2 diabetes")
+    eu_flags, unchecked = check_conditions(parse_label(EU_LABEL), "Hypertension, heart disease")
+
+    assert [(f.nutrient, f.amount) for f in us_flags] == [("total_sugars", 12), ("added_sugars", 10)]
+    assert eu_flags == [] and unchecked == []  # 300mg sodium and 3.1g saturates per 100g, 30g serving
@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+
+from llm_cache import LLMCache, cache_key
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_creates_no_files(tmp_path):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    env.pop("LLM_CACHE_DB", None)
+    subprocess.run([sys.executable, "-c", "import llm_cache, llm_client"], cwd=tmp_path, env=env, check=True)
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_database_is_opened_on_first_use(tmp_path):
+    path = tmp_path / "cache" / "llm.sqlite3"
+    cache = LLMCache(db_path=str(path))
+    assert not path.exists()
+
+    key = cache_key([{"role": "user", "content": "hi"}], "model")
+    cache.put(key, "hello")
+    assert path.exists()
+
+    reopened = LLMCache(db_path=str(path))
+    assert reopened.get(key) == "hello"
+    assert reopened.stats()["db_rows"] == 1
+
+
+def test_expired_responses_are_misses(tmp_path):
+    cache = LLMCache(db_path=str(tmp_path / "llm.sqlite3"), ttl=0)
+    cache.put("key", "hello")
+
+    assert cache.get("key") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_unusable_database_path_keeps_the_memory_tier(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    cache = LLMCache(db_path=str(blocker / "llm.sqlite3"))  # Parent is a file
+
+    cache.put("key", "hello")
+
+    assert cache.get("key") == "hello"
+    assert cache.stats()["db_rows"] == 0
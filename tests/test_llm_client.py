@@ -0,0 +1,95 @@
+import threading
+
+import pytest
+
+import llm_client
+from fake_groq import start_fake_groq
+from llm_cache import LLMCache
+from llm_client import LLMResult, ask, recent_calls, stream_tokens
+from model_loader import get_groq_client
+
+REPLY = "Sugar is high at 20g per serving so eat it rarely"
+MESSAGES = [{"role": "user", "content": "Is this snack healthy?"}]
+
+
+@pytest.fixture
+def groq(monkeypatch):
+    server, url = start_fake_groq(reply=REPLY)
+    monkeypatch.setenv("GROQ_BASE_URL", url)
+    get_groq_client.cache_clear()  # Clients are cached per process, with the base URL of the time
+    yield server
+    server.shutdown()
+    server.server_close()
+    get_groq_client.cache_clear()
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = LLMCache(db_path="")
+    monkeypatch.setattr(llm_client, "llm_cache", cache)
+    return cache
+
+
+def test_stream_yields_tokens_in_order(groq):
+    result = LLMResult()
+    tokens = list(stream_tokens(MESSAGES, "key", result))
+
+    assert tokens[0] == "Sugar"
+    assert tokens[1:] == [" " + word for word in REPLY.split()[1:]]
+    assert result.text == REPLY
+    assert result.streamed and not result.cancelled
+    assert result.ttft is not None and result.total >= result.ttft
+    assert groq.requests[0]["stream"] is True
+
+
+def test_stream_stops_when_cancelled(groq):
+    groq.token_delay = 0.01
+    result = LLMResult()
+    cancel = threading.Event()
+    tokens = []
+    for token in stream_tokens(MESSAGES, "key", result, cancel_event=cancel):
+        tokens.append(token)
+        if len(tokens) == 2:
+            cancel.set()
+
+    assert result.cancelled
+    assert result.text == "".join(tokens) == "Sugar is"
+
+
+def test_repeated_question_is_served_from_cache(groq, cache):
+    first = ask(MESSAGES, "key", stream=False)
+    second = ask([{"role": "user", "content": "  Is this snack   healthy? "}], "key", stream=False)
+
+    assert first.text == second.text == REPLY
+    assert not first.cached and second.cached
+    assert len(groq.requests) == 1
+    assert cache.stats()["hits"] == 1
+    assert recent_calls()[-1]["cached"]
+
+
+def test_use_cache_false_always_calls_groq(groq, cache):
+    ask(MESSAGES, "key", stream=False)
+    result = ask(MESSAGES, "key", stream=False, use_cache=False)
+
+    assert not result.cached
+    assert len(groq.requests) == 2
+
+
+def test_context_is_part_of_the_cache_key(groq, cache):
+    ask(MESSAGES, "key", stream=False, context="diabetes")
+    result = ask(MESSAGES, "key", stream=False, context="hypertension")
+
+    assert not result.cached
+    assert len(groq.requests) == 2
+
+
+def test_api_error_raises_and_is_not_cached(groq, cache):
+    groq.error_status = 400
+    with pytest.raises(Exception, match="Fake Groq error"):
+        ask(MESSAGES, "key", stream=False)
+    assert recent_calls()[-1]["text"] == ""
+
+    groq.error_status = None
+    result = ask(MESSAGES, "key", stream=False)
+    assert not result.cached and result.text == REPLY
+    assert len(groq.requests) == 2
@@ -0,0 +1,87 @@
+import pytest
+
+from medications import MedicationMatcher, get_matcher, max_distance
+
+NAMES = [
+    ["Paracetamol", "Dolo", "Crocin"],
+    ["Amoxicillin", "Mox"],
+    ["Amoxicillin Clavulanate", "Augmentin"],
+    ["Pantoprazole", "Pan 40"],
+    ["Aspirin", "Ecosprin"],
+    ["Metformin"],
+]
+
+PRESCRIPTION = """Dr. Sharma Clinic
+Patient: Ravi Kumar  Age 45
+Tab Pantoprazo1e 40mg 1-0-0 before breakfast x 14 days
+Cap Amoxicilin 500 mg TDS for 5 days
+Take plenty of fluids and rest
+"""
+
+
+@pytest.fixture
+def matcher():
+    return MedicationMatcher(names=NAMES)
+
+
+@pytest.mark.parametrize("text, name, distance", [
+    ("Pantoprazo1e", "Pantoprazole", 0),  # 1 read for l is undone before the lookup
+    ("PARACETAM0L", "Paracetamol", 0),
+    ("Amoxicilin", "Amoxicillin", 1),
+    ("Paracitamal", "Paracetamol", 2),
+    ("Crocin", "Paracetamol", 0),  # Brand names map to the canonical name
+    ("Amoxicillin Clavulanat", "Amoxicillin Clavulanate", 1),
+    ("Pan 40", "Pantoprazole", 0),
+])
+def test_lookup_tolerates_ocr_errors(matcher, text, name, distance):
+    assert matcher.lookup(text) == (name, distance)
+
+
+@pytest.mark.parametrize("text", [
+    "Dolx",  # 4 letters: exact only
+    "Asprxn",  # 6 letters: one edit allowed, this is two
+    "Metfxrmxx",  # 9 letters: two edits allowed, this is three
+    "Patient",
+])
+def test_lookup_respects_the_edit_distance_cut_off(matcher, text):
+    assert matcher.lookup(text) is None
+
+
+@pytest.mark.parametrize("length, allowed", [(3, 0), (4, 0), (5, 1), (7, 1), (8, 2), (20, 2)])
+def test_max_distance(length, allowed):
+    assert max_distance(length) == allowed
+
+
+def test_extract_reads_details_next_to_each_match(matcher):
+    matches = matcher.extract(PRESCRIPTION)
+
+    assert [m.as_dict() for m in matches] == [
+        {"name": "Pantoprazole", "matched": "Pantoprazo1e", "distance": 0, "line": 2, "form": "Tab",
+         "dose": "40 mg", "frequency": "1-0-0", "duration": "14 days"},
+        {"name": "Amoxicillin", "matched": "Amoxicilin", "distance": 1, "line": 3, "form": "Cap",
+         "dose": "500 mg", "frequency": "TDS", "duration": "5 days"},
+    ]
+
+
+@pytest.mark.parametrize("line", [
+    "Patient: Ravi Kumar  Age 45",
+    "Take plenty of fluids and rest",
+    "Review after 500 days 1-0-1",
+    "Mix 2 tabs daily",
+])
+def test_lines_without_a_drug_do_not_match(matcher, line):
+    assert matcher.extract(line) == []
+
+
+def test_repeated_drug_keeps_the_most_detailed_mention(matcher):
+    matches = matcher.extract("Dolo\nTab Dolo 650 mg SOS for 3 days")
+
+    assert len(matches) == 1
+    assert (matches[0].line, matches[0].dose, matches[0].duration) == (1, "650 mg", "3 days")
+
+
+def test_bundled_dictionary_loads():
+    matcher = get_matcher()
+
+    assert matcher.size > 100
+    assert [m.name for m in matcher.extract(PRESCRIPTION)] == ["Pantoprazole", "Amoxicillin"]
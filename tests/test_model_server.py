@@ -0,0 +1,120 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from model_client import ModelClient, ModelServerError, RemoteEngine
+from model_server import ModelServer
+from ocr_engines import OCREngine, OCRWord, register_engine
+from preprocessing import DISABLED
+
+
+@register_engine
+class ShapeEngine(OCREngine):
+    """Reads an image's shape and mean; an all-black image is an unreadable upload."""
+
+    name = "test_shape"
+    label = "Shape"
+
+    def __init__(self, preprocess=None):
+        super().__init__(DISABLED)
+        self.calls = []
+
+    def _load(self):
+        return object()
+
+    def _recognize_batch(self, model, images):
+        self.calls.append(len(images))
+        if any(not image.any() for image in images):
+            raise ValueError("unreadable image")
+        return [(f"{image.shape[0]}x{image.shape[1]} {int(image.mean())}", [OCRWord("w", (0, 0, 1, 1), 0.9)])
+                for image in images]
+
+
+async def _shutdown():
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = ModelServer(str(tmp_path / "models.sock"), max_batch=8, max_wait=0.05)
+    loop = asyncio.new_event_loop()
+    loop.create_task(server.serve(["test_shape"]))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    client = ModelClient(server.path, timeout=10)
+    for _ in range(200):
+        try:
+            client.ping()
+            break
+        except ModelServerError:
+            threading.Event().wait(0.02)
+    yield server, client
+    client.close()
+    asyncio.run_coroutine_threadsafe(_shutdown(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+
+def image(value, shape=(4, 6)):
+    return np.full(shape, value, dtype=np.uint8)
+
+
+def test_images_pass_through_shared_memory(server):
+    _, client = server
+
+    results = client.ocr([image(7), image(9, (3, 5, 3))], "test_shape")
+
+    assert [r["text"] for r in results] == ["4x6 7", "3x5 9"]
+    assert results[0]["words"] == [["w", [0.0, 0.0, 1.0, 1.0], 0.9]]
+
+
+def test_concurrent_requests_are_batched(server):
+    model_server, client = server
+
+    with ThreadPoolExecutor(17) as pool:
+        texts = list(pool.map(lambda i: client.ocr([image(i + 1)], "test_shape")[0]["text"], range(17)))
+
+    assert texts == [f"4x6 {i + 1}" for i in range(17)]
+    stats = client.stats()["batches"]["ocr/test_shape"]
+    assert stats["items"] == 17 and stats["batches"] < 17
+    assert max(model_server.models["test_shape"].calls) <= 8
+
+
+def test_failing_item_only_fails_its_own_request(server):
+    _, client = server
+
+    def run(i):
+        try:
+            return client.ocr([image(0 if i == 3 else i + 1)], "test_shape")[0]["text"]
+        except ModelServerError as e:
+            return e
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(run, range(8)))
+
+    assert isinstance(results[3], ModelServerError) and "unreadable image" in str(results[3])
+    assert [r for i, r in enumerate(results) if i != 3] == [f"4x6 {i + 1}" for i in range(8) if i != 3]
+
+
+def test_remote_engine_matches_the_local_interface(server):
+    _, client = server
+    engine = RemoteEngine("test_shape", client=client, preprocess=DISABLED)
+
+    result = engine.recognize(image(5))
+
+    assert result.engine == "test_shape" and result.text == "4x6 5"
+    assert result.words[0].confidence == 0.9
+
+
+def test_unknown_model_is_an_error(server):
+    _, client = server
+
+    with pytest.raises(ModelServerError, match="Unknown model"):
+        client.load(["no_such_model"])
@@ -0,0 +1,126 @@
+import os
+
+import numpy as np
+import pytest
+
+import image_ingest
+import ocr_engines
+from ocr_cache import OCRCache, image_digest, make_key
+from ocr_engines import OCREngine, extract_text, register_engine
+from preprocessing import DISABLED
+
+
+@register_engine
+class CountingEngine(OCREngine):
+    """Reads "text <n>" for an image filled with n; an all-black image fails."""
+
+    name = "test_counting"
+    label = "Counting"
+
+    def __init__(self, preprocess=None):
+        super().__init__(DISABLED)
+        self.calls = 0
+
+    def _load(self):
+        return object()
+
+    def _recognize(self, model, image):
+        self.calls += 1
+        if not image.any():
+            raise ValueError("blank page")
+        return f"text {int(image.mean())}", []
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = OCRCache(max_entries=8)
+    monkeypatch.setattr(ocr_engines, "ocr_cache", cache)
+    return cache
+
+
+def text_of(size):
+    # Disk entries are {"text": ...}: 12 bytes of JSON around the text
+    return "x" * (size - 12)
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = OCRCache(max_entries=2)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    cache.get("a")
+    cache.put("c", "C")
+
+    assert [cache.get(key) for key in "abc"] == ["A", None, "C"]
+    assert cache.stats()["memory_entries"] == 2
+
+
+def test_disk_hit_is_promoted_to_memory(tmp_path):
+    OCRCache(disk_dir=str(tmp_path)).put("k" * 40, "from disk")
+    cache = OCRCache(disk_dir=str(tmp_path))
+
+    assert cache.get("k" * 40) == "from disk"
+    assert cache.get("k" * 40) == "from disk"
+    stats = cache.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 0)
+    assert cache.stats()["disk_bytes"] == 12 + len("from disk")
+
+
+def test_disk_tier_evicts_oldest_files_to_ninety_percent(tmp_path):
+    cache = OCRCache(max_entries=1, disk_dir=str(tmp_path), max_disk_bytes=1000)
+    keys = [f"{i:02d}" + "0" * 38 for i in range(9)]
+    for i, key in enumerate(keys[:8]):
+        cache.put(key, text_of(112))
+        os.utime(cache._disk_path(key), (1000 + i, 1000 + i))
+    assert cache.get(keys[0]) is not None  # Read from disk: now the most recently used file
+
+    cache.put(keys[8], text_of(112))  # 9 * 112 bytes is over the cap
+
+    on_disk = {key for key in keys if os.path.exists(cache._disk_path(key))}
+    assert on_disk == set(keys) - {keys[1]}
+    assert cache.stats()["disk_bytes"] == 8 * 112 <= 900
+
+
+def test_clear_removes_both_tiers(tmp_path):
+    cache = OCRCache(disk_dir=str(tmp_path))
+    cache.put("k" * 40, "text")
+    cache.clear()
+
+    assert cache.get("k" * 40) is None
+    assert cache.stats()["disk_bytes"] == 0
+
+
+def test_keys_depend_on_content_engine_and_settings():
+    digest = image_digest(b"upload")
+
+    assert digest == image_digest(bytearray(b"upload")) != image_digest(b"other")
+    assert make_key(digest, "tesseract", {"psm": 6}) == make_key(digest, "tesseract", {"psm": 6})
+    assert len({make_key(digest, "tesseract", {"psm": 6}), make_key(digest, "tesseract", {"psm": 3}),
+                make_key(digest, "easyocr", {"psm": 6})}) == 3
+
+
+def test_extract_text_caches_results(cache):
+    image = np.full((4, 4), 7, dtype=np.uint8)
+
+    assert extract_text(image, "test_counting") == "text 7"
+    assert extract_text(image.copy(), "test_counting") == "text 7"
+    assert ocr_engines.get_engine("test_counting").calls == 1
+
+
+def test_errors_are_not_cached(cache):
+    engine = ocr_engines.get_engine("test_counting")
+    calls = engine.calls
+
+    for _ in range(2):
+        assert extract_text(np.zeros((4, 4), dtype=np.uint8), "test_counting") == \
+            "Error in Counting OCR: blank page"
+    assert engine.calls == calls + 2
+    assert cache.stats()["memory_entries"] == 0
+
+
+def test_encoded_upload_is_only_decoded_on_a_miss(cache, monkeypatch):
+    decoded = []
+    monkeypatch.setattr(image_ingest, "decode", lambda image, engine: decoded.append(image) or np.full((2, 2), 3))
+
+    assert extract_text(b"png bytes", "test_counting") == "text 3"
+    assert extract_text(b"png bytes", "test_counting") == "text 3"
+    assert decoded == [b"png bytes"]
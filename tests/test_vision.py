@@ -0,0 +1,131 @@
+import asyncio
+import io
+
+import pytest
+from PIL import Image
+
+import image_processing
+import ocr_engines
+from fake_vision import FakeAsyncVisionClient, FakeVisionClient
+from image_processing import annotate_batch, annotate_batch_async
+from ocr_cache import OCRCache
+from ocr_engines import VisionEngine, extract_text
+from preprocessing import DISABLED
+
+
+def content(i):
+    return f"image-{i}".encode()
+
+
+def client_with_images(count, cls=FakeVisionClient, **kwargs):
+    client = cls(**kwargs)
+    for i in range(count):
+        client.add(content(i), f"Sugar {i}g")
+    return client
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(image_processing, "BACKOFF", 0.0)
+
+
+def test_batches_pack_up_to_sixteen_images_in_order():
+    client = client_with_images(40)
+
+    results = annotate_batch([content(i) for i in range(40)], client=client)
+
+    assert [r.text for r in results] == [f"Sugar {i}g" for i in range(40)]
+    assert client.requests == 3 and client.images == 40  # 16 + 16 + 8
+    assert [w.text for w in results[0].words] == ["Sugar", "0g"]
+    assert results[0].words[0].box == (0, 0, 50, 16)
+
+
+def test_batch_size_is_capped_at_the_api_limit():
+    client = client_with_images(20)
+
+    annotate_batch([content(i) for i in range(20)], client=client, batch_size=5)
+    assert client.requests == 4
+    annotate_batch([content(i) for i in range(20)], client=client, batch_size=100)
+    assert client.requests == 4 + 2
+
+
+@pytest.mark.parametrize("errors", [{"quota_errors": 2}, {"unavailable_errors": 2},
+                                    {"quota_errors": 1, "unavailable_errors": 1}])
+def test_quota_and_unavailable_errors_are_retried(errors):
+    client = client_with_images(3, **errors)
+
+    results = annotate_batch([content(i) for i in range(3)], client=client)
+
+    assert [r.error for r in results] == [None] * 3
+    assert client.requests == 3
+
+
+def test_batch_fails_once_retries_run_out(monkeypatch):
+    monkeypatch.setattr(image_processing, "MAX_RETRIES", 1)
+    client = client_with_images(18, quota_errors=3)
+
+    results = annotate_batch([content(i) for i in range(18)], client=client)
+
+    assert all("Quota exceeded" in r.error for r in results[:16])  # First request: 2 attempts, both 429
+    assert [r.text for r in results[16:]] == ["Sugar 16g", "Sugar 17g"]  # Second request: 429 then success
+
+
+def test_an_image_error_only_fails_that_image():
+    client = client_with_images(3)
+    client.add_error(content(1), "Bad image data")
+
+    results = annotate_batch([content(i) for i in range(3)], client=client)
+
+    assert results[0].text == "Sugar 0g" and results[2].text == "Sugar 2g"
+    assert results[1].error == "Google Cloud Vision API Error: Bad image data"
+
+
+def test_engine_batch_returns_per_image_errors():
+    client = client_with_images(3)
+    client.add_error(content(1), "Bad image data")
+    engine = VisionEngine(client=client, preprocess=DISABLED)
+
+    results = engine.recognize_batch([content(i) for i in range(3)])
+
+    assert [r.text for r in results] == ["Sugar 0g", "", "Sugar 2g"]
+    assert [r.error for r in results] == [None, "Google Cloud Vision API Error: Bad image data", None]
+    with pytest.raises(Exception, match="Bad image data"):
+        engine.recognize(content(1))
+
+
+def test_async_batches_respect_the_concurrency_limit():
+    client = client_with_images(64, cls=FakeAsyncVisionClient, latency=0.01)
+
+    results = asyncio.run(annotate_batch_async([content(i) for i in range(64)], client=client, batch_size=8,
+                                               max_concurrency=3))
+
+    assert [r.text for r in results] == [f"Sugar {i}g" for i in range(64)]
+    assert client.sync.requests == 8
+    assert client.max_in_flight == 3
+
+
+def test_async_retries_quota_errors():
+    client = client_with_images(4, cls=FakeAsyncVisionClient, quota_errors=1)
+
+    results = asyncio.run(annotate_batch_async([content(i) for i in range(4)], client=client))
+
+    assert [r.text for r in results] == [f"Sugar {i}g" for i in range(4)]
+    assert client.sync.requests == 2
+
+
+def jpeg_upload():
+    buffer = io.BytesIO()
+    Image.new("RGB", (40, 30), (200, 10, 10)).save(buffer, format="JPEG", quality=70)
+    buffer.seek(0)
+    return buffer
+
+
+@pytest.mark.parametrize("as_file", [True, False])
+def test_uploads_reach_vision_byte_identical(monkeypatch, as_file):
+    upload = jpeg_upload()
+    client = FakeVisionClient(default_text="re-encoded")
+    client.add(upload.getvalue(), "Sugar 5g")
+    monkeypatch.setattr(ocr_engines, "ocr_cache", OCRCache())
+    monkeypatch.setitem(ocr_engines._instances, "google_vision", VisionEngine(client=client, preprocess=DISABLED))
+
+    assert extract_text(upload if as_file else upload.getvalue(), "google_vision") == "Sugar 5g"
@@ -0,0 +1,257 @@
+"""Hindi translation backends: Groq or a local en->hi model.
+
+Every "Translate to Hindi" button used to be a mixtral round trip. The
+backend is now selectable (TRANSLATION_BACKEND, or the sidebar selector):
+
+    groq   the existing chat-completion call (llm_client.ask)
+    local  LOCAL_TRANSLATION_MODEL (Helsinki-NLP/opus-mt-en-hi) via transformers
+
+The local backend splits text into sentences while keeping line breaks and
+list markers, translates only sentences it has not seen before,
+TRANSLATION_BATCH_SIZE at a time with the shortest and longest grouped apart
+to limit padding, and caches each sentence in the response cache
+(llm_cache.py), since analyses repeat many of the same sentences. The model is
+loaded once per process and shared by every session.
+
+Both backends return an LLMResult, so callers treat them the same way.
+`python translation.py --benchmark` compares their latency and throughput.
+"""
+import argparse
+import hashlib
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+
+from async_llm import TRANSLATION_PROMPT
+from llm_cache import llm_cache
+from llm_client import LLMResult, ask, log_call
+from metrics import stage
+from model_loader import timed
+
+BACKEND = os.getenv("TRANSLATION_BACKEND", "groq")
+LOCAL_MODEL = os.getenv("LOCAL_TRANSLATION_MODEL", "Helsinki-NLP/opus-mt-en-hi")
+BATCH_SIZE = int(os.getenv("TRANSLATION_BATCH_SIZE", "16"))
+MAX_SENTENCE_TOKENS = 256
+
+_MARKER_RE = re.compile(r"^\s*(?:[-*•]|\d+[.)]|#+)\s+")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(])")
+
+_BACKENDS = {}
+
+
+def register_backend(cls):
+    _BACKENDS[cls.name] = cls
+    return cls
+
+
+def available_backends():
+    return list(_BACKENDS)
+
+
+@register_backend
+class GroqTranslator:
+    """The chat model, prompted to translate; streams into the page like the other replies."""
+
+    name = "groq"
+    label = "Groq (mixtral)"
+
+    def __init__(self, api_key="", stream=None):
+        self.api_key = api_key
+        self.stream = stream
+
+    def translate(self, text, prompt=TRANSLATION_PROMPT, use_cache=True):
+        return ask([{"role": "user", "content": prompt.format(text=text)}], self.api_key, kind="translation",
+                   stream=self.stream, use_cache=use_cache)
+
+
+@register_backend
+class LocalTranslator:
+    """Sentence-batched seq2seq translation on this machine."""
+
+    name = "local"
+    label = "Local model (offline)"
+
+    def __init__(self, model=LOCAL_MODEL, batch_size=BATCH_SIZE):
+        self.model_name = model
+        self.batch_size = batch_size
+        self._loaded = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """(tokenizer, model), built on first use."""
+        with self._lock:
+            if self._loaded is None:
+                with timed("import", "transformers"):
+                    from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+                with timed("model", f"translator:{self.model_name}"):
+                    tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                    model = AutoModelForSeq2SeqLM.from_pretrained(self.model_name).eval()
+                self._loaded = (tokenizer, model)
+            return self._loaded
+
+    def translate(self, text, prompt=None, use_cache=True):
+        """LLMResult with the Hindi text; prompt is ignored (only the Groq backend needs one)."""
+        return self.translate_many([text], use_cache)[0]
+
+    def translate_many(self, texts, use_cache=True):
+        """One LLMResult per text; the new sentences of all of them share model batches."""
+        start = time.perf_counter()
+        documents = [[split_line(line) for line in (text or "").splitlines()] for text in texts]
+        results = [LLMResult(kind="translation", model=self.model_name) for _ in texts]
+        try:
+            sentences = {s for lines in documents for _, parts in lines for s in parts}
+            translated, misses = self.translate_sentences(sorted(sentences), use_cache)
+            for result, lines in zip(results, documents):
+                result.text = "\n".join(marker + " ".join(translated[s] for s in parts) for marker, parts in lines)
+                result.cached = bool(sentences) and misses == 0
+        except Exception as e:
+            for result in results:
+                result.error = str(e)
+                result.text = f"Translation Error: {str(e)}"
+        seconds = time.perf_counter() - start
+        for result in results:
+            result.total = result.ttft = seconds
+            log_call(result)
+        return results
+
+    def translate_sentences(self, sentences, use_cache=True):
+        """({sentence: translation}, number of sentences not found in the cache); only those reach the model."""
+        translations, missing = {}, []
+        for sentence in sentences:
+            cached = llm_cache.get(self._key(sentence)) if use_cache else None
+            if cached is None:
+                missing.append(sentence)
+            else:
+                translations[sentence] = cached
+        if missing:
+            tokenizer, model = self.load()
+            import torch
+
+            missing.sort(key=len)  # Similar lengths share a batch, so there is little padding
+            for start in range(0, len(missing), self.batch_size):
+                batch = missing[start:start + self.batch_size]
+                inputs = tokenizer(batch, truncation=True, max_length=MAX_SENTENCE_TOKENS, padding=True,
+                                   return_tensors="pt")
+                with stage("translate.generate"), torch.inference_mode():
+                    output = model.generate(**inputs, max_new_tokens=MAX_SENTENCE_TOKENS)
+                for sentence, hindi in zip(batch, tokenizer.batch_decode(output, skip_special_tokens=True)):
+                    translations[sentence] = hindi.strip()
+                    if use_cache:
+                        llm_cache.put(self._key(sentence), hindi.strip())
+        return translations, len(missing)
+
+    def _key(self, sentence):
+        return "translation:" + hashlib.sha256(f"{self.model_name}|{sentence}".encode()).hexdigest()
+
+
+def split_line(line):
+    """(list marker or heading prefix, [sentences]) for one line of text."""
+    marker = _MARKER_RE.match(line)
+    prefix = marker.group() if marker else ""
+    body = line[len(prefix):].strip()
+    return prefix, [s.strip() for s in _SENTENCE_RE.split(body) if s.strip()] if body else []
+
+
+@lru_cache(maxsize=None)
+def _local_translator(model=LOCAL_MODEL):
+    return LocalTranslator(model)
+
+
+def get_translator(name=None, api_key="", stream=None):
+    """Translator by backend name (default TRANSLATION_BACKEND); the local model is shared per process."""
+    name = name or BACKEND
+    if name not in _BACKENDS:
+        raise KeyError(f"Unknown translation backend '{name}'. Available: {', '.join(_BACKENDS)}")
+    if name == "local":
+        from model_client import RemoteTranslator, served
+
+        return RemoteTranslator() if served("translator") else _local_translator()
+    return GroqTranslator(api_key, stream)
+
+
+def translation_backend_selector():
+    """Sidebar choice of translation backend for this session; returns its name."""
+    import streamlit as st
+
+    names = available_backends()
+    return st.sidebar.selectbox("Hindi translation", names, index=names.index(BACKEND) if BACKEND in names else 0,
+                                format_func=lambda name: _BACKENDS[name].label, key="translation_backend")
+
+
+# Benchmark
+
+SAMPLE_RESPONSE = """**Summary:** This product is high in sugar and sodium.
+- Each serving has 20g of total sugars, which is above the limit for people with diabetes.
+- The sodium content is 800mg per serving. This is a large share of the daily limit for hypertension.
+- Protein is low at 3g per serving.
+
+Recommendation: Eat this only occasionally and choose a low-sugar alternative. Drink water instead of sweetened drinks.
+"""
+
+
+def benchmark(texts, backends=("local", "groq"), api_key=""):
+    """Rows of latency and throughput per backend: cold (nothing cached) and warm (repeated sentences)."""
+    rows = []
+    for name in backends:
+        try:
+            translator = get_translator(name, api_key, stream=False)
+            if name == "local":
+                translator.load()  # Model load is reported separately by model_loader
+        except Exception as e:
+            rows.append({"backend": name, "error": str(e)})
+            continue
+        for label, use_cache in (("cold", False), ("warm", True)):
+            latencies, characters, errors = [], 0, 0
+            for text in texts:
+                result = translator.translate(text, use_cache=use_cache)
+                latencies.append(result.total or 0.0)
+                characters += len(text)
+                errors += bool(result.error)
+            total = sum(latencies)
+            latencies.sort()
+            rows.append({
+                "backend": name,
+                "run": label,
+                "texts": len(texts),
+                "mean_s": round(total / len(texts), 3),
+                "p95_s": round(latencies[round(0.95 * (len(latencies) - 1))], 3),
+                "chars_per_s": round(characters / total, 1) if total else None,
+                "errors": errors,
+            })
+    return rows
+
+
+def format_benchmark(rows):
+    lines = [f"{'backend':<8} {'run':<5} {'texts':>5} {'mean s':>7} {'p95 s':>7} {'chars/s':>9} {'errors':>6}"]
+    for row in rows:
+        if "error" in row:
+            lines.append(f"{row['backend']:<8} unavailable: {row['error']}")
+            continue
+        lines.append(f"{row['backend']:<8} {row['run']:<5} {row['texts']:>5} {row['mean_s']:>7} {row['p95_s']:>7} "
+                     f"{row['chars_per_s']!s:>9} {row['errors']:>6}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Translate text into Hindi, or benchmark the backends.")
+    parser.add_argument("text", nargs="?", help="Text to translate")
+    parser.add_argument("--backend", default=BACKEND, choices=available_backends())
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--texts", type=int, default=10, help="Benchmark: number of responses translated")
+    args = parser.parse_args()
+
+    api_key = os.getenv("GROQ_API_KEY", "")
+    if args.benchmark:
+        # Responses that share most sentences, like a day of analyses of similar products
+        texts = [SAMPLE_RESPONSE.replace("20g", f"{20 + i}g") for i in range(args.texts)]
+        backends = ["local"] + (["groq"] if api_key or os.getenv("GROQ_BASE_URL") else [])
+        print(format_benchmark(benchmark(texts, backends, api_key)))
+        return
+    result = get_translator(args.backend, api_key, stream=False).translate(args.text or SAMPLE_RESPONSE)
+    print(result.text)
+
+
+if __name__ == "__main__":
+    main()